@@ -0,0 +1,89 @@
+'''
+Job local cache of the Adler32 checksums of the files.
+
+The checksums are kept by path, inode, size and modification time, so that a file is read at most once
+for its checksum, and not at all when it was written through a L{ChecksumWriter}: the checksum is then
+computed while writing. The cache of a job is kept in the workflow_commons, see L{getChecksumCache}.
+Used by L{ModuleBase.getFileMetadata}, and by the file writers of ILCDIRAC (L{StdHepSplitter}).
+
+@since: Oct 18, 2026
+
+@author: agent
+'''
+
+from DIRAC.Core.Utilities.Adler import fileAdler, intAdlerToHex
+import os, zlib
+
+class ChecksumCache(object):
+  """ Checksums of the files, by (path, inode, size, modification time)
+  """
+  def __init__(self):
+    self.checksums = {}
+
+  def __repr__(self):
+    return "<ChecksumCache of %s files>" % len(self.checksums)
+
+  def _key(self, path):
+    """ The key of the file in its current state, and its size
+    """
+    stat = os.stat(path)
+    return (os.path.abspath(path), stat.st_ino, stat.st_size, stat.st_mtime), stat.st_size
+
+  def setChecksum(self, path, adler):
+    """ Store the checksum of a file just written
+
+    @param adler: the checksum as an integer, as given by zlib.adler32
+    """
+    key = self._key(path)[0]
+    self.checksums[key] = intAdlerToHex(adler)
+
+  def getChecksum(self, path):
+    """ Get the size and the checksum of a file, reading it only if it is not known or changed
+
+    @return: tuple (size, checksum as an hexadecimal string, False if it could not be computed)
+    """
+    key, size = self._key(path)
+    if not key in self.checksums:
+      adler = fileAdler(path)
+      if not adler:
+        return size, adler
+      self.checksums[key] = adler
+    return size, self.checksums[key]
+
+class ChecksumWriter(object):
+  """ File opened for writing, computing the checksum of what is written. The checksum is stored in the
+  cache when the file is closed.
+  """
+  def __init__(self, path, cache, buffering = -1):
+    self.path = path
+    self.cache = cache
+    self.fileobj = open(path, "wb", buffering)
+    self.adler = 1
+
+  def write(self, data):
+    """ Write the data (string or buffer)
+    """
+    self.adler = zlib.adler32(data, self.adler)
+    self.fileobj.write(data)
+
+  def close(self):
+    """ Close the file, and keep its checksum
+    """
+    if self.fileobj.closed:
+      return
+    self.fileobj.close()
+    self.cache.setChecksum(self.path, self.adler)
+
+def openForWriting(path, cache = None, buffering = -1):
+  """ Open a file for writing, through a L{ChecksumWriter} if a cache is given
+  """
+  if cache is None:
+    return open(path, "wb", buffering)
+  return ChecksumWriter(path, cache, buffering)
+
+def getChecksumCache(workflow_commons):
+  """ Get the checksum cache of the job, kept in the workflow_commons
+  """
+  if not workflow_commons.has_key('ChecksumCache'):
+    workflow_commons['ChecksumCache'] = ChecksumCache()
+  return workflow_commons['ChecksumCache']
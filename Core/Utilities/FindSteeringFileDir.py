@@ -10,19 +10,17 @@ Created on Feb 10, 2012
 
 from DIRAC import S_OK, S_ERROR
 from ILCDIRAC.Core.Utilities.CombinedSoftwareInstallation  import getSoftwareFolder
-from DIRAC.ConfigurationSystem.Client.Helpers.Operations import Operations
+from ILCDIRAC.Core.Utilities.SoftwareCatalog import getSoftwareCatalog
 from ILCDIRAC.Core.Utilities.TARsoft import check
 
 def getSteeringFileDirName(systemConfig, application, applicationVersion):
   """ Locate the path of the steering file directory assigned to the specified application
   """
-  ops = Operations()
-  version = ops.getValue('/AvailableTarBalls/%s/%s/%s/Dependencies/steeringfiles/version' % (systemConfig, 
-                                                                                            application,
-                                                                                            applicationVersion), '')
+  catalog = getSoftwareCatalog()
+  version = dict(catalog.getDirectDependencies(systemConfig, application, applicationVersion)).get('steeringfiles', '')
   if not version: 
     return S_ERROR("Could not find attached SteeringFile version")
-  TarBall = ops.getValue('/AvailableTarBalls/%s/steeringfiles/%s/TarBall' % (systemConfig, version), '')
+  TarBall = catalog.getTarBall(systemConfig, 'steeringfiles', version)
   if not TarBall:
     return S_ERROR("Could not find tar ball for SteeringFile")
   mydir = TarBall.replace(".tgz", "").replace(".tar.gz", "")
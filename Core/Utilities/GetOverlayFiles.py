@@ -8,7 +8,8 @@ from DIRAC import gLogger
 import os
 
 def getOverlayFiles(evttype = 'gghad'):
-  """ Return the list of files contained in the overlay_BKG folder, where BKG can be anything
+  """ Return the list of files contained in the overlay_BKG folder, where BKG can be anything.
+  If one of them cannot be read (a dangling link), the list is empty so that the caller fails.
   """
   localfiles = []
   if not os.path.exists( "./overlayinput_"+evttype ):
@@ -19,6 +20,10 @@ def getOverlayFiles(evttype = 'gghad'):
   listdir = os.listdir( os.getcwd() )
   for item in listdir:
     if item.count( '.slcio' ):
+      if not os.path.exists( item ):
+        gLogger.error( 'Overlay file %s is a dangling link' % item )
+        os.chdir(curdir)
+        return []
       localfiles.append( os.getcwd()+os.sep+item )
   os.chdir(curdir)
   return localfiles
\ No newline at end of file
@@ -1,13 +1,105 @@
 '''
-For any input file, try to determine from the FC the number of events / luminosity / event type. 
+For any input file, try to determine from the FC the number of events / luminosity / event type.
+
+The meta data of the files and directories is kept for an hour, so that the modules of a job, and the
+production API, do not ask the FileCatalog again for the same files. The caches are bounded, as they also
+live in long running agents (TransformationAgent).
 
 @author: S. Poss
 @since: Nov 2, 2010
 '''
 from DIRAC.Resources.Catalog.FileCatalogClient import FileCatalogClient
-import os
+from ILCDIRAC.Core.Utilities.ThreadedMap import threadedMap
+import os, threading, time
+
+from DIRAC import gLogger, S_OK, S_ERROR
+
+class MetadataCache(object):
+  """ Meta data already obtained, kept at most ttl seconds. Above maxentries, the oldest tenth is dropped.
+  """
+  def __init__(self, ttl = 3600, maxentries = 100000):
+    self.ttl = ttl
+    self.maxentries = maxentries
+    self.entries = {}
+    self.lock = threading.Lock()
+
+  def get(self, path):
+    """ The meta data of the path, None if not known or too old
+    """
+    entry = self.entries.get(path)
+    if entry is None or time.time() - entry[0] > self.ttl:
+      return None
+    return entry[1]
+
+  def set(self, path, metadata):
+    """ Keep the meta data of the path
+    """
+    self.lock.acquire()
+    try:
+      self.entries[path] = (time.time(), metadata)
+      if len(self.entries) > self.maxentries:
+        oldest = sorted([(entry[0], key) for key, entry in self.entries.items()])
+        for _stored, key in oldest[:max(len(oldest) / 10, 1)]:
+          del self.entries[key]
+    finally:
+      self.lock.release()
+
+  def clear(self):
+    """ Forget everything
+    """
+    self.lock.acquire()
+    try:
+      self.entries.clear()
+    finally:
+      self.lock.release()
+
+#Meta data already obtained: LFN -> file meta data, directory -> directory meta data
+_fileMetadataCache = MetadataCache()
+_directoryMetadataCache = MetadataCache()
+
+def _getMetadata(paths, method, cache, requiredKey = None, maxthreads = 10):
+  """ Get the meta data of the paths that are not in the cache, concurrently, and return copies
+  of the cached values. Failed lookups, and the meta data without requiredKey if given, are not kept.
+  """
+  metadata = {}
+  missing = []
+  seen = set()
+  for path in paths:
+    if path in seen:
+      continue
+    seen.add(path)
+    cached = cache.get(path)
+    if cached is None or (requiredKey and not cached.has_key(requiredKey)):
+      missing.append(path)
+    else:
+      metadata[path] = dict(cached)
+  if missing:
+    fc = FileCatalogClient()
+    results = threadedMap(lambda path: getattr(fc, method)(path), missing, maxthreads)
+    for path, res in zip(missing, results):
+      if res['OK']:
+        if not requiredKey or res['Value'].has_key(requiredKey):
+          cache.set(path, res['Value'])
+        metadata[path] = dict(res['Value'])
+      else:
+        gLogger.verbose("Failed to get meta data of %s:" % path, res['Message'])
+  return metadata
+
+def getFileUserMetadata(lfns, requiredKey = None):
+  """ Get the user meta data of the files, from the cache or the FileCatalog
+
+  @param requiredKey: the meta data without this key is not cached
+  @return: dict LFN -> meta data, the files for which the lookup failed are not present
+  """
+  return _getMetadata(lfns, 'getFileUserMetadata', _fileMetadataCache, requiredKey)
+
+def getDirectoryMetadata(paths, requiredKey = None):
+  """ Get the meta data of the directories, from the cache or the FileCatalog
 
-from DIRAC import gLogger
+  @param requiredKey: the meta data without this key is not cached
+  @return: dict directory -> meta data, the directories for which the lookup failed are not present
+  """
+  return _getMetadata(paths, 'getDirectoryMetadata', _directoryMetadataCache, requiredKey)
 
 def getNumberOfevents(inputfile):
   """ Find from the FileCatalog the number of events in a file
@@ -23,37 +115,47 @@ def getNumberOfevents(inputfile):
       flist[bpath] = [myfile]
     else:
       flist[bpath].append(myfile)
-      
-  fc = FileCatalogClient()
-  nbevts = {} 
+
+  nbevts = {}
   luminosity = 0
   numberofevents = 0
   evttype = ''
   others = {}
 
+  ##Get all the meta data needed in bulk: the directories, and the files alone in their directory
+  dirmeta = getDirectoryMetadata(flist.keys())
+  filemeta = getFileUserMetadata([files[0] for files in flist.values() if len(files) == 1])
+  ##then the files of the directories that do not define the number of events
+  needed = []
+  for path, files in flist.items():
+    if len(files) == 1 and filemeta.get(files[0], {}).has_key("NumberOfEvents"):
+      continue
+    if dirmeta.get(path, {}).has_key("NumberOfEvents"):
+      continue
+    needed.extend(files)
+  filemeta.update(getFileUserMetadata(needed))
+
   for path, files in flist.items():
     found_nbevts = False
     found_lumi = False
 
     if len(files) == 1:
-      res = fc.getFileUserMetadata(files[0])
-      if not res['OK']:
+      if not files[0] in filemeta:
         gLogger.verbose("Failed to get meta data")
         continue
-      tags = res['Value']
+      tags = filemeta[files[0]]
       if tags.has_key("NumberOfEvents") and not found_nbevts:
         numberofevents += int(tags["NumberOfEvents"])
         found_nbevts = True
       if tags.has_key("Luminosity") and not found_lumi:
-        luminosity += float(tags["Luminosity"])  
+        luminosity += float(tags["Luminosity"])
         found_lumi = True
-      others.update(tags)  
-      if found_nbevts: 
+      others.update(tags)
+      if found_nbevts:
         continue
-        
-    res = fc.getDirectoryMetadata(path)
-    if res['OK']:   
-      tags = res['Value']
+
+    if path in dirmeta:
+      tags = dirmeta[path]
       if tags.has_key("NumberOfEvents") and not found_nbevts:
         numberofevents += len(files)*int(tags["NumberOfEvents"])
         found_nbevts = True
@@ -62,21 +164,20 @@ def getNumberOfevents(inputfile):
         found_lumi = True
       if tags.has_key("EvtType"):
         evttype = tags["EvtType"]
-      others.update(tags)    
-      if found_nbevts: 
+      others.update(tags)
+      if found_nbevts:
         continue
-      
+
     for myfile in files:
-      res = fc.getFileUserMetadata(myfile)
-      if not res['OK']:
+      if not myfile in filemeta:
         continue
-      tags = res['Value']
+      tags = filemeta[myfile]
       if tags.has_key("NumberOfEvents"):
         numberofevents += int(tags["NumberOfEvents"])
       if tags.has_key("Luminosity") and not found_lumi:
         luminosity += float(tags["Luminosity"])
-      others.update(tags)  
-        
+      others.update(tags)
+
   nbevts['nbevts'] = numberofevents
   nbevts['lumi'] = luminosity
   nbevts['EvtType'] = evttype
@@ -86,3 +187,29 @@ def getNumberOfevents(inputfile):
     del others['Luminosity']
   nbevts['AdditionalMeta'] = others
   return nbevts
+
+def getNumberOfEventsPerFile(lfns):
+  """ Find from the FileCatalog the number of events in each file: the directory meta data is used
+  for all the files of a directory, the file meta data is only looked up for the directories that
+  do not have it.
+
+  @return: S_OK(dict) LFN -> number of events, S_ERROR if one file has no number of events
+  """
+  flist = {}
+  for lfn in lfns:
+    flist.setdefault(os.path.dirname(lfn), []).append(lfn)
+  dirmeta = getDirectoryMetadata(flist.keys())
+  nbevts = {}
+  needed = []
+  for path, files in flist.items():
+    if dirmeta.get(path, {}).has_key("NumberOfEvents"):
+      for lfn in files:
+        nbevts[lfn] = int(dirmeta[path]["NumberOfEvents"])
+    else:
+      needed.extend(files)
+  filemeta = getFileUserMetadata(needed)
+  for lfn in needed:
+    if not filemeta.get(lfn, {}).has_key("NumberOfEvents"):
+      return S_ERROR("The file %s does not have attached number of events" % lfn)
+    nbevts[lfn] = int(filemeta[lfn]["NumberOfEvents"])
+  return S_OK(nbevts)
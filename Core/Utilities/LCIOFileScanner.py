@@ -0,0 +1,148 @@
+'''
+Scan LCIO files to know which collections each event contains, without LCIO.
+
+LCIO files are a sequence of SIO records, each made of a record header and of the record data (compressed
+or not). Every event is written as a LCEventHeader record, holding the names and types of the collections
+of the event, followed by the LCEvent record holding the collections. Only the small event header records
+are read (and decompressed); the event records are skipped using the lengths in their record headers.
+
+Used by L{CheckCollections}.
+
+@since: Oct 18, 2026
+
+@author: agent
+'''
+
+from DIRAC import S_OK, S_ERROR
+import struct, zlib
+
+RECORD_MARKER = 0xabadcafe
+BLOCK_MARKER = 0xdeadbeef
+OPT_COMPRESS = 0x00000001
+EVENTHEADER_RECORD = "LCEventHeader"
+EVENTHEADER_BLOCK = "EventHeader"
+#Number of events given in the report for each missing collection
+MAX_REPORTED_EVENTS = 10
+
+def _string(data, pos):
+  """ Read the SIO string at pos, return it and the position following it
+  """
+  length = struct.unpack(">I", data[pos:pos + 4])[0]
+  pos += 4
+  return data[pos:pos + length], pos + ((length + 3) & ~3)
+
+def readEventHeader(data):
+  """ Decode the EventHeader block of a LCEventHeader record data
+
+  @return: tuple (run number, event number, list of collection names)
+  """
+  pos = 0
+  while pos + 16 <= len(data):
+    blocklength, marker, version, namelength = struct.unpack(">IIII", data[pos:pos + 16])
+    if marker != BLOCK_MARKER:
+      raise ValueError("bad block marker")
+    name = data[pos + 16:pos + 16 + namelength]
+    if name == EVENTHEADER_BLOCK:
+      cur = pos + 16 + ((namelength + 3) & ~3)
+      run, event = struct.unpack(">ii", data[cur:cur + 8])
+      cur += 16 #run, event, time stamp
+      detector, cur = _string(data, cur)
+      ncol = struct.unpack(">i", data[cur:cur + 4])[0]
+      cur += 4
+      collections = []
+      for i in xrange(ncol):
+        colname, cur = _string(data, cur)
+        coltype, cur = _string(data, cur)
+        collections.append(colname)
+      return run, event, collections
+    pos += blocklength
+  raise ValueError("no EventHeader block")
+
+def scanFile(path):
+  """ Read the event headers of a LCIO file
+
+  @return: S_OK(list of (run number, event number, list of collection names)), one per event
+  """
+  events = []
+  try:
+    lciofile = open(path, "rb")
+  except IOError, x:
+    return S_ERROR("Cannot open %s: %s" % (path, str(x)))
+  try:
+    try:
+      while True:
+        start = lciofile.tell()
+        head = lciofile.read(24)
+        if not head:
+          break
+        if len(head) < 24:
+          return S_ERROR("%s is truncated at byte %s" % (path, start))
+        headlength, marker, options, datalength, ucmplength, namelength = struct.unpack(">IIIIII", head)
+        if marker != RECORD_MARKER:
+          return S_ERROR("%s is not a LCIO file or is corrupted at byte %s" % (path, start))
+        name = lciofile.read(namelength)
+        datastart = start + headlength
+        nextrecord = datastart + ((datalength + 3) & ~3)
+        if name == EVENTHEADER_RECORD:
+          lciofile.seek(datastart)
+          data = lciofile.read(datalength)
+          if len(data) < datalength:
+            return S_ERROR("%s is truncated at byte %s" % (path, datastart + len(data)))
+          if options & OPT_COMPRESS:
+            data = zlib.decompress(data)
+          events.append(readEventHeader(data))
+        lciofile.seek(nextrecord)
+    except (struct.error, ValueError, zlib.error), x:
+      return S_ERROR("Failed to read the event headers of %s: %s" % (path, str(x)))
+  finally:
+    lciofile.close()
+  return S_OK(events)
+
+def _fileReport(args):
+  """ Report on the presence of the collections in the events of a file. Module level function, so that
+  it can be given to the processes of a pool.
+  """
+  path, collections = args
+  report = {'Events' : 0, 'Collections' : dict([(col, 0) for col in collections]),
+            'MissingIn' : dict([(col, []) for col in collections]), 'OK' : False}
+  res = scanFile(path)
+  if not res['OK']:
+    report['Error'] = res['Message']
+    return report
+  report['Events'] = len(res['Value'])
+  for run, event, present in res['Value']:
+    present = set(present)
+    for col in collections:
+      if col in present:
+        report['Collections'][col] += 1
+      elif len(report['MissingIn'][col]) < MAX_REPORTED_EVENTS:
+        report['MissingIn'][col].append((run, event))
+  report['OK'] = min([report['Events']] + report['Collections'].values()) == report['Events']
+  return report
+
+def checkCollections(files, collections, maxprocesses = 0):
+  """ Check that all the events of the files contain the collections. The files are read in parallel,
+  by at most maxprocesses processes (the number of cores if 0).
+
+  @return: S_OK(dict) file -> report, the report being a dictionary with the number of Events, for each
+  collection the number of events containing it (Collections) and the first run and event numbers of the
+  events not containing it (MissingIn), an Error if the file could not be read, and the OK flag
+  """
+  args = [(path, list(collections)) for path in files]
+  reports = None
+  if len(args) > 1:
+    try:
+      import multiprocessing
+      if not maxprocesses:
+        maxprocesses = multiprocessing.cpu_count()
+      pool = multiprocessing.Pool(min(maxprocesses, len(args)))
+      try:
+        reports = pool.map(_fileReport, args)
+      finally:
+        pool.close()
+        pool.join()
+    except (ImportError, OSError, NotImplementedError):
+      reports = None
+  if reports is None:
+    reports = [_fileReport(arg) for arg in args]
+  return S_OK(dict(zip(files, reports)))
@@ -0,0 +1,134 @@
+'''
+Build the tar ball of the log files of a job directly from the files, without copying them first.
+
+The text files larger than the size limit are cut: their beginning and their end are kept, separated by a
+line telling how many bytes were dropped. L{UploadLogFile} leaves out the larger binary files, see
+L{isTextFile}.
+
+@since: Oct 18, 2026
+
+@author: agent
+'''
+
+from DIRAC import S_OK, S_ERROR, gLogger
+import os, tarfile, time
+
+CODECS = {'gz' : 'gz', 'gzip' : 'gz', 'bz2' : 'bz2', 'bzip2' : 'bz2'}
+
+class TruncatedFile(object):
+  """ Read only file object giving the first and last limit/2 bytes of a file
+  """
+  def __init__(self, path, limit):
+    self.fileobj = open(path, 'rb')
+    self.filesize = os.fstat(self.fileobj.fileno()).st_size
+    self.head = limit / 2
+    self.tail = limit - self.head
+    self.marker = "\n[... %s bytes not kept in the logs ...]\n" % (self.filesize - self.head - self.tail)
+    self.size = self.head + len(self.marker) + self.tail
+    self.pos = 0
+
+  def read(self, size = -1):
+    """ Read size bytes, everything if negative
+    """
+    if size < 0:
+      size = self.size - self.pos
+    parts = []
+    while size > 0 and self.pos < self.size:
+      if self.pos < self.head:
+        data = self.fileobj.read(min(size, self.head - self.pos))
+      elif self.pos < self.head + len(self.marker):
+        start = self.pos - self.head
+        data = self.marker[start:start + size]
+      else:
+        self.fileobj.seek(self.filesize - self.tail + self.pos - self.head - len(self.marker))
+        data = self.fileobj.read(min(size, self.size - self.pos))
+      if not data:
+        break
+      parts.append(data)
+      self.pos += len(data)
+      size -= len(data)
+    return "".join(parts)
+
+  def close(self):
+    """ Close the file
+    """
+    self.fileobj.close()
+
+def isTextFile(path, blocksize = 8192):
+  """ Whether the file looks like text: no NUL byte in its first block, as grep -I decides
+  """
+  fileobj = open(path, 'rb')
+  try:
+    return not '\0' in fileobj.read(blocksize)
+  finally:
+    fileobj.close()
+
+def openLogFile(path, limit):
+  """ Open a log file for reading, cut if larger than limit
+
+  @return: tuple (file object, size of what it gives)
+  """
+  size = os.path.getsize(path)
+  if limit and size > limit:
+    fileobj = TruncatedFile(path, limit)
+    return fileobj, fileobj.size
+  return open(path, 'rb'), size
+
+def copyLogFile(path, destination, limit):
+  """ Put the log file in destination: a hard link if it is not too large, else a cut copy
+  """
+  if not limit or os.path.getsize(path) <= limit:
+    try:
+      os.link(path, destination)
+      return
+    except OSError:
+      pass
+  source, size = openLogFile(path, limit)
+  try:
+    out = open(destination, 'wb')
+    try:
+      while True:
+        data = source.read(1024 * 1024)
+        if not data:
+          break
+        out.write(data)
+    finally:
+      out.close()
+  finally:
+    source.close()
+
+def writeLogArchive(tarpath, files, limit = 0, codec = 'gz', level = 6):
+  """ Write the tar ball of the log files
+
+  @param tarpath: tar ball to write
+  @param files: list of the files to put in it, under their base name
+  @param limit: size above which a file is cut, no limit if 0
+  @param codec: gz or bz2
+  @param level: compression level, from 1 to 9
+  @return: S_OK(tar ball path)
+  """
+  log = gLogger.getSubLogger('LogArchive')
+  codec = CODECS.get(str(codec).lower(), 'gz')
+  level = min(max(int(level), 1), 9)
+  start = time.time()
+  try:
+    tfile = tarfile.open(tarpath, "w:%s" % codec, compresslevel = level)
+    try:
+      for path in files:
+        try:
+          fileobj, size = openLogFile(path, limit)
+        except (IOError, OSError), x:
+          log.error('Cannot read %s, it will not be in the logs:' % path, str(x))
+          continue
+        try:
+          info = tfile.gettarinfo(path, os.path.basename(path))
+          info.size = size
+          tfile.addfile(info, fileobj)
+        finally:
+          fileobj.close()
+    finally:
+      tfile.close()
+  except Exception, x:
+    return S_ERROR('Failed to write %s: %s' % (tarpath, str(x)))
+  log.info('Wrote %s in %.1f s' % (tarpath, time.time() - start))
+  return S_OK(tarpath)
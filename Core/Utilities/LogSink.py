@@ -0,0 +1,150 @@
+'''
+Destination of the output of the applications run by the workflow modules.
+
+The output lines are written to the application log through one buffered file handle, the lines matching
+the event strings are echoed to stdout at a limited rate, and the last lines of stderr are kept in a ring
+buffer. Used by L{ModuleBase.redirectLogOutput}, the owner must call L{LogSink.close} when the application
+is done so that the log file is complete. A sink can be shared by threads, like the overlay downloads: a
+close while another thread writes only makes the next line open the log file again.
+
+@since: Oct 18, 2026
+
+@author: agent
+'''
+
+from DIRAC import gLogger
+from collections import deque
+import re, sys, threading, time
+
+class LogSink(object):
+  """ Write the application output to a log file
+  """
+  def __init__(self, path, eventstring = None, excludeAllButEventString = False, maxerrorlines = 1000,
+               maxechorate = 10, buffersize = 1048576, flushinterval = 10):
+    """
+    @param path: application log file, appended to
+    @param eventstring: list of regular expressions, the lines matching one of them are echoed to stdout. As
+    in the past, everything is echoed if the list is empty, and nothing if its first element is empty.
+    @param excludeAllButEventString: only write to the log the lines matching the event strings
+    @param maxerrorlines: number of stderr lines kept
+    @param maxechorate: maximum number of lines echoed to stdout per second, the others are counted
+    @param buffersize: size of the buffer of the log file
+    @param flushinterval: the log file is flushed at least every flushinterval seconds
+    """
+    if type(eventstring) == type(' '):
+      eventstring = [eventstring]
+    if eventstring is None:
+      eventstring = ['']
+    self.path = path
+    self.eventstring = list(eventstring)
+    self.excludeAllButEventString = excludeAllButEventString
+    self.pattern = None
+    if len(self.eventstring) and len(self.eventstring[0]):
+      self.pattern = re.compile("|".join(["(?:%s)" % mystring for mystring in self.eventstring]))
+    self.echoall = not len(self.eventstring)
+    self.errors = deque(maxlen = maxerrorlines)
+    self.maxechorate = maxechorate
+    self.buffersize = buffersize
+    self.flushinterval = flushinterval
+    self.logfile = None
+    self.lastflush = 0
+    self.echowindow = 0
+    self.echoed = 0
+    self.suppressed = 0
+    self.warned = False
+    self.lock = threading.RLock()
+
+  def write(self, fd, message):
+    """ Handle a line of output, fd being 0 for stdout and 1 for stderr (as given by shellCall)
+    """
+    self.lock.acquire()
+    try:
+      self._write(fd, message)
+    finally:
+      self.lock.release()
+
+  def _write(self, fd, message):
+    """ Handle a line of output, with the lock held
+    """
+    if message:
+      match = self.echoall or (self.pattern is not None and self.pattern.search(message) is not None)
+      if match:
+        self._echo(message)
+      if self.path:
+        if not self.excludeAllButEventString or (self.pattern is not None and match):
+          if self.logfile is None:
+            self.logfile = open(self.path, 'a', self.buffersize)
+            self.lastflush = time.time()
+          self.logfile.write(message + '\n')
+          now = time.time()
+          if now - self.lastflush > self.flushinterval:
+            self.logfile.flush()
+            self.lastflush = now
+      elif not self.warned:
+        gLogger.error("Application Log file not defined")
+        self.warned = True
+    if fd == 1:
+      self.errors.append(message)
+
+  def _echo(self, message):
+    """ Print the line, unless too many were printed in the last second
+    """
+    now = time.time()
+    if now - self.echowindow >= 1:
+      if self.suppressed:
+        print "(%s lines not shown)" % self.suppressed
+        self.suppressed = 0
+      self.echowindow = now
+      self.echoed = 0
+    if self.echoed < self.maxechorate:
+      self.echoed += 1
+      print message
+      sys.stdout.flush()
+    else:
+      self.suppressed += 1
+
+  def getErrors(self):
+    """ The last stderr lines
+    """
+    self.lock.acquire()
+    try:
+      return "\n".join(self.errors)
+    finally:
+      self.lock.release()
+
+  def setErrors(self, value):
+    """ Replace the stderr lines by value, used to reset them
+    """
+    self.lock.acquire()
+    try:
+      self.errors.clear()
+      if value:
+        self.errors.append(value)
+    finally:
+      self.lock.release()
+
+  def flush(self):
+    """ Write the buffered lines to the log file
+    """
+    self.lock.acquire()
+    try:
+      if self.logfile is not None:
+        self.logfile.flush()
+        self.lastflush = time.time()
+    finally:
+      self.lock.release()
+
+  def close(self):
+    """ Close the log file, it is opened again if more lines come. Report the lines not echoed.
+    """
+    self.lock.acquire()
+    try:
+      if self.suppressed:
+        print "(%s lines not shown)" % self.suppressed
+        sys.stdout.flush()
+        self.suppressed = 0
+      if self.logfile is not None:
+        self.logfile.close()
+        self.logfile = None
+    finally:
+      self.lock.release()
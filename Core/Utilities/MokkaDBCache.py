@@ -0,0 +1,217 @@
+'''
+Node level cache of initialised Mokka databases, shared between the jobs running on the same worker node.
+
+An entry is a MySQL data directory where mysql_install_db was run, the passwords and grants set and the
+detector database dump imported, the server being then shut down cleanly. It is identified by the mysqld
+binary and the dump file (their checksums), and copied to the job directory with a copy on write clone
+(cp --reflink=auto) when the file system supports it, or a plain copy otherwise. The files are not hard
+linked: mysqld writes in its data files, which would modify the cached copy. Called from L{SQLWrapper}.
+
+@since: Oct 18, 2026
+
+@author: agent
+'''
+
+from DIRAC import gLogger, S_OK, S_ERROR
+from DIRAC.Core.Utilities.Subprocess import shellCall
+import DIRAC
+from ILCDIRAC.Core.Utilities.CombinedSoftwareInstallation import LocalArea
+
+import os, shutil, fcntl, tempfile, time
+try:
+  import hashlib as md5
+except:
+  import md5
+
+def getMokkaDBCacheDir():
+  """ Get the location of the node cache: /LocalSite/MokkaDBCacheDir if defined,
+  otherwise the mokkadbcache directory in the LocalArea
+  """
+  cachedir = DIRAC.gConfig.getValue('/LocalSite/MokkaDBCacheDir', '')
+  if not cachedir:
+    localarea = LocalArea()
+    if not localarea:
+      return S_ERROR("No LocalArea to put the Mokka DB cache in")
+    cachedir = os.path.join(localarea, "mokkadbcache")
+  if not os.path.isdir(cachedir):
+    try:
+      os.makedirs(cachedir)
+    except OSError, x:
+      if not os.path.isdir(cachedir):
+        return S_ERROR("Cannot create the Mokka DB cache %s: %s" % (cachedir, str(x)))
+  return S_OK(cachedir)
+
+def _fileChecksum(path):
+  """ MD5 of the content of a file
+  """
+  digest = md5.md5()
+  fileobj = open(path, 'rb')
+  try:
+    while True:
+      data = fileobj.read(1024 * 1024)
+      if not data:
+        break
+      digest.update(data)
+  finally:
+    fileobj.close()
+  return digest.hexdigest()
+
+class MokkaDBCache(object):
+  """ Content of the node cache. One lock file per entry makes the jobs needing an entry being built wait
+  for it instead of building it too. The jobs copying a complete entry share its lock, it is taken
+  exclusively only to build or remove the entry.
+  """
+  def __init__(self, cachedir, maxentries = 4):
+    """
+    @param cachedir: directory holding the cached data directories
+    @param maxentries: number of data directories kept, the least recently used are removed
+    """
+    self.cachedir = cachedir
+    self.maxentries = maxentries
+    self.log = gLogger.getSubLogger("MokkaDBCache")
+
+  def getKey(self, mysqld, dumpfile):
+    """ The key of the data directory made by the mysqld binary from the dump file
+    """
+    return "%s_%s" % (_fileChecksum(mysqld)[:12], _fileChecksum(dumpfile)[:12])
+
+  def _lock(self, path, blocking = True, shared = False):
+    """ Get an exclusive, or shared, lock on path. Returns the lock file, or None if it could not be acquired
+    """
+    lockfile = open(path, "a")
+    flags = fcntl.LOCK_EX
+    if shared:
+      flags = fcntl.LOCK_SH
+    if not blocking:
+      flags |= fcntl.LOCK_NB
+    try:
+      fcntl.flock(lockfile.fileno(), flags)
+    except IOError:
+      lockfile.close()
+      return None
+    return lockfile
+
+  def _unlock(self, lockfile):
+    """ Release a lock obtained with L{_lock}
+    """
+    fcntl.flock(lockfile.fileno(), fcntl.LOCK_UN)
+    lockfile.close()
+
+  def _clone(self, source, destination):
+    """ Copy the data directory, sharing the blocks if the file system can
+    """
+    if os.path.isdir(destination):
+      shutil.rmtree(destination)
+    res = shellCall(0, 'cp -a --reflink=auto "%s" "%s"' % (source, destination))
+    if res['OK'] and not res['Value'][0]:
+      return
+    self.log.verbose("cp --reflink failed, copying %s" % source)
+    if os.path.isdir(destination):
+      shutil.rmtree(destination)
+    shutil.copytree(source, destination, True)
+
+  def getDataDir(self, key, destination, builder):
+    """ Make the data directory of key available as destination, from the cache if possible, otherwise
+    calling the builder to make the cache entry
+
+    @param key: as given by L{getKey}
+    @param destination: data directory of the job, replaced
+    @param builder: callable taking the path of a new data directory, to initialise and load, with the server
+    shut down at the end. Returns S_OK/S_ERROR.
+    @return: S_OK(True if the entry was already there)
+    """
+    entry = os.path.join(self.cachedir, key)
+    marker = os.path.join(entry, ".complete")
+    found = True
+    lock = None
+    try:
+      try:
+        ##The entry can be removed between the exclusive and the shared lock, it is then built again
+        for _attempt in range(3):
+          lock = self._lock(entry + ".lock", shared = True)
+          if os.path.exists(marker):
+            break
+          self._unlock(lock)
+          lock = None
+          lock = self._lock(entry + ".lock")
+          if not os.path.exists(marker):
+            found = False
+            res = self._build(key, entry, builder)
+            if not res['OK']:
+              return res
+          fcntl.flock(lock.fileno(), fcntl.LOCK_SH)
+          if os.path.exists(marker):
+            break
+          self._unlock(lock)
+          lock = None
+        else:
+          return S_ERROR("The database %s keeps being removed from the node cache" % key)
+      except IOError, x:
+        return S_ERROR("Cannot lock or build the cache entry %s: %s" % (entry, str(x)))
+      start = time.time()
+      try:
+        self._clone(entry, destination)
+        os.remove(os.path.join(destination, ".complete"))
+      except (OSError, IOError, shutil.Error), x:
+        return S_ERROR("Could not copy the database %s: %s" % (key, str(x)))
+      ##Used as LRU information
+      os.utime(marker, None)
+      self.log.info("Got the database %s from the node cache in %.1f s" % (key, time.time() - start))
+    finally:
+      if lock:
+        self._unlock(lock)
+    self.evict()
+    return S_OK(found)
+
+  def _build(self, key, entry, builder):
+    """ Build the entry in a temporary directory and move it in place, with the exclusive lock of the entry
+    """
+    self.log.info("Initialising the database %s of the node cache" % key)
+    if os.path.isdir(entry):
+      shutil.rmtree(entry, True)
+    tmpentry = tempfile.mkdtemp(prefix = ".tmp_%s_" % key, dir = self.cachedir)
+    start = time.time()
+    try:
+      res = builder(tmpentry)
+      if not res['OK']:
+        return res
+      open(os.path.join(tmpentry, ".complete"), "w").close()
+      os.rename(tmpentry, entry)
+    finally:
+      if os.path.isdir(tmpentry):
+        shutil.rmtree(tmpentry, True)
+    self.log.info("Database %s initialised in %.1f s" % (key, time.time() - start))
+    return S_OK()
+
+  def evict(self):
+    """ Remove the least recently used entries beyond maxentries, unless they are in use
+    """
+    lock = self._lock(os.path.join(self.cachedir, ".evict.lock"), blocking = False)
+    if not lock:
+      return S_OK()
+    try:
+      entries = []
+      for name in os.listdir(self.cachedir):
+        path = os.path.join(self.cachedir, name)
+        ##Left by jobs that died while building an entry
+        if name.startswith(".tmp_") and time.time() - os.stat(path).st_mtime > 86400:
+          shutil.rmtree(path, True)
+          continue
+        marker = os.path.join(path, ".complete")
+        if name.startswith(".") or not os.path.exists(marker):
+          continue
+        entries.append((os.stat(marker).st_mtime, name))
+      entries.sort()
+      for mtime, name in entries[:max(len(entries) - self.maxentries, 0)]:
+        path = os.path.join(self.cachedir, name)
+        entrylock = self._lock(path + ".lock", blocking = False)
+        if not entrylock:
+          continue
+        try:
+          shutil.rmtree(path, True)
+          self.log.verbose("Removed %s from the node cache" % path)
+        finally:
+          self._unlock(entrylock)
+    finally:
+      self._unlock(lock)
+    return S_OK()
@@ -0,0 +1,198 @@
+'''
+Node level cache of the overlay files, shared between the jobs running on the same worker node.
+
+The files are stored once per node, under a name derived from their LFN (LFNs are never reused for
+a different content), and are hard linked (or copied if the cache is on another file system) into the
+job directory, so that removing a file from the cache never affects a running job. The cache size is
+kept under a byte budget by removing the least recently used files. Called from L{OverlayInput}.
+
+@since: Oct 18, 2026
+
+@author: agent
+'''
+
+from DIRAC import gLogger, S_OK, S_ERROR
+import DIRAC
+from ILCDIRAC.Core.Utilities.CombinedSoftwareInstallation import LocalArea
+
+import os, shutil, fcntl, tempfile
+try:
+  import hashlib as md5
+except:
+  import md5
+
+def getOverlayCacheDir():
+  """ Get the location of the node cache: /LocalSite/OverlayCacheDir if defined,
+  otherwise the overlaycache directory in the LocalArea
+  """
+  cachedir = DIRAC.gConfig.getValue('/LocalSite/OverlayCacheDir', '')
+  if not cachedir:
+    localarea = LocalArea()
+    if not localarea:
+      return S_ERROR("No LocalArea to put the overlay cache in")
+    cachedir = os.path.join(localarea, "overlaycache")
+  if not os.path.isdir(cachedir):
+    try:
+      os.makedirs(cachedir)
+    except OSError, x:
+      if not os.path.isdir(cachedir):
+        return S_ERROR("Cannot create the overlay cache %s: %s" % (cachedir, str(x)))
+  return S_OK(cachedir)
+
+class OverlayFileCache(object):
+  """ Content of the node cache. One lock file per cached file prevents 2 jobs to get the same file
+  at the same time, and a global lock prevents concurrent evictions.
+  """
+  def __init__(self, cachedir, maxsize):
+    """
+    @param cachedir: directory holding the cached files
+    @param maxsize: maximum size of the cache, in bytes
+    """
+    self.cachedir = cachedir
+    self.maxsize = maxsize
+    self.log = gLogger.getSubLogger("OverlayFileCache")
+
+  def _entryPath(self, lfn):
+    """ Path of the cache entry corresponding to a given LFN
+    """
+    key = md5.md5(lfn).hexdigest()
+    return os.path.join(self.cachedir, key[:2], "%s_%s" % (key, os.path.basename(lfn)))
+
+  def _lock(self, path, blocking = True):
+    """ Get an exclusive lock on path. Returns the lock file, or None if it could not be acquired
+    """
+    lockfile = open(path, "a")
+    flags = fcntl.LOCK_EX
+    if not blocking:
+      flags |= fcntl.LOCK_NB
+    try:
+      fcntl.flock(lockfile.fileno(), flags)
+    except IOError:
+      lockfile.close()
+      return None
+    return lockfile
+
+  def _unlock(self, lockfile):
+    """ Release a lock obtained with L{_lock}
+    """
+    fcntl.flock(lockfile.fileno(), fcntl.LOCK_UN)
+    lockfile.close()
+
+  def _materialise(self, entry, destination):
+    """ Make the cached file available as destination: hard link, or copy if not possible. Not a symbolic
+    link, that would not prevent the eviction of the file while the job uses it.
+    """
+    if os.path.lexists(destination):
+      os.unlink(destination)
+    try:
+      os.link(entry, destination)
+    except OSError:
+      fd, tmpdestination = tempfile.mkstemp(prefix = ".tmp_", dir = os.path.dirname(destination))
+      os.close(fd)
+      try:
+        shutil.copy2(entry, tmpdestination)
+        os.rename(tmpdestination, destination)
+      except (OSError, IOError):
+        if os.path.exists(tmpdestination):
+          os.unlink(tmpdestination)
+        raise
+    ##Used as LRU information
+    os.utime(entry, None)
+
+  def _store(self, path, entry):
+    """ Put a downloaded file in the cache, atomically
+    """
+    try:
+      os.link(path, entry)
+      return
+    except OSError:
+      pass
+    fd, tmpentry = tempfile.mkstemp(prefix = ".tmp_", dir = os.path.dirname(entry))
+    os.close(fd)
+    try:
+      shutil.copy2(path, tmpentry)
+      os.rename(tmpentry, entry)
+    except Exception:
+      if os.path.exists(tmpentry):
+        os.unlink(tmpentry)
+      raise
+
+  def getFile(self, lfn, destdir, getter):
+    """ Make the file available in destdir, from the cache if possible, otherwise calling the getter
+    and populating the cache with the result.
+
+    @param lfn: LFN of the file
+    @param destdir: directory where the file must appear
+    @param getter: callable that downloads the LFN in destdir, returns the same structure as
+    ReplicaManager.getFile
+    @return: S_OK(dict) like ReplicaManager.getFile
+    """
+    entry = self._entryPath(lfn)
+    destination = os.path.join(destdir, os.path.basename(lfn))
+    if not os.path.isdir(os.path.dirname(entry)):
+      try:
+        os.makedirs(os.path.dirname(entry))
+      except OSError:
+        pass
+    try:
+      lock = self._lock(entry + ".lock")
+    except IOError, x:
+      self.log.warn("Cannot lock the cache entry, not using the cache:", str(x))
+      return getter(lfn)
+    try:
+      if os.path.exists(entry):
+        self.log.verbose("Taking %s from the node cache" % lfn)
+        try:
+          self._materialise(entry, destination)
+          return S_OK({'Successful' : {lfn : destination}, 'Failed' : {}})
+        except (OSError, IOError), x:
+          self.log.warn("Could not link or copy %s, getting the file again:" % entry, str(x))
+      res = getter(lfn)
+      if not res['OK']:
+        return res
+      if not len(res['Value'].get('Failed', [])) and os.path.exists(destination):
+        try:
+          self._store(destination, entry)
+        except Exception, x:
+          self.log.warn("Could not put %s in the node cache:" % lfn, str(x))
+    finally:
+      self._unlock(lock)
+    self.evict()
+    return res
+
+  def evict(self):
+    """ Remove the least recently used files until the cache fits in maxsize. Files still hard linked
+    from a job directory are kept. The jobs that got a copy do not depend on the cache.
+    """
+    lock = self._lock(os.path.join(self.cachedir, ".evict.lock"), blocking = False)
+    if not lock:
+      return S_OK()
+    try:
+      entries = []
+      totalsize = 0
+      for dirpath, dirnames, filenames in os.walk(self.cachedir):
+        for fname in filenames:
+          if fname.endswith(".lock") or fname.startswith("."):
+            continue
+          path = os.path.join(dirpath, fname)
+          try:
+            stat = os.stat(path)
+          except OSError:
+            continue
+          totalsize += stat.st_size
+          entries.append((stat.st_mtime, stat.st_size, stat.st_nlink, path))
+      entries.sort()
+      for mtime, size, nlink, path in entries:
+        if totalsize <= self.maxsize:
+          break
+        if nlink > 1:
+          continue
+        try:
+          os.unlink(path)
+          totalsize -= size
+          self.log.verbose("Removed %s from the node cache" % path)
+        except OSError, x:
+          self.log.warn("Could not remove %s:" % path, str(x))
+    finally:
+      self._unlock(lock)
+    return S_OK()
@@ -12,22 +12,16 @@ def removeLibc(path):
   """
   #return True
 
-  curdir = os.getcwd()
   try:
-    os.chdir(path)
+    listlibs = os.listdir(path)
   except:
     return True  
-  listlibs = os.listdir(os.getcwd())
   for lib in listlibs:
     if (lib.count("libc.so") or lib.count("libc-2.5") or lib.count("libm.so") 
         or lib.count("libpthread.so") or lib.count("libdl.so")):
       try:
-        os.remove(os.getcwd() + os.sep + lib)
+        os.remove(os.path.join(path, lib))
       except:
         print "Could not remove %s" % lib
-        os.chdir(curdir)
         return False
-  os.chdir(curdir)
   return True
-
-  
\ No newline at end of file
@@ -12,7 +12,7 @@ from DIRAC import S_OK, gLogger, S_ERROR, gConfig
 from xml.etree.ElementTree                                import ElementTree
 from xml.etree.ElementTree                                import Element
 from xml.etree.ElementTree                                import Comment
-from ILCDIRAC.Core.Utilities.ResolveDependencies          import resolveDepsTar
+from ILCDIRAC.Core.Utilities.SoftwareCatalog              import getSoftwareCatalog
 from ILCDIRAC.Core.Utilities.PrepareLibs                  import removeLibc
 from ILCDIRAC.Core.Utilities.GetOverlayFiles              import getOverlayFiles
 from ILCDIRAC.Core.Utilities.CombinedSoftwareInstallation import getSoftwareFolder
@@ -27,9 +27,7 @@ def GetNewLDLibs(systemConfig, application, applicationVersion):
   @return: new LD_LIBRARY_PATH
   """
   new_ld_lib_path = ""
-  deps = resolveDepsTar(systemConfig, application, applicationVersion)
-  for dep in deps:
-    depfolder = dep.replace(".tgz","").replace(".tar.gz","")
+  for depfolder in getSoftwareCatalog().getDependencyFolders(systemConfig, application, applicationVersion):
     res = getSoftwareFolder(depfolder)
     if not res['OK']:
       continue
@@ -57,9 +55,7 @@ def GetNewPATH(systemConfig, application, applicationVersion):
   """ Same as L{GetNewLDLibs},but for the PATH
   """
   new_path = ""
-  deps = resolveDepsTar(systemConfig, application, applicationVersion)
-  for dep in deps:
-    depfolder = dep.replace(".tgz", "").replace(".tar.gz", "")
+  for depfolder in getSoftwareCatalog().getDependencyFolders(systemConfig, application, applicationVersion):
     res = getSoftwareFolder(depfolder)
     if not res['OK']:
       continue
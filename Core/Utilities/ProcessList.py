@@ -1,31 +1,97 @@
 '''
 Interface to the processlist.whiz that contains all the processes known to WHIZARD.
 
+The processes are kept in an index (process -> Detail, Generator, Model, InFile, CrossSection, ...) pickled
+next to the process list file, so that the CFG is only parsed when the file changed or is modified. The
+process list of the catalog is kept in a local cache, see L{getCachedProcessList}.
+
 @author: S. Poss
 @since: Sep 21, 2010
 '''
 from DIRAC                    import S_OK, S_ERROR, gLogger
 from DIRAC.Core.Utilities.CFG import CFG
 from pprint                   import pprint
-import os, tempfile, shutil
+import os, tempfile, shutil, cPickle, hashlib
+
+#Changed when the content of the index changes, older indexes are then rebuilt
+INDEX_VERSION = 1
 
 class ProcessList(object):
   """ The ProcessList uses internally the CFG utility to store the processes and their properties.
   """
   def __init__(self, location):
-    self.cfg = CFG()
+    self._cfg = None
     self.location = location
     self.OK = True
+    self.index = {}
     if os.path.exists(self.location):
-      self.cfg.loadFromFile(self.location)
-      if not self.cfg.existsKey('Processes'):
-        self.cfg.createNewSection('Processes')
+      checksum = _fileChecksum(self.location)
+      index = self._loadIndex(checksum)
+      if index is None:
+        self.index = self._buildIndex()
+        self._saveIndex(self.location, checksum)
+      else:
+        self.index = index
     else:
       self.OK = False  
     #written = self._writeProcessList(self.location)
     #if not written:
     #  self.OK = False
-      
+
+  def _getCFG(self):
+    """ The CFG of the process list, parsed when first needed
+    """
+    if self._cfg is None:
+      self._cfg = CFG()
+      if os.path.exists(self.location):
+        self._cfg.loadFromFile(self.location)
+        if not self._cfg.existsKey('Processes'):
+          self._cfg.createNewSection('Processes')
+    return self._cfg
+  cfg = property(_getCFG)
+
+  def _buildIndex(self):
+    """ The processes and their properties, from the CFG
+    """
+    if not self.cfg.isSection('Processes'):
+      return {}
+    return self.cfg.getAsDict("Processes")
+
+  def _indexPath(self, path):
+    """ Where the index of the process list at path is stored
+    """
+    return path + '.index'
+
+  def _loadIndex(self, checksum):
+    """ The pickled index, None if missing or not made from the current process list
+    """
+    try:
+      indexfile = open(self._indexPath(self.location), 'rb')
+      try:
+        stored = cPickle.load(indexfile)
+      finally:
+        indexfile.close()
+    except Exception:
+      return None
+    if type(stored) != type({}) or stored.get('Version') != INDEX_VERSION or stored.get('Checksum') != checksum:
+      return None
+    return stored['Processes']
+
+  def _saveIndex(self, path, checksum):
+    """ Pickle the index next to the process list, not an error if it cannot be done
+    """
+    try:
+      handle, tmpName = tempfile.mkstemp(dir = os.path.dirname(os.path.abspath(path)))
+      try:
+        os.write(handle, cPickle.dumps({'Version' : INDEX_VERSION, 'Checksum' : checksum,
+                                        'Processes' : self.index}, cPickle.HIGHEST_PROTOCOL))
+      finally:
+        os.close(handle)
+      os.chmod(tmpName, 0644)
+      os.rename(tmpName, self._indexPath(path))
+    except (OSError, IOError), x:
+      gLogger.verbose("Could not store the index of the process list:", str(x))
+
   def _writeProcessList(self, path):
     """ Write to text
     """
@@ -40,6 +106,7 @@ class ProcessList(object):
       gLogger.debug("Replacing %s" % path)
     try:
       shutil.move(tmpName, path)
+      self._saveIndex(path, _fileChecksum(path))
       return True
     except Exception, x:
       gLogger.error("Failed to overwrite process list.", x)
@@ -64,6 +131,7 @@ class ProcessList(object):
         self.cfg.deleteKey("Processes/%s" % process)
         self._addEntry(process, mydict)
         #return res
+    self.index = self._buildIndex()
     return S_OK()
     
   def _addEntry(self, process, processdic):
@@ -87,24 +155,30 @@ class ProcessList(object):
     """ Return the path to the TarBall (for install)
     @param process: process to look for
     """
-    return self.cfg.getOption("Processes/%s/TarBallCSPath" % process, None)
+    return self.index.get(process, {}).get('TarBallCSPath', None)
 
   def getInFile(self, process):
     """ Get the associated whizard.in file to the process
     """
-    return self.cfg.getOption("Processes/%s/InFile" % process, None)
+    return self.index.get(process, {}).get('InFile', None)
+
+  def getProcessInfo(self, process):
+    """ Get the properties of the process: Detail, Generator, Model, InFile, CrossSection, etc., None if
+    the process is not known
+    """
+    if not process in self.index:
+      return None
+    return dict(self.index[process])
 
   def getProcesses(self):
     """ Return the list of all processes available
     """
-    processesdict = self.cfg.getAsDict("Processes")
-    processes = processesdict.keys()
-    return processes
+    return self.index.keys()
   
   def getProcessesDict(self):
     """ Return all processes as a dictionary {'process':{'TarBall':Path, etc. etc.}}
     """
-    return self.cfg.getAsDict("Processes")
+    return dict([(process, dict(info)) for process, info in self.index.items()])
     
   
   def existsProcess(self, process):
@@ -115,7 +189,7 @@ class ProcessList(object):
   def _existsProcess(self, process):
     """ Check that the process exists
     """
-    return self.cfg.isSection('Processes/%s' % process)
+    return process in self.index
 
   def writeProcessList(self, alternativePath = None):
     """ Write the process list
@@ -131,8 +205,84 @@ class ProcessList(object):
   def printProcesses(self):
     """ Dump to screen the content of the process list.
     """
-    processesdict = self.cfg.getAsDict("Processes")
+    processesdict = self.index
     #for key,value in processesdict.items():
     #  print "%s: [%s], generated with '%s' with the model '%s' using diagram restrictions %s"%(key,value['Detail'],value['Generator'],value['Model'],value['Restrictions'])
     pprint(processesdict)
-  
\ No newline at end of file
+
+def _fileChecksum(path):
+  """ MD5 of the content of the file, identifying the version the index was made from
+  """
+  md5 = hashlib.md5()
+  fileobj = open(path, 'rb')
+  try:
+    while True:
+      data = fileobj.read(1024 * 1024)
+      if not data:
+        break
+      md5.update(data)
+  finally:
+    fileobj.close()
+  return md5.hexdigest()
+
+def getCachedProcessList(lfn, cachedir, rm = None, fc = None):
+  """ Get the process list of the catalog through a local cache. The versions of the process list are
+  kept in cachedir/<checksum>/, the checksum being the one of the catalog: the file is only downloaded
+  when the catalog has a new version. The last version is used if the catalog cannot be reached.
+
+  @param lfn: LFN of the process list
+  @param cachedir: local directory of the cache
+  @return: S_OK(L{ProcessList})
+  """
+  from DIRAC.Core.Utilities.Adler import fileAdler, compareAdler
+  if fc is None:
+    from DIRAC.Resources.Catalog.FileCatalogClient import FileCatalogClient
+    fc = FileCatalogClient()
+  name = os.path.basename(lfn)
+  checksum = None
+  res = fc.getFileMetadata(lfn)
+  if res['OK'] and res['Value']['Successful'].has_key(lfn):
+    checksum = str(res['Value']['Successful'][lfn].get('Checksum', '')).lower().zfill(8)
+  if checksum is None:
+    versions = []
+    if os.path.isdir(cachedir):
+      versions = [os.path.join(cachedir, version) for version in os.listdir(cachedir)
+                  if os.path.exists(os.path.join(cachedir, version, name))]
+    if not versions:
+      return S_ERROR("Could not get the checksum of %s, and no version is cached" % lfn)
+    versions.sort(key = lambda version: os.path.getmtime(os.path.join(version, name)))
+    gLogger.warn("Could not get the checksum of %s, using the cached version" % lfn, versions[-1])
+    return S_OK(ProcessList(os.path.join(versions[-1], name)))
+
+  versiondir = os.path.join(cachedir, checksum)
+  try:
+    if not os.path.exists(os.path.join(versiondir, name)):
+      gLogger.info("Getting the process list %s" % lfn)
+      if rm is None:
+        from DIRAC.DataManagementSystem.Client.ReplicaManager import ReplicaManager
+        rm = ReplicaManager()
+      if not os.path.isdir(cachedir):
+        os.makedirs(cachedir)
+      tmpdir = tempfile.mkdtemp(dir = cachedir, prefix = '.download')
+      try:
+        res = rm.getFile(lfn, destinationDir = tmpdir)
+        if not res['OK'] or not res['Value']['Successful'].has_key(lfn):
+          return S_ERROR("Failed to get %s" % lfn)
+        if not compareAdler(fileAdler(os.path.join(tmpdir, name)), checksum):
+          return S_ERROR("The checksum of the downloaded %s does not match the catalog" % lfn)
+        ##Build the index before the version is visible to the other users of the cache
+        ProcessList(os.path.join(tmpdir, name))
+        try:
+          os.rename(tmpdir, versiondir)
+        except OSError:
+          if not os.path.exists(os.path.join(versiondir, name)):
+            raise
+      finally:
+        if os.path.exists(tmpdir):
+          shutil.rmtree(tmpdir, True)
+      for version in os.listdir(cachedir):
+        if version != checksum and not version.startswith('.'):
+          shutil.rmtree(os.path.join(cachedir, version), True)
+  except (OSError, IOError), x:
+    return S_ERROR("Failed to update the process list cache %s: %s" % (cachedir, str(x)))
+  return S_OK(ProcessList(os.path.join(versiondir, name)))
@@ -6,6 +6,7 @@ Module to remove software. Not used if using the ProcessProductionSystem
 '''
 
 from ILCDIRAC.Core.Utilities.CombinedSoftwareInstallation  import LocalArea, SharedArea
+from ILCDIRAC.Core.Utilities.SoftwareCatalog               import getSoftwareCatalog
 from DIRAC.ConfigurationSystem.Client.Helpers.Operations            import Operations
 
 from DIRAC import S_OK, S_ERROR, gLogger
@@ -45,7 +46,7 @@ class RemoveSoft(object):
       
       appname = app.split(".")[0]
       appversion = app.split(".")[1]
-      appDir = self.ops.getValue('/AvailableTarBalls/%s/%s/%s/TarBall' % (self.systemConfig, appname, appversion), '')
+      appDir = getSoftwareCatalog().getTarBall(self.systemConfig, appname, appversion)
       appDir = appDir.replace(".tgz", "").replace(".tar.gz", "")
       mySoftwareRoot = ''
       localArea = LocalArea()
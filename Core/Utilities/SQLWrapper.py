@@ -15,19 +15,64 @@ from DIRAC import S_OK, S_ERROR, gLogger
 from DIRAC.Core.Utilities.Subprocess import shellCall, Subprocess
 from ILCDIRAC.Core.Utilities.PrepareLibs import removeLibc
 from ILCDIRAC.Core.Utilities.CombinedSoftwareInstallation  import LocalArea, SharedArea
+from ILCDIRAC.Core.Utilities.MokkaDBCache                  import MokkaDBCache, getMokkaDBCacheDir
 
-import os, sys, tempfile, threading, time, shutil
+import atexit, os, socket, sys, tempfile, threading, time, shutil
 
 EXECUTION_RESULT = {}
 
+#Servers left running for the next Mokka steps of the job: (software dir, dump file) -> SQLWrapper
+_keptServers = {}
+#Servers started and not stopped yet, stopped when the job ends
+_runningServers = []
+
+def pingServer(socketpath, timeout = 1.):
+  """ Check that the mysql server accepts connections on its unix socket: it then sends its handshake packet,
+  starting with the protocol version (an error packet starts with 0xff)
+  """
+  sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+  sock.settimeout(timeout)
+  try:
+    try:
+      sock.connect(socketpath)
+      data = ''
+      while len(data) < 5:
+        chunk = sock.recv(5 - len(data))
+        if not chunk:
+          return False
+        data += chunk
+      return data[4] != '\xff'
+    except socket.error:
+      return False
+  finally:
+    sock.close()
+
+def _stopRunningServers():
+  """ Stop the servers still running when the job ends, kept ones included
+  """
+  for wrapper in list(_runningServers):
+    wrapper.keepServer = False
+    try:
+      wrapper.mysqlCleanUp()
+    except Exception, x:
+      gLogger.error("Failed to stop the mysql server in %s:" % wrapper.MokkaTMPDir, str(x))
+  _keptServers.clear()
+
+atexit.register(_stopRunningServers)
+
 class SQLWrapper:
-  def __init__(self, softwareDir = './', mokkaDBroot = ''):
+  def __init__(self, softwareDir = './', mokkaDBroot = '', useDBCache = True, keepServer = False):
     """Set initial variables
     
     @param softwareDir: path to the location of the software installation
     @type softwareDir: string
     @param mokkaDBroot: path to the place where the DB will live
     @type mokkaDBroot: string
+    @param useDBCache: take the initialised database from the node cache, see L{MokkaDBCache}
+    @type useDBCache: bool
+    @param keepServer: leave the server running at cleanup, for the next Mokka step of the job using the same
+    software and database dump. It is stopped when the job ends.
+    @type keepServer: bool
     
     """
     self.MokkaDumpFile = ""
@@ -45,6 +90,19 @@ class SQLWrapper:
     self.log = gLogger.getSubLogger( "SQL-wrapper" )
     
     self.mysqlInstalDir = ''  
+    self.useDBCache = useDBCache
+    self.keepServer = keepServer
+    self.serverKey = None
+    self.reused = False
+    self.exeThread = None
+    self.mysqldPID = None
+    ##Time to start the server and number of pings, total setup time, origin of the database
+    self.metrics = {'StartupTime' : 0., 'Probes' : 0, 'SetupTime' : 0., 'FromCache' : False, 'Reused' : False}
+    ##Server readiness polling: first delay, maximum delay, and time after which it failed, in seconds
+    self.probeDelay = 0.05
+    self.maxProbeDelay = 2.
+    self.startTimeout = 600
+    self.stopTimeout = 300
     
     #mysqld threading
     self.bufferLimit = 10485760   
@@ -62,6 +120,7 @@ class SQLWrapper:
       
     if not os.path.exists(self.MokkaDumpFile):
       return S_ERROR("Default DB was not found")
+    self.serverKey = (self.softDir, self.MokkaDumpFile)
     if not os.environ.has_key('MOKKA_DUMP_FILE'):
       os.environ['MOKKA_DUMP_FILE'] = self.MokkaDumpFile
     return S_OK()  
@@ -70,6 +129,8 @@ class SQLWrapper:
     """Method to create all necessary directories for MySQL
     """
     #os.chdir(self.softDir)
+    if self.adoptKeptServer():
+      return S_OK()
 
     #"""create tmp dir and track it"""
     if not os.path.exists(self.mokkaDBroot):
@@ -92,6 +153,35 @@ class SQLWrapper:
     return S_OK()
 
     #os.chdir(self.initialDir)
+  def adoptKeptServer(self):
+    """ Use the server left running by a previous Mokka step with the same software and dump, if it still
+    answers
+
+    @return: True if it is used
+    """
+    kept = _keptServers.pop(self.serverKey, None)
+    if not kept:
+      return False
+    if not pingServer(os.path.join(kept.MokkaTMPDir, "mysql.sock")):
+      self.log.warn("The mysql server of the previous step does not answer, starting a new one")
+      kept.keepServer = False
+      kept.mysqlCleanUp()
+      return False
+    for attribute in ('MokkaTMPDir', 'MokkaDataDir', 'mokkaDBroot', 'softDir', 'exeEnv', 'exeThread', 'mysqldPID'):
+      setattr(self, attribute, getattr(kept, attribute))
+    _runningServers.remove(kept)
+    _runningServers.append(self)
+    self.reused = True
+    self.log.info("Using the mysql server of the previous step, pid %s" % self.mysqldPID)
+    return True
+
+  def getMetrics(self):
+    """ Get the metrics of the server setup: StartupTime (from the start of mysqld to its first answer),
+    Probes (number of pings), SetupTime (whole mysqlSetup), FromCache (data directory from the node cache),
+    Reused (server of a previous step)
+    """
+    return S_OK(dict(self.metrics))
+
   def getMokkaTMPDIR(self):
     """ Get the location of the TMPDIR, where the socket is.
     """
@@ -100,6 +190,22 @@ class SQLWrapper:
       
   def mysqlSetup(self):
     """Setup mysql locally in local tmp dir 
+
+    The data directory is taken from the node cache of initialised databases (L{MokkaDBCache}) if enabled,
+    otherwise (or if the cache cannot be used) it is initialised and the dump is imported.
+    """
+    if self.reused:
+      self.metrics['Reused'] = True
+      return S_OK('OK')
+    start = time.time()
+    res = self._mysqlSetup()
+    self.metrics['SetupTime'] = time.time() - start
+    self.log.info("MySQL setup took %.1f s, the server answered %.1f s after its start" % (self.metrics['SetupTime'],
+                                                                                        self.metrics['StartupTime']))
+    return res
+
+  def _mysqlSetup(self):
+    """ Do the setup, see L{mysqlSetup}
     """
     #initialDir= os.getcwd()
     if not os.path.exists(self.MokkaTMPDir):
@@ -137,7 +243,6 @@ class SQLWrapper:
     #                                                                  /.-~
     ######
     #### Hell is the maintenance of the crap below!  
-    os.chdir(self.softDir)
     self.log.verbose('setup local mokka database')
     removeLibc(self.softDir + "/mysql4grid/lib64/mysql")
     if os.environ.has_key('LD_LIBRARY_PATH'):
@@ -148,14 +253,65 @@ class SQLWrapper:
       os.environ['LD_LIBRARY_PATH'] = '%s/mysql4grid/lib64/mysql:%s/mysql4grid/lib64' % (self.softDir, self.softDir)
     os.environ['PATH'] = '%s/mysql4grid/bin:%s' % (self.softDir, os.environ['PATH'])
     self.exeEnv = dict( os.environ )
-    
-    safe_options = "--no-defaults --skip-networking --socket=%s/mysql.sock --datadir=%s --basedir=%s/mysql4grid --pid-file=%s/mysql.pid --log-error=%s --log=%s" % (self.MokkaTMPDir, 
-                                                                                                                                                                     self.MokkaDataDir, 
-                                                                                                                                                                     self.softDir,
-                                                                                                                                                                     self.MokkaTMPDir,
-                                                                                                                                                                     self.stdError,
-                                                                                                                                                                     self.applicationLog)
-    comm = "mysql_install_db %s" % (safe_options) 
+
+    if self.useDBCache:
+      res = self.getDataDirFromCache()
+      if res['OK']:
+        self.metrics['FromCache'] = True
+        res = self.startServer(self.MokkaDataDir)
+        os.chdir(self.initialDir)
+        return res
+      self.log.warn("Could not use the Mokka DB cache, will set up the database:", res['Message'])
+      ##Get back the empty data directory
+      if os.path.isdir(self.MokkaDataDir):
+        shutil.rmtree(self.MokkaDataDir, True)
+      os.mkdir(self.MokkaDataDir)
+
+    res = self.initialiseDataDir(self.MokkaDataDir)
+    os.chdir(self.initialDir)
+    return res
+
+  def getDataDirFromCache(self):
+    """ Copy the initialised data directory from the node cache to MokkaDataDir, making the cache entry if
+    needed
+    """
+    res = getMokkaDBCacheDir()
+    if not res['OK']:
+      return res
+    cache = MokkaDBCache(res['Value'])
+    try:
+      key = cache.getKey(os.path.join(self.softDir, "mysql4grid", "bin", "mysqld"), self.MokkaDumpFile)
+      return cache.getDataDir(key, self.MokkaDataDir, self.buildCacheEntry)
+    except (OSError, IOError), x:
+      return S_ERROR("Failed to use the Mokka DB cache: %s" % str(x))
+
+  def buildCacheEntry(self, datadir):
+    """ Initialise the data directory for the cache, and stop the server so that its files are complete
+    """
+    res = self.initialiseDataDir(datadir)
+    status = self.stopServer()['Value']
+    if not res['OK']:
+      return res
+    if status != 0:
+      return S_ERROR('MySQL shutdown Exited With Status %s' % (status))
+    return S_OK()
+
+  def getSafeOptions(self, datadir):
+    """ The options of the mysql server using datadir
+    """
+    return "--no-defaults --skip-networking --socket=%s/mysql.sock --datadir=%s --basedir=%s/mysql4grid --pid-file=%s/mysql.pid --log-error=%s --log=%s" % (self.MokkaTMPDir, 
+                                                                                                                                                             datadir, 
+                                                                                                                                                             self.softDir,
+                                                                                                                                                             self.MokkaTMPDir,
+                                                                                                                                                             self.stdError,
+                                                                                                                                                             self.applicationLog)
+
+  def initialiseDataDir(self, datadir):
+    """ Run mysql_install_db in datadir, start the server on it, set the passwords and grants and import the
+    dump. The server is left running.
+    """
+    os.chdir(self.softDir)
+    comm = "mysql_install_db %s" % (self.getSafeOptions(datadir)) 
     self.log.verbose("Running %s" % comm)
     self.result = shellCall(0, comm, callbackFunction = self.redirectLogOutput, bufferLimit = 20971520)
         
@@ -175,36 +331,11 @@ class SQLWrapper:
       self.log.error( self.stdError )
       self.log.error('SQLwrapper Exited With Status %s' % (status))
  
-    ###Now run mysqld in thread
-    os.chdir("%s/mysql4grid" % (self.softDir))
-    
-    
-    self.log.verbose("Running mysqld_safe %s" % safe_options)
+    res = self.startServer(datadir)
+    if not res['OK']:
+      return res
 
-    spObject = Subprocess( timeout = False, bufferLimit = int( self.bufferLimit ) )
-    command = '%s/mysql4grid/bin/mysqld_safe %s' % (self.softDir, safe_options)
-    self.log.verbose( 'Execution command: %s' % ( command ) )
-        
-    exeThread = ExecutionThread( spObject, command, self.maxPeekLines, self.applicationLog, self.stdError, self.exeEnv )
-    exeThread.start()
-    time.sleep( 5 )
-    self.mysqldPID = spObject.getChildPID()
-       
-    #if not self.mysqldPID:
-        #return S_ERROR( 'MySQLd process could not start after 5 seconds' )
-    
-    self.log.verbose("MySQLd run with pid: %s" % self.mysqldPID)
-
-
-    ####Have to sleep for a while to let time for the socket to wake up
-    sleepComm = """
-while [ -z "$socket_grep" ] ; do
-    socket_grep=$(netstat -ln 2>/dev/null | grep "%s/mysql.sock")
-    echo -n .
-    sleep 1
-done 
-""" % (self.MokkaTMPDir)
-    self.result = shellCall(0, sleepComm, callbackFunction = self.redirectLogOutput, bufferLimit = 20971520)
+    os.chdir("%s/mysql4grid" % (self.softDir))
     ###changing root pass
     mysqladmincomm = "mysqladmin --no-defaults -hlocalhost --socket=%s/mysql.sock -uroot password '%s'" % (self.MokkaTMPDir,
                                                                                                            self.rootpass)
@@ -250,23 +381,66 @@ done
       self.log.error( "==================================\n StdError:\n" )
       self.log.error( self.stdError )
       self.log.error('MySQL setup Exited With Status %s' % (status))
-      os.chdir(self.initialDir)
       return S_ERROR('MySQL setup Exited With Status %s' % (status))
     # Still have to set the application status e.g. user job case.
     #self.setApplicationStatus('mysql client %s Successful' %(self.applicationVersion))
-    os.chdir(self.initialDir)
     #return S_OK('Mokka-wrapper %s Successful' %(self.applicationVersion))
     return S_OK('OK')
+
+  def startServer(self, datadir):
+    """ Run mysqld on datadir in a thread, and wait until it answers on its socket
+    """
+    safe_options = self.getSafeOptions(datadir)
+    ###Now run mysqld in thread
+    os.chdir("%s/mysql4grid" % (self.softDir))
     
-    #############################################################################
-  def mysqlCleanUp(self):
-    """Does mysql cleanup. Remove socket and tmpdir with mysql db.
     
-    Called at the end of Mokka execution, whatever the status is.
+    self.log.verbose("Running mysqld_safe %s" % safe_options)
+
+    spObject = Subprocess( timeout = False, bufferLimit = int( self.bufferLimit ) )
+    command = '%s/mysql4grid/bin/mysqld_safe %s' % (self.softDir, safe_options)
+    self.log.verbose( 'Execution command: %s' % ( command ) )
+        
+    start = time.time()
+    self.exeThread = ExecutionThread( spObject, command, self.maxPeekLines, self.applicationLog, self.stdError, self.exeEnv )
+    ##Does not prevent the job from ending, the server is stopped by _stopRunningServers
+    self.exeThread.setDaemon(True)
+    self.exeThread.start()
+    if not self in _runningServers:
+      _runningServers.append(self)
+    res = self.waitForServer()
+    self.metrics['StartupTime'] = time.time() - start
+    self.mysqldPID = spObject.getChildPID()
+    if not res['OK']:
+      self.log.error("MySQLd did not start:", res['Message'])
+      return res
+    self.log.verbose("MySQLd run with pid: %s" % self.mysqldPID)
+    return S_OK('OK')
+
+  def waitForServer(self):
+    """ Ping the server on its socket, with an exponentially increasing delay, until it answers
+    """
+    socketpath = os.path.join(self.MokkaTMPDir, "mysql.sock")
+    delay = self.probeDelay
+    deadline = time.time() + self.startTimeout
+    while True:
+      self.metrics['Probes'] += 1
+      if pingServer(socketpath):
+        return S_OK()
+      if not self.exeThread.isAlive():
+        return S_ERROR("mysqld_safe exited, see %s" % self.stdError)
+      if time.time() > deadline:
+        return S_ERROR("No answer on %s after %s seconds" % (socketpath, self.startTimeout))
+      time.sleep(delay)
+      delay = min(delay * 2, self.maxProbeDelay)
+
+  def stopServer(self):
+    """ Shut down the mysql server, and wait for its socket to go away
+
+    @return: S_OK(status of the shutdown command)
     """
     currentdir = os.getcwd()
     os.chdir(os.path.join(self.softDir, "mysql4grid"))
-    self.log.verbose('clean up db')
     MySQLcleanUpComm = "mysqladmin --no-defaults -hlocalhost --socket=%s/mysql.sock -uroot -p%s shutdown" % (self.MokkaTMPDir, self.rootpass)
             
     self.result = shellCall(0, MySQLcleanUpComm, callbackFunction = self.redirectLogOutput, bufferLimit = 20971520)
@@ -282,20 +456,38 @@ done
     
     #resultTuple = self.result['Value']
 
-    ####Have to sleep for a while to let time for the socket to go away
-    sleepComm = """
-while [ -n "$socket_grep" ] ; do
-    socket_grep=$(netstat -ln 2>/dev/null | grep "%s/mysql.sock")
-    echo -n .
-    sleep 1
-done 
-""" % (self.MokkaTMPDir)
-    self.result = shellCall(0, sleepComm, callbackFunction = self.redirectLogOutput, bufferLimit = 20971520)
+    ####Wait for the server to go away
+    socketpath = os.path.join(self.MokkaTMPDir, "mysql.sock")
+    delay = self.probeDelay
+    deadline = time.time() + self.stopTimeout
+    while status == 0 and (pingServer(socketpath) or os.path.exists(os.path.join(self.MokkaTMPDir, "mysql.pid"))):
+      if time.time() > deadline:
+        self.log.error("The mysql server is still running %s seconds after its shutdown" % self.stopTimeout)
+        break
+      time.sleep(delay)
+      delay = min(delay * 2, self.maxProbeDelay)
+    if self in _runningServers:
+      _runningServers.remove(self)
 
     os.chdir(currentdir)
-
-    status = resultTuple[0]
-    #self.log.info( "Status after the application execution is %s" % str( status ) )    
+    return S_OK(status)
+    
+    #############################################################################
+  def mysqlCleanUp(self):
+    """Does mysql cleanup. Remove socket and tmpdir with mysql db.
+    
+    Called at the end of Mokka execution, whatever the status is.
+    """
+    if self.keepServer and self.serverKey and pingServer(os.path.join(self.MokkaTMPDir, "mysql.sock")):
+      self.log.info("Leaving the mysql server running for the next step")
+      previous = _keptServers.get(self.serverKey)
+      if previous and previous is not self:
+        previous.keepServer = False
+        previous.mysqlCleanUp()
+      _keptServers[self.serverKey] = self
+      return S_OK('OK')
+    self.log.verbose('clean up db')
+    status = self.stopServer()['Value']
     failed = False
     if status != 0:
       self.log.error( "MySQL-cleanup execution completed with errors:" )
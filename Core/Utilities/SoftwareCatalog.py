@@ -0,0 +1,160 @@
+'''
+In memory index of the software described in the CS under /AvailableTarBalls/<platform>
+
+The CS is read at most once per application and version, and the dependency closures and tar ball lists
+are kept, so that the lookups made by the installation (L{TARsoft}, L{ResolveDependencies}), the environment
+preparation (L{PrepareOptionFiles}) and the workflow modules do not go back to the CS. Use
+L{getSoftwareCatalog} to get the instance shared by the process.
+
+@since: Oct 18, 2026
+
+@author: agent
+'''
+
+from DIRAC import gLogger
+from DIRAC.ConfigurationSystem.Client.Helpers.Operations import Operations
+import threading
+
+class SoftwareCatalog(object):
+  """ Index of the /AvailableTarBalls section, filled as it is queried
+  """
+  def __init__(self, ops = None):
+    if not ops:
+      ops = Operations()
+    self.ops = ops
+    self.lock = threading.RLock()
+    ##(platform, application) -> TarBallURL
+    self.urls = {}
+    ##(platform, application, version) -> dict of the version options, plus the Dependencies list
+    self.versions = {}
+    ##(platform, application, version) -> list of dependency dictionaries, see L{getDependencies}
+    self.closures = {}
+
+  def reset(self):
+    """ Forget everything, the CS will be read again
+    """
+    self.lock.acquire()
+    try:
+      self.urls = {}
+      self.versions = {}
+      self.closures = {}
+    finally:
+      self.lock.release()
+
+  def _version(self, platform, appli, version):
+    """ Read once the section of an application version
+    """
+    appli = appli.lower()
+    key = (platform, appli, version)
+    if key in self.versions:
+      return self.versions[key]
+    self.lock.acquire()
+    try:
+      if key in self.versions:
+        return self.versions[key]
+      path = '/AvailableTarBalls/%s/%s/%s' % (platform, appli, version)
+      options = {}
+      res = self.ops.getOptionsDict(path)
+      if res['OK']:
+        options = res['Value']
+      deps = []
+      res = self.ops.getSections('%s/Dependencies' % path)
+      if res['OK']:
+        for dep in res['Value']:
+          depvers = self.ops.getValue('%s/Dependencies/%s/version' % (path, dep), '')
+          if not depvers:
+            gLogger.error("Retrieving dependency version for %s failed, skipping to next !" % (dep))
+            continue
+          deps.append((dep, depvers))
+      options['Dependencies'] = deps
+      self.versions[key] = options
+      return options
+    finally:
+      self.lock.release()
+
+  def getTarBall(self, platform, appli, version):
+    """ Name of the tar ball, empty string if not defined
+    """
+    return self._version(platform, appli, version).get('TarBall', '')
+
+  def getMd5Sum(self, platform, appli, version):
+    """ md5 sum of the tar ball, empty string if not defined
+    """
+    return self._version(platform, appli, version).get('Md5Sum', '')
+
+  def getOverwrite(self, platform, appli, version):
+    """ Overwrite flag of the application, False if not defined
+    """
+    return str(self._version(platform, appli, version).get('Overwrite', False)).lower() in ('y', 'yes',
+                                                                                            'true', '1')
+
+  def getTarBallURL(self, platform, appli):
+    """ Location of the tar balls of the application, empty string if not defined
+    """
+    key = (platform, appli.lower())
+    if not key in self.urls:
+      self.urls[key] = self.ops.getValue('/AvailableTarBalls/%s/%s/TarBallURL' % key, '')
+    return self.urls[key]
+
+  def getDirectDependencies(self, platform, appli, version):
+    """ Dependencies declared by the application, list of (application, version) tuples
+    """
+    return list(self._version(platform, appli, version)['Dependencies'])
+
+  def getDependencies(self, platform, appli, version):
+    """ All the dependencies of the application, each given once, in the installation order
+
+    @return: list of dictionaries with app and version keys, like L{resolveDeps}
+    """
+    key = (platform, appli.lower(), version)
+    if not key in self.closures:
+      closure = []
+      self._closure(platform, appli, version, closure, set([key[1:]]))
+      self.closures[key] = closure
+    return [dict(dep) for dep in self.closures[key]]
+
+  def _closure(self, platform, appli, version, closure, seen):
+    """ Walk the dependency graph, appending to closure the dependencies not in seen
+    """
+    for dep, depvers in self._version(platform, appli, version)['Dependencies']:
+      if (dep.lower(), depvers) in seen:
+        continue
+      seen.add((dep.lower(), depvers))
+      gLogger.verbose("Found dependency %s %s" % (dep, depvers))
+      closure.append({"app" : dep, "version" : depvers})
+      self._closure(platform, dep, depvers, closure, seen)
+
+  def getDependencyTarBalls(self, platform, appli, version):
+    """ Tar ball names of all the dependencies of the application, see L{resolveDepsTar}
+    """
+    tarballs = []
+    for dep in self.getDependencies(platform, appli, version):
+      dep_tar = self.getTarBall(platform, dep["app"], dep["version"])
+      if dep_tar:
+        tarballs.append(dep_tar)
+      else:
+        gLogger.error("Dependency %s version %s is not defined in CS, please check !" % (dep["app"],
+                                                                                         dep["version"]))
+    return tarballs
+
+  def getDependencyFolders(self, platform, appli, version):
+    """ Names of the folders of all the dependencies, where their lib and bin directories are looked for
+    """
+    return [dep.replace(".tgz", "").replace(".tar.gz", "") for dep in self.getDependencyTarBalls(platform, appli,
+                                                                                                 version)]
+
+_catalog = None
+_catalogLock = threading.Lock()
+
+def getSoftwareCatalog():
+  """ Get the catalog shared by the process
+  """
+  global _catalog
+  if _catalog is None:
+    _catalogLock.acquire()
+    try:
+      if _catalog is None:
+        _catalog = SoftwareCatalog()
+    finally:
+      _catalogLock.release()
+  return _catalog
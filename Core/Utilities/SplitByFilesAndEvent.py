@@ -1,77 +1,63 @@
 # $HeadURL$
 # $Id$
 '''
-Try some fancy splitting, DO NOT USE
+Split a list of files in tasks of a given number of events
 
-Based on Dirac.SplitByFiles idea, but doing the splitting by number of events
-Gives a list of dictionaries
+Based on Dirac.SplitByFiles idea, but doing the splitting by number of events:
+each task is given the files it needs, the event to start from in the first file,
+and the number of events to process.
 
 Created on Feb 10, 2010
 
 @author: sposs
 '''
 
-from ILCDIRAC.Core.Utilities.InputFilesUtilities import getNumberOfevents
+from ILCDIRAC.Core.Utilities.InputFilesUtilities import getNumberOfEventsPerFile
 from DIRAC import S_OK, S_ERROR
+import bisect
 
-def SplitByFilesAndEvents(listoffiles, evtsperjob):
-  """ Group the input files 
-  """
-  mylist = [] 
-  total_evts = 0
-  for files in listoffiles:
-    myfdict = {}
-    info =  getNumberOfevents([files])
-    if not "nbevts" in info:
-      return S_ERROR("The file %s does not have attached number of events, cannot split" % files)
-    myfdict['file'] = files
-    myfdict['nbevts'] = info['nbevts']
-    mylist.append(myfdict) 
-    total_evts += info['nbevts']
+def splitByEvents(files, evtsperjob):
+  """ Split the files in tasks of evtsperjob events (the last task can have less). The task boundaries
+  are found by bisection in the cumulative number of events, so the cost does not depend on the total
+  number of events.
 
-  #nb_jobs = total_evts/evtsperjob
-  joblist = []
-  jdict = {}
-  startfromevt = 0
-  cur_events = 0
-  for event in range(total_evts):
-    cur_events +=1
-    if not len(mylist):
-      break
-    item = mylist[0]
-    nb_evts_in_file = item['nbevts']
-
-    if cur_events == evtsperjob :
-      jdict['startFrom'] = startfromevt
-      if not 'files' in jdict:
-        jdict['files'] = []
-      jdict['files'].append(item['file'])
-      startfromevt = int(cur_events)
-      cur_events = 0
-      mylist.remove(item)
-      joblist.append(jdict)
-      continue
-    if cur_events > nb_evts_in_file:
-      if not 'files' in jdict:
-        jdict['files'] = []
-      jdict['files'].append(item['file'])
-      mylist.remove(item)
-      continue
-    #joblist.append(jdict)
-    #print "final jdict", jdict
-  return S_OK(joblist)
+  @param files: list of (file, number of events) tuples, in the order they must be processed
+  @param evtsperjob: number of events per task
+  @return: list of (files, startFrom, nEvents) tuples, startFrom being the first event to process in
+  the first file
+  """
+  if evtsperjob <= 0:
+    return []
+  names = []
+  ends = []
+  total = 0
+  for name, nbevts in files:
+    total += int(nbevts)
+    names.append(name)
+    ends.append(total)
+
+  tasks = []
+  for start in xrange(0, total, evtsperjob):
+    end = min(start + evtsperjob, total)
+    first = bisect.bisect_right(ends, start)
+    last = bisect.bisect_right(ends, end - 1)
+    startfrom = start
+    if first:
+      startfrom -= ends[first - 1]
+    tasks.append((names[first:last + 1], startfrom, end - start))
+  return tasks
 
-if __name__=="__main__":
-  from DIRAC.Core.Base import Script
-  Script.parseCommandLine()
-  from DIRAC.Resources.Catalog.FileCatalogClient import FileCatalogClient
-  fc = FileCatalogClient()
+def SplitByFilesAndEvents(listoffiles, evtsperjob):
+  """ Group the input files in tasks of evtsperjob events. The number of events of the files is taken
+  from the FileCatalog.
 
-  res = fc.findFilesByMetadata({"ProdID":1978})
+  @return: S_OK(list of dictionaries with the files, startFrom and nbevts of each task)
+  """
+  res = getNumberOfEventsPerFile(listoffiles)
   if not res['OK']:
-    print res['Message']
-    exit(1)
-  lfns = res['Value']
-  lfns.sort()
-  res = SplitByFilesAndEvents(lfns,70)
-  print res['Value'][1]
+    return S_ERROR("%s, cannot split" % res['Message'])
+  nbevts = res['Value']
+  joblist = []
+  for files, startfrom, nevents in splitByEvents([(lfn, nbevts[lfn]) for lfn in listoffiles], evtsperjob):
+    joblist.append({'files' : files, 'startFrom' : startfrom, 'nbevts' : nevents})
+  return S_OK(joblist)
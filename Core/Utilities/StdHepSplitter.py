@@ -0,0 +1,266 @@
+'''
+Split StdHep files without the stdhep library nor the hepsplit utility.
+
+StdHep files are written by mcfio in XDR (big endian) in direct access mode: a file header, then event
+tables pointing to the records (events, and begin/end run records) that follow them. A record is an event
+header followed by its blocks, the event header holding the absolute positions of the blocks.
+
+The splitter maps the input file in memory, builds the list of records from the event tables, and writes
+each output file sequentially: the file header of the input with updated counters, then new event tables
+and the records, copied as they are except for the block positions of their event header. The content of
+the blocks is never decoded. The begin and end run records are copied in every output file.
+
+Used by L{StdHepSplit}.
+
+@since: Oct 18, 2026
+
+@author: agent
+'''
+
+from DIRAC import gLogger, S_OK, S_ERROR
+from ILCDIRAC.Core.Utilities.ChecksumCache import openForWriting
+import os, struct, mmap, array
+
+##Structures of mcfio
+FILEHEADER = 100
+EVENTTABLE = 101
+SEQUENTIALHEADER = 102
+EVENTHEADER = 103
+##Blocks of the run records written by stdhep
+RUNBLOCKS = (6, 7, 12) #STDHEPBEG, STDHEPEND, HEPRUP
+ENDRUNBLOCK = 7
+
+def _stringEnd(data, pos):
+  """ Position following the XDR string at pos
+  """
+  length = struct.unpack(">I", data[pos:pos + 4])[0]
+  return pos + 4 + ((length + 3) & ~3)
+
+def _arrayEnd(data, pos):
+  """ Position following the XDR array of 4 bytes elements at pos
+  """
+  return pos + 4 + 4 * struct.unpack(">I", data[pos:pos + 4])[0]
+
+class StdHepFile(object):
+  """ Index of the records of a StdHep file. The records are kept in arrays, there is no object per event.
+  """
+  def __init__(self, path):
+    self.path = path
+    self.fileobj = open(path, "rb")
+    self.size = os.fstat(self.fileobj.fileno()).st_size
+    self.data = mmap.mmap(self.fileobj.fileno(), self.size, access = mmap.ACCESS_READ)
+    ##Header, and raw event table header (id, ntot and version) to reuse when writing
+    self.header = ''
+    self.tableHeader = ''
+    self.tableDim = 0
+    self.lastLocator = -1
+    ##Records, in the order of the tables
+    self.starts = array.array('L')
+    self.ends = array.array('L')
+    self.evtnums = array.array('l')
+    self.storenums = array.array('l')
+    self.runnums = array.array('l')
+    self.trigmasks = array.array('l')
+    ##0: event, 1: begin run, 2: end run
+    self.kinds = array.array('b')
+
+  def close(self):
+    """ Release the file
+    """
+    self.data.close()
+    self.fileobj.close()
+
+  def _headerCounterPosition(self):
+    """ Position of numevts_expect in the file header, the counters and the table locator follow
+    """
+    pos = _stringEnd(self.data, 8) #version
+    pos = _stringEnd(self.data, pos) #title
+    return _stringEnd(self.data, pos) #comment
+
+  def index(self):
+    """ Read the file header and the event tables
+    """
+    if self.size < 8:
+      return S_ERROR("%s is not a StdHep file" % self.path)
+    blockid = struct.unpack(">i", self.data[0:4])[0]
+    if blockid == SEQUENTIALHEADER:
+      return S_ERROR("%s is a sequential StdHep file, not supported" % self.path)
+    if blockid != FILEHEADER:
+      return S_ERROR("%s is not a StdHep file" % self.path)
+    try:
+      pos = self._headerCounterPosition()
+      firstTable = struct.unpack(">I", self.data[pos + 8:pos + 12])[0]
+      if not pos + 12 <= firstTable < self.size:
+        return S_ERROR("Invalid first event table position in %s" % self.path)
+      self.header = self.data[0:firstTable]
+      tables = []
+      locator = firstTable
+      while 0 < locator < self.size and not locator in tables:
+        tables.append(locator)
+        locator = self._readTable(locator)
+      if locator >= self.size:
+        return S_ERROR("Invalid event table position in %s" % self.path)
+    except struct.error:
+      return S_ERROR("%s is truncated" % self.path)
+    except ValueError, x:
+      return S_ERROR("Corrupted file %s: %s" % (self.path, str(x)))
+    self._setEnds(tables)
+    return S_OK()
+
+  def _readTable(self, pos):
+    """ Add the records of the event table at pos, returns the position of the next table
+    """
+    data = self.data
+    if struct.unpack(">i", data[pos:pos + 4])[0] != EVENTTABLE:
+      raise ValueError("no event table at %s" % pos)
+    end = _stringEnd(data, pos + 8)
+    if not self.tableHeader:
+      self.tableHeader = data[pos:end]
+    nextLocator, numevts, dim = struct.unpack(">iiI", data[end:end + 12])
+    self.tableDim = max(self.tableDim, dim)
+    self.lastLocator = nextLocator
+    pos = end + 12
+    arrays = []
+    for i in range(5):
+      count = struct.unpack(">I", data[pos:pos + 4])[0]
+      if count < numevts:
+        raise ValueError("event table with %s entries for %s events" % (count, numevts))
+      arrays.append(struct.unpack(">%si" % numevts, data[pos + 4:pos + 4 + 4 * numevts]))
+      pos += 4 + 4 * count
+    evtnums, storenums, runnums, trigmasks, ptrs = arrays
+    for i in xrange(numevts):
+      start = ptrs[i] & 0xffffffff
+      kind = self._recordKind(start)
+      self.starts.append(start)
+      self.kinds.append(kind)
+    self.evtnums.extend(evtnums)
+    self.storenums.extend(storenums)
+    self.runnums.extend(runnums)
+    self.trigmasks.extend(trigmasks)
+    return nextLocator
+
+  def _recordKind(self, pos):
+    """ Event (0), begin run (1) or end run (2) record, from the blocks of the event header at pos
+    """
+    data = self.data
+    if struct.unpack(">i", data[pos:pos + 4])[0] != EVENTHEADER:
+      raise ValueError("no event header at %s" % pos)
+    idpos = _stringEnd(data, pos + 8) + 24
+    count = struct.unpack(">I", data[idpos:idpos + 4])[0]
+    for blockid in struct.unpack(">%si" % count, data[idpos + 4:idpos + 4 + 4 * count]):
+      if blockid in RUNBLOCKS:
+        if blockid == ENDRUNBLOCK:
+          return 2
+        return 1
+    return 0
+
+  def _setEnds(self, tables):
+    """ A record ends where the next record or table starts
+    """
+    boundaries = sorted(list(self.starts) + tables + [self.size])
+    nextboundary = {}
+    for i in xrange(len(boundaries) - 1):
+      nextboundary[boundaries[i]] = boundaries[i + 1]
+    for start in self.starts:
+      self.ends.append(nextboundary[start])
+
+  def numberOfEvents(self):
+    """ Number of events, not counting the run records
+    """
+    return list(self.kinds).count(0)
+
+  def _tableBytes(self, records, nextLocator):
+    """ Encode an event table for the given records
+    """
+    dim = self.tableDim
+    numevts = len(records)
+    padding = [0] * (dim - numevts)
+    parts = [self.tableHeader, struct.pack(">iiI", nextLocator, numevts, dim)]
+    for column in (self.evtnums, self.storenums, self.runnums, self.trigmasks):
+      parts.append(struct.pack(">I%si" % dim, dim, *([column[i] for i, newpos in records] + padding)))
+    parts.append(struct.pack(">I%sI" % dim, dim, *([newpos for i, newpos in records] + padding)))
+    return "".join(parts)
+
+  def _writeRecord(self, out, i, newpos):
+    """ Copy the record i, moving the block positions of its event header to newpos
+    """
+    data = self.data
+    start = self.starts[i]
+    delta = newpos - start
+    pos = _stringEnd(data, start + 8) + 24
+    pos = _arrayEnd(data, pos)
+    count = struct.unpack(">I", data[pos:pos + 4])[0]
+    ptrs = struct.unpack(">%sI" % count, data[pos + 4:pos + 4 + 4 * count])
+    out.write(data[start:pos + 4])
+    out.write(struct.pack(">%sI" % count, *[ptr and ptr + delta for ptr in ptrs]))
+    pos += 4 + 4 * count
+    out.write(buffer(data, pos, self.ends[i] - pos))
+
+  def write(self, path, records, checksums = None):
+    """ Write the records (indices in the index) in a new file
+
+    @param checksums: L{ChecksumCache} getting the checksum of the file, computed while writing
+    """
+    header = self.header
+    counters = self._headerCounterPosition()
+    header = "%s%s%s" % (header[:counters], struct.pack(">iiI", len(records), len(records), len(header)),
+                         header[counters + 12:])
+    tablesize = len(self._tableBytes([], 0))
+    ##Compute where everything goes, so that the file is written sequentially
+    chunks = []
+    pos = len(header)
+    for first in range(0, max(len(records), 1), self.tableDim):
+      tablepos = pos
+      pos += tablesize
+      chunk = []
+      for i in records[first:first + self.tableDim]:
+        chunk.append((i, pos))
+        pos += self.ends[i] - self.starts[i]
+      chunks.append((tablepos, chunk))
+    out = openForWriting(path, checksums, 1024 * 1024)
+    try:
+      out.write(header)
+      for index, (tablepos, chunk) in enumerate(chunks):
+        nextLocator = self.lastLocator
+        if index + 1 < len(chunks):
+          nextLocator = chunks[index + 1][0]
+        out.write(self._tableBytes(chunk, nextLocator))
+        for i, newpos in chunk:
+          self._writeRecord(out, i, newpos)
+    finally:
+      out.close()
+
+def splitStdHep(infile, nbevtsperfile, prefix, outdir = ".", checksums = None):
+  """ Split a StdHep file in files of nbevtsperfile events, called prefix_N.stdhep, N starting at 1.
+  The last file can have less events. The checksums of the files are put in the L{ChecksumCache} checksums
+  if given.
+
+  @return: S_OK(dict) output file name -> number of events
+  """
+  if nbevtsperfile <= 0:
+    return S_ERROR("The number of events per file must be positive")
+  try:
+    stdhep = StdHepFile(infile)
+  except (IOError, mmap.error, ValueError), x:
+    return S_ERROR("Cannot open %s: %s" % (infile, str(x)))
+  try:
+    res = stdhep.index()
+    if not res['OK']:
+      return res
+    beginrun = [i for i in xrange(len(stdhep.kinds)) if stdhep.kinds[i] == 1]
+    endrun = [i for i in xrange(len(stdhep.kinds)) if stdhep.kinds[i] == 2]
+    events = [i for i in xrange(len(stdhep.kinds)) if stdhep.kinds[i] == 0]
+    gLogger.info("%s: %s events, %s run records" % (infile, len(events), len(beginrun) + len(endrun)))
+    numberofevents = {}
+    for index, first in enumerate(range(0, len(events), nbevtsperfile)):
+      fname = "%s_%s.stdhep" % (prefix, index + 1)
+      chunk = events[first:first + nbevtsperfile]
+      try:
+        stdhep.write(os.path.join(outdir, fname), beginrun + chunk + endrun, checksums)
+      except (IOError, OSError), x:
+        return S_ERROR("Failed to write %s: %s" % (fname, str(x)))
+      gLogger.verbose("Wrote %s events in %s" % (len(chunk), fname))
+      numberofevents[fname] = len(chunk)
+  finally:
+    stdhep.close()
+  return S_OK(numberofevents)
@@ -1,7 +1,13 @@
 '''
 Function to download and untar the applications, called from CombinedSoftwareInstallation
 
-Also installs all dependencies for the applications
+Also installs all dependencies for the applications: the tar balls are downloaded, checked and extracted
+in parallel, then the environment is configured in the dependency order. All the paths are absolute,
+so that several installations can run at the same time in the same process.
+
+The tar balls available through http are by default installed in streaming mode: the md5 sum is computed
+and the tar ball is extracted while it is downloaded, in a staging directory that is moved in place only
+if the md5 sum is correct. An interrupted download is resumed with a http range request.
 
 @since:  Apr 7, 2010
 
@@ -9,11 +15,13 @@ Also installs all dependencies for the applications
 '''
 from DIRAC import gLogger, S_OK, S_ERROR
 from ILCDIRAC.Core.Utilities.ResolveDependencies            import resolveDeps
+from ILCDIRAC.Core.Utilities.SoftwareCatalog                import getSoftwareCatalog
 from ILCDIRAC.Core.Utilities.PrepareLibs                    import removeLibc
 from DIRAC.DataManagementSystem.Client.ReplicaManager       import ReplicaManager
 from DIRAC.ConfigurationSystem.Client.Helpers.Operations    import Operations
 from ILCDIRAC.Core.Utilities.WasteCPU                       import WasteCPUCycles
-import os, urllib, tarfile, subprocess, shutil, time
+from ILCDIRAC.Core.Utilities.ThreadedMap                    import threadedMap
+import os, urllib, urllib2, httplib, tarfile, subprocess, shutil, time, tempfile
 from tarfile import TarError
 try:
   import hashlib as md5
@@ -96,8 +104,8 @@ def deleteOld(folder_name):
     gLogger.error("Oh Oh, something was not right, the directory %s is still here" % folder_name) 
   return S_OK()
 
-def downloadFile(TarBallURL, app_tar, folder_name):
-  """ Get the file locally.
+def downloadFile(TarBallURL, app_tar, folder_name, area):
+  """ Get the file locally, in area.
   """
   #need to make sure the url ends with /, other wise concatenation below returns bad url
   if TarBallURL[-1] != "/":
@@ -109,16 +117,19 @@ def downloadFile(TarBallURL, app_tar, folder_name):
       gLogger.debug("Downloading software", '%s' % (folder_name))
       #Copy the file locally, don't try to read from remote, soooo slow
       #Use string conversion %s%s to set the address, makes the system more stable
-      urllib.urlretrieve("%s%s" % (TarBallURL, app_tar), app_tar_base)
+      urllib.urlretrieve("%s%s" % (TarBallURL, app_tar), os.path.join(area, app_tar_base))
     except:
       gLogger.exception()
       return S_ERROR('Exception during url retrieve')
   else:
     rm = ReplicaManager()
-    resget = rm.getFile("%s%s" % (TarBallURL, app_tar))
+    resget = rm.getFile("%s%s" % (TarBallURL, app_tar), destinationDir = area)
     if not resget['OK']:
       gLogger.error("File could not be downloaded from the grid")
       return resget
+    if len(resget['Value']['Failed']):
+      gLogger.error("File could not be downloaded from the grid")
+      return S_ERROR("Failed to get %s%s" % (TarBallURL, app_tar))
   return S_OK()
 
 def tarMd5Check(app_tar_base, md5sum ):
@@ -136,111 +147,269 @@ def tarMd5Check(app_tar_base, md5sum ):
     return S_ERROR("Hash does not correspond")
   return S_OK()
 
+class ResumeError(Exception):
+  """ Raised when a download cannot be resumed
+  """
+  pass
+
+class ResumableDownload(object):
+  """ File like object reading a http file, used as the source of a streaming tar extraction. The bytes
+  read are also written to a partial file and added to the md5 sum. If the connection breaks, the
+  download is resumed from the current offset with a range request. If a partial file is left by a
+  previous attempt, its content is read first, and the download starts after it.
+  """
+  def __init__(self, url, partfile, maxretries = 5, timeout = 60):
+    self.url = url
+    self.partfile = partfile
+    self.maxretries = maxretries
+    self.timeout = timeout
+    self.md5 = md5.md5()
+    self.offset = 0
+    self.length = 0
+    self.local = None
+    self.remote = None
+    if os.path.exists(partfile):
+      self.local = open(partfile, "rb")
+    self.out = open(partfile, "ab")
+
+  def _connect(self):
+    """ Open the connection, starting at the size of the partial file. If the server does not support
+    range requests, the partial file is not used.
+    """
+    size = os.path.getsize(self.partfile)
+    request = urllib2.Request(self.url)
+    if size:
+      request.add_header("Range", "bytes=%s-" % size)
+    self.remote = urllib2.urlopen(request, timeout = self.timeout)
+    if size and self.remote.getcode() != 206:
+      if self.offset:
+        raise ResumeError("Server does not support range requests, cannot resume %s" % self.url)
+      gLogger.verbose("Server does not support range requests, downloading %s again" % self.url)
+      self.local.close()
+      self.local = None
+      self.out.close()
+      self.out = open(self.partfile, "wb")
+      size = 0
+    elif size:
+      gLogger.info("Resuming download of %s at byte %s" % (self.url, size))
+    ##Needed to notice a connection closed before the end
+    length = self.remote.info().getheader("Content-Length")
+    if length:
+      self.length = size + int(length)
+
+  def read(self, size = -1):
+    """ Read at most size bytes, first from the partial file, then from the server
+    """
+    retries = 0
+    while True:
+      try:
+        if not self.remote:
+          self._connect()
+        if self.local:
+          data = self.local.read(size)
+          if data:
+            self.md5.update(data)
+            self.offset += len(data)
+            return data
+          self.local.close()
+          self.local = None
+        data = self.remote.read(size)
+        if not data and self.offset < self.length:
+          raise IOError("Connection closed at byte %s of %s" % (self.offset, self.length))
+        break
+      except urllib2.HTTPError:
+        raise
+      except (IOError, httplib.HTTPException), x:
+        retries += 1
+        if retries > self.maxretries:
+          raise
+        gLogger.warn("Download of %s interrupted at byte %s, resuming:" % (self.url, self.offset), str(x))
+        self.out.flush()
+        self.remote = None
+        time.sleep(2 ** retries)
+    self.out.write(data)
+    self.md5.update(data)
+    self.offset += len(data)
+    return data
+
+  def drain(self):
+    """ Read what the tar extraction did not need (end of archive padding) so that the md5 sum is complete
+    """
+    while self.read(1024 * 1024):
+      pass
+
+  def close(self):
+    """ Close the partial file and the connection
+    """
+    if self.local:
+      self.local.close()
+    if self.remote:
+      self.remote.close()
+    self.out.close()
+
+def canStream(TarBallURL, app_tar):
+  """ Streaming installation is possible for tar balls available through http
+  """
+  if not Operations().getValue('/Software/StreamingInstall', True):
+    return False
+  return TarBallURL.find("http://") > -1 and (app_tar.endswith(".tgz") or app_tar.endswith(".tar.gz") or 
+                                              app_tar.endswith(".tar"))
+
+def streamInstall(TarBallURL, app_tar, md5sum, area, folder_name):
+  """ Download the tar ball, compute its md5 sum and extract it in a single pass, in a staging directory
+  of area. The content is moved in area only if the md5 sum is correct. The partial download is kept
+  if the connection could not be resumed, so that the next attempt continues it.
+  """
+  if TarBallURL[-1] != "/":
+    TarBallURL += "/"
+  partfile = os.path.join(area, ".%s.part" % os.path.basename(app_tar))
+  try:
+    staging = tempfile.mkdtemp(prefix = ".staging_%s_" % folder_name, dir = area)
+  except OSError, x:
+    return S_ERROR("Cannot create staging directory in %s: %s" % (area, str(x)))
+  keeppart = False
+  try:
+    gLogger.debug("Downloading and extracting software", '%s' % (folder_name))
+    stream = ResumableDownload("%s%s" % (TarBallURL, app_tar), partfile)
+    try:
+      try:
+        tar = tarfile.open(fileobj = stream, mode = "r|*")
+        tar.extractall(staging)
+        tar.close()
+        stream.drain()
+      except urllib2.HTTPError, x:
+        gLogger.error("Failed to download %s:" % app_tar, str(x))
+        return S_ERROR("Failed to download software")
+      except (IOError, httplib.HTTPException), x:
+        keeppart = True
+        gLogger.error("Failed to download %s:" % app_tar, str(x))
+        return S_ERROR("Failed to download software")
+      except ResumeError, x:
+        gLogger.error(str(x))
+        return S_ERROR("Failed to download software")
+      except TarError, x:
+        gLogger.error("Could not extract tar ball %s because of %s" % (app_tar, str(x)))
+        return S_ERROR("Could not extract tar ball %s because of %s" % (app_tar, str(x)))
+    finally:
+      stream.close()
+    tar_ball_md5 = stream.md5.hexdigest()
+    if md5sum and md5sum != tar_ball_md5:
+      gLogger.error('Hash does not correspond, found %s, expected %s, cannot continue' % (tar_ball_md5, md5sum))
+      return S_ERROR("Hash does not correspond")
+    content = os.listdir(staging)
+    if not content:
+      return S_ERROR("Folder %s is empty, considering install as failed" % folder_name)
+    ##slic tar balls do not contain the expected folder name
+    if folder_name.count("slic") and len(content) == 1:
+      os.rename(os.path.join(staging, content[0]), os.path.join(staging, folder_name))
+      content = [folder_name]
+    for entry in content:
+      if os.path.exists(os.path.join(area, entry)):
+        deleteOld(os.path.join(area, entry))
+      try:
+        os.rename(os.path.join(staging, entry), os.path.join(area, entry))
+      except OSError, x:
+        gLogger.error("Failed to move %s in place:" % entry, str(x))
+        return S_ERROR("Failed to move %s in %s" % (entry, area))
+  finally:
+    shutil.rmtree(staging, True)
+    if not keeppart and os.path.exists(partfile):
+      try:
+        os.unlink(partfile)
+      except OSError:
+        pass
+  return S_OK()
+
+def getFolderName(app, app_tar):
+  """ Name of the directory (or file) that the tar ball of the application provides
+  """
+  folder_name = app_tar.replace(".tgz", "").replace(".tar.gz", "")
+  #jar file does not contain .tgz nor tar.gz so the file name is untouched and folder_name = app_tar
+  if app[0].lower() == "slic":
+    folder_name = "slic%s" % (app[1])
+  return os.path.basename(folder_name)
+
 def TARinstall(app, config, area):
   """ For the specified app, install all dependencies
   """
-  curdir = os.getcwd()
   appName    = app[0].lower()
   appVersion = app[1]
-  deps = resolveDeps(config, appName, appVersion)
-  
-  for dep in deps:
-    depapp = []
-    depapp.append(dep["app"])
-    depapp.append(dep["version"])
-    gLogger.info("Installing dependency %s %s" % (dep["app"], dep["version"]))
-    
+  ##The dependencies are unique, and come before the application
+  apps = [[dep["app"], dep["version"]] for dep in resolveDeps(config, appName, appVersion)]
+  apps.append([appName, appVersion])
+
+  tarballs = []
+  tarballfolders = []
+  folders = {}
+  for depapp in apps:
     res = getTarBallLocation(depapp, config, area)
     if not res['OK']:
-      gLogger.error("Could not install dependency %s %s: %s" % (dep["app"], dep["version"], res['Message']))
+      gLogger.error("Could not install dependency %s %s: %s" % (depapp[0], depapp[1], res['Message']))
       return S_ERROR('Failed to install software')
-    res_from_getTarBall = res['Value']
-    app_tar = res_from_getTarBall[0]
-    TarBallURL = res_from_getTarBall[1]
-    overwrite = res_from_getTarBall[2]
-    md5sum = res_from_getTarBall[3]
-    
-    res = install(depapp, app_tar, TarBallURL, overwrite, md5sum, area)
-    os.chdir(curdir)
+    app_tar, TarBallURL, overwrite, md5sum = res['Value']
+    folder_name = getFolderName(depapp, app_tar)
+    depapp.append(folder_name)
+    ##2 applications coming from the same tar ball would extract in the same place
+    if folders.has_key(folder_name):
+      continue
+    folders[folder_name] = None
+    tarballfolders.append(folder_name)
+    tarballs.append((depapp[:2], app_tar, TarBallURL, overwrite, md5sum))
+
+  def installAndCheck(tarball):
+    """ Get, extract and check one tar ball
+    """
+    depapp = tarball[0]
+    gLogger.info("Installing %s %s" % (depapp[0], depapp[1]))
+    res = install(*(tarball + (area,)))
     if not res['OK']:
-      gLogger.error("Could not install dependency %s %s: %s" % (dep["app"], dep["version"], res['Message']))
+      gLogger.error("Could not install %s %s: %s" % (depapp[0], depapp[1], res['Message']))
       return S_ERROR('Failed to install software')
     res_from_install = res['Value']
-    
     res = check(depapp, area, res_from_install)
-    os.chdir(curdir)
     if not res['OK']:
-      gLogger.error("Failed to check dependency %s %s" % (dep["app"], dep["version"]))
+      gLogger.error("Failed to check %s %s" % (depapp[0], depapp[1]))
       return S_ERROR('Failed to check integrity of software')
-    res_from_check = res['Value']
-    
-    res = configure(depapp, area, res_from_check)
-    os.chdir(curdir)
+    return S_OK(res_from_install)
+
+  maxthreads = Operations().getValue('/Software/MaxParallelInstalls', 4)
+  results = threadedMap(installAndCheck, tarballs, maxthreads)
+  for folder_name, res in zip(tarballfolders, results):
+    if not res['OK']:
+      return res
+    folders[folder_name] = res['Value']
+
+  ##The environment is modified in the dependency order, only by this thread
+  for depapp in apps:
+    res_from_install = folders[depapp[2]]
+    res = configure(depapp[:2], area, [res_from_install[0]])
     if not res['OK']:
-      gLogger.error("Failed to configure dependency %s %s" % (dep["app"], dep["version"]))
+      gLogger.error("Failed to configure %s %s" % (depapp[0], depapp[1]))
       return S_ERROR('Failed to configure software')
-    
+    gLogger.notice("Successfully installed %s %s in %s" % (depapp[0], depapp[1], area))
+
+  for res_from_install in folders.values():
     res = clean(area, res_from_install)
     if not res['OK']:
-      gLogger.error("Failed to clean useless tar balls, deal with it: %s %s" % (dep["app"], dep["version"]))
-      
-    os.chdir(curdir)
-    gLogger.notice("Successfully installed %s %s in %s" % (dep["app"], dep["version"], area))
-    
-  res = getTarBallLocation(app, config, area)
-  if not res['OK']:
-    gLogger.error("Could not install dependency %s %s: %s" % (appName, appVersion, res['Message']))
-    return S_ERROR('Failed to install software')
-  res_from_getTarBall = res['Value']
-  app_tar = res_from_getTarBall[0]
-  TarBallURL = res_from_getTarBall[1]
-  overwrite = res_from_getTarBall[2]
-  md5sum = res_from_getTarBall[3]
-
-  res = install(app, app_tar, TarBallURL, overwrite, md5sum, area)
-  os.chdir(curdir)
-  if not res['OK']:
-    gLogger.error("Could not install software %s %s: %s" % (appName, appVersion, res['Message']))
-    return S_ERROR('Failed to install software')
-  res_from_install = res['Value']
-  
-  res = check(app, area, res_from_install)
-  os.chdir(curdir)
-  if not res['OK']:
-    gLogger.error("Failed to check software %s %s" % (appName, appVersion))
-    return S_ERROR('Failed to check integrity of software')
-  res_from_check = res['Value']
-    
-  res = configure(app, area, res_from_check)
-  os.chdir(curdir)
-  if not res['OK']:
-    gLogger.error("Failed to configure software %s %s" % (appName, appVersion))
-    return S_ERROR('Failed to configure software')
-  
-  res = clean(area, res_from_install)
-  os.chdir(curdir)
-  if not res['OK']:
-    gLogger.error("Failed to clean useless tar balls, deal with it")
-    return S_OK()
-  gLogger.notice("Successfully installed %s %s in %s" % (appName, appVersion, area))
-  return res
+      gLogger.error("Failed to clean useless tar balls, deal with it")
+  return S_OK()
 
 def getTarBallLocation(app, config, area):
   """ Get the tar ball location. 
   """
-  ops = Operations()
+  catalog = getSoftwareCatalog()
   appName    = app[0]
   appVersion = app[1]
   appName = appName.lower()
-  app_tar = ops.getValue('/AvailableTarBalls/%s/%s/%s/TarBall' % (config, appName, appVersion), '')
-  overwrite = ops.getValue('/AvailableTarBalls/%s/%s/%s/Overwrite' % (config, appName, appVersion), False)
-  md5sum = ops.getValue('/AvailableTarBalls/%s/%s/%s/Md5Sum' % (config, appName, appVersion), '')
+  app_tar = catalog.getTarBall(config, appName, appVersion)
+  overwrite = catalog.getOverwrite(config, appName, appVersion)
+  md5sum = catalog.getMd5Sum(config, appName, appVersion)
 
   if not app_tar:
     gLogger.error('Could not find tar ball for %s %s'%(appName, appVersion))
     return S_ERROR('Could not find tar ball for %s %s'%(appName, appVersion))
   
-  TarBallURL = ops.getValue('/AvailableTarBalls/%s/%s/TarBallURL' % (config, appName), '')
+  TarBallURL = catalog.getTarBallURL(config, appName)
   if not TarBallURL:
     gLogger.error('Could not find TarBallURL in CS for %s %s' % (appName, appVersion))
     return S_ERROR('Could not find TarBallURL in CS')
@@ -250,23 +419,18 @@ def getTarBallLocation(app, config, area):
 def install(app, app_tar, TarBallURL, overwrite, md5sum, area):
   """ Install the software
   """
-  appName    = app[0]
-  appVersion = app[1]
-  folder_name = app_tar.replace(".tgz", "").replace(".tar.gz", "")
-  #jar file does not contain .tgz nor tar.gz so the file name is untouched and folder_name = app_tar
-  if appName == "slic":
-    folder_name = "%s%s" % (appName, appVersion)
+  folder_name = getFolderName(app, app_tar)
   
   appli_exists = False
   app_tar_base = os.path.basename(app_tar)
 
   ###########################################
-  ###Go where the software is to be installed
-  os.chdir(area)
-  #We go back to the initial place at any return
+  ###All the paths are absolute, in the area where the software is to be installed
+  folder = os.path.join(area, folder_name)
+  tarball = os.path.join(area, app_tar_base)
   ###########################################
   ##Handle the locking
-  lockname = folder_name+".lock"
+  lockname = folder + ".lock"
   #Make sure the lock is not too old, or wait until it's gone
   res = checkLockAge(lockname)
   if not res['OK']:
@@ -278,7 +442,7 @@ def install(app, app_tar, TarBallURL, overwrite, md5sum, area):
       overwrite = True
 
   #Check if the application is here and not to be overwritten
-  if os.path.exists(folder_name):
+  if os.path.exists(folder):
     appli_exists = True
     if not overwrite:
       gLogger.info("Folder or file %s found in %s, skipping install !" % (folder_name, area))
@@ -296,7 +460,7 @@ def install(app, app_tar, TarBallURL, overwrite, md5sum, area):
   ## In particular the jar file of LCSIM
   if appli_exists and overwrite:
     gLogger.info("Overwriting %s found in %s" % (folder_name, area))
-    res = deleteOld(folder_name) 
+    res = deleteOld(folder) 
     if not res['OK']:#should be always OK for the time being
       clearLock(lockname)
       return res
@@ -307,47 +471,56 @@ def install(app, app_tar, TarBallURL, overwrite, md5sum, area):
   ## was never here so here appli_exists=False always
 
   ## Now we can get the files and unpack them
+  if canStream(TarBallURL, app_tar):
+    res = streamInstall(TarBallURL, app_tar, md5sum, area, folder_name)
+    if not res['OK']:
+      gLogger.error("Will try getting the file again, who knows")
+      res = streamInstall(TarBallURL, app_tar, md5sum, area, folder_name)
+    clearLock(lockname)
+    if not res['OK']:
+      return res
+    return S_OK([folder_name, app_tar_base])
     
   ## Downloading file from url
-  res = downloadFile(TarBallURL, app_tar, folder_name)
+  res = downloadFile(TarBallURL, app_tar, folder_name, area)
   if not res['OK']:
     clearLock(lockname)
     return res
   
   ## Check that the tar ball is there. Should never happen as download file catches the errors
-  if not os.path.exists("%s/%s" % (os.getcwd(), app_tar_base)):
+  if not os.path.exists(tarball):
     gLogger.error('Failed to download software','%s' % (folder_name))
     clearLock(lockname)
     return S_ERROR('Failed to download software')
 
   ## Check that the downloaded file (or existing one) has the right checksum
-  res = tarMd5Check(app_tar_base, md5sum)
+  res = tarMd5Check(tarball, md5sum)
   if not res['OK']:
     gLogger.error("Will try getting the file again, who knows")
     try:#Remove tar ball that we just got
-      os.unlink("%s/%s" % (os.getcwd(), app_tar_base))
+      os.unlink(tarball)
     except OSError:
       gLogger.error("Failed to clean tar ball, something bad is happening")
     ## Clean up existing stuff (if any, in particular the jar file)
-    res = deleteOld(folder_name)
+    res = deleteOld(folder)
     if not res['OK']:#should be always OK for the time being
       clearLock(lockname)
       return res
-    res = downloadFile(TarBallURL, app_tar, folder_name)
+    res = downloadFile(TarBallURL, app_tar, folder_name, area)
     if not res['OK']:
       clearLock(lockname)
       return res
-    res = tarMd5Check(app_tar_base, md5sum)
+    res = tarMd5Check(tarball, md5sum)
     if not res['OK']:
       gLogger.error("Hash failed again, something is really wrong, cannot continue.")
       clearLock(lockname)
       return S_ERROR("MD5 check failed")
   
 
-  if tarfile.is_tarfile(app_tar_base):##needed because LCSIM is jar file
-    app_tar_to_untar = tarfile.open(app_tar_base)
+  if tarfile.is_tarfile(tarball):##needed because LCSIM is jar file
+    app_tar_to_untar = tarfile.open(tarball)
     try:
-      app_tar_to_untar.extractall()
+      app_tar_to_untar.extractall(area)
     except TarError as e:
       gLogger.error("Could not extract tar ball %s because of %s, cannot continue !" % (app_tar_base, str(e)))
       clearLock(lockname)
@@ -358,13 +531,13 @@ def install(app, app_tar, TarBallURL, overwrite, md5sum, area):
       fileexample = members[0].name
       basefolder = fileexample.split("/")[0]
       try:
-        os.rename(basefolder, slicname)
+        os.rename(os.path.join(area, basefolder), os.path.join(area, slicname))
       except OSError as e:
         gLogger.error("Failed renaming slic:", str(e))
         clearLock(lockname)
         return S_ERROR("Could not rename slic directory")
   try:
-    dircontent = os.listdir(folder_name)
+    dircontent = os.listdir(folder)
     if not len(dircontent):
       clearLock(lockname)
       return S_ERROR("Folder %s is empty, considering install as failed" % folder_name)
@@ -379,24 +552,19 @@ def install(app, app_tar, TarBallURL, overwrite, md5sum, area):
 def check(app, area, res_from_install):
   """ Now that the tar ball is here, we need to check that all is there
   """
-  ###########################################
-  ###Go where the software is to be installed
-  os.chdir(area)
-  #We go back to the initial place either at the end of the installation or at any error
-  ###########################################
-  
   basefolder = res_from_install[0]
-  if os.path.isfile(basefolder):
+  folder = os.path.join(area, basefolder)
+  if os.path.isfile(folder):
     #This is the case of LCSIM that's a jar file
     return S_OK([basefolder])
   
-  if os.path.exists(os.path.join(basefolder,'md5_checksum.md5')):
-    md5file = file(os.path.join(basefolder,'md5_checksum.md5'), 'r')
+  if os.path.exists(os.path.join(folder,'md5_checksum.md5')):
+    md5file = file(os.path.join(folder,'md5_checksum.md5'), 'r')
     for line in md5file:
       line = line.rstrip()
       md5sum, fin = line.split()
       if fin=='-' or fin.count("md5_checksum.md5"): continue
-      fin = os.path.join(basefolder, fin.replace("./",""))
+      fin = os.path.join(folder, fin.replace("./",""))
       if not os.path.exists(fin):
         gLogger.error("File missing :", fin)
         return S_ERROR("Incomplete install: The file %s is missing" % fin)
@@ -418,25 +586,19 @@ def check(app, area, res_from_install):
 def configure(app, area, res_from_check):
   """ Configure our applications: set the proper env variables
   """
-  ###########################################
-  ###Go where the software is to be installed
-  os.chdir(area)
-  #We go back to the initial place either at the end of the installation or at any error
-  ###########################################
-  
   appName = app[0].lower()
   ### Set env variables  
-  basefolder = res_from_check[0]
-  removeLibc(os.path.join(os.getcwd(), basefolder) + "/LDLibs")
-  if os.path.isdir(os.path.join(os.getcwd(), basefolder) + "/lib"):
-    removeLibc(os.path.join(os.getcwd(), basefolder) + "/lib")
+  basefolder = os.path.join(area, res_from_check[0])
+  removeLibc(basefolder + "/LDLibs")
+  if os.path.isdir(basefolder + "/lib"):
+    removeLibc(basefolder + "/lib")
     if os.environ.has_key('LD_LIBRARY_PATH'):
-      os.environ['LD_LIBRARY_PATH'] = os.path.join(os.getcwd(), basefolder) + "/lib:" + os.environ['LD_LIBRARY_PATH']
+      os.environ['LD_LIBRARY_PATH'] = basefolder + "/lib:" + os.environ['LD_LIBRARY_PATH']
     else:
-      os.environ['LD_LIBRARY_PATH'] = os.path.join(os.getcwd(), basefolder) + "/lib"
+      os.environ['LD_LIBRARY_PATH'] = basefolder + "/lib"
       
   if appName == "slic":
-    os.environ['SLIC_DIR'] = basefolder
+    os.environ['SLIC_DIR'] = res_from_check[0]
     slicv = ''
     lcddv = ''
     xercesv = ''
@@ -464,7 +626,7 @@ def configure(app, area, res_from_check):
     #members = app_tar_to_untar.getmembers()
     #fileexample = members[0].name
     #fileexample.split("/")[0]
-    os.environ['ROOTSYS'] = os.path.join(os.getcwd(), basefolder)
+    os.environ['ROOTSYS'] = basefolder
     if os.environ.has_key('LD_LIBRARY_PATH'):
       os.environ['LD_LIBRARY_PATH'] = os.environ['ROOTSYS'] + "/lib:" + os.environ['LD_LIBRARY_PATH']
     else:
@@ -472,14 +634,14 @@ def configure(app, area, res_from_check):
     os.environ['PATH'] = os.environ['ROOTSYS'] + "/bin:" + os.environ['PATH']
     os.environ['PYTHONPATH'] = os.environ['ROOTSYS'] + "/lib:" + os.environ["PYTHONPATH"]
   elif appName == 'java':
-    os.environ['PATH'] = os.path.join(os.getcwd(), basefolder) + "/bin:" + os.environ['PATH']
+    os.environ['PATH'] = basefolder + "/bin:" + os.environ['PATH']
     if os.environ.has_key('LD_LIBRARY_PATH'):
-      os.environ['LD_LIBRARY_PATH'] = os.path.join(os.getcwd(), basefolder) + "/lib:" + os.environ['LD_LIBRARY_PATH']
+      os.environ['LD_LIBRARY_PATH'] = basefolder + "/lib:" + os.environ['LD_LIBRARY_PATH']
     else:
-      os.environ['LD_LIBRARY_PATH'] = os.path.join(os.getcwd(), basefolder) + "/lib"
+      os.environ['LD_LIBRARY_PATH'] = basefolder + "/lib"
   elif appName == "lcio":
-    os.environ['LCIO'] = os.path.join(os.getcwd(), basefolder)
-    os.environ['PATH'] = os.path.join(os.getcwd(), basefolder) + "/bin:" + os.environ['PATH']
+    os.environ['LCIO'] = basefolder
+    os.environ['PATH'] = basefolder + "/bin:" + os.environ['PATH']
     res = checkJava()
     if not res['OK']:
       return res
@@ -490,19 +652,14 @@ def configure(app, area, res_from_check):
   return S_OK()  
 
 def clean(area, res_from_install):
-  """ After install, clean the tar balls and go back to initial directory
+  """ After install, clean the tar balls
   """
-  ###########################################
-  ###Go where the software is to be installed
-  os.chdir(area)
-  #We go back to the initial place at the end
-  ###########################################
   app_tar_base = res_from_install[1]
   #remove now useless tar ball
-  if os.path.exists("%s/%s" % (os.getcwd(), app_tar_base)):
+  if os.path.exists(os.path.join(area, app_tar_base)):
     if app_tar_base.find(".jar") < 0:
       try:
-        os.unlink(app_tar_base)
+        os.unlink(os.path.join(area, app_tar_base))
       except OSError as e:
         gLogger.error("Could not remove tar ball:",str(e))
   return S_OK()
@@ -515,21 +672,18 @@ def remove():
 def CanWrite(area):
   """ Check if user is allowed to write in the area
   """
-  curdir = os.getcwd()
-  os.chdir(area)
+  testfile = os.path.join(area, "testfile.txt")
   try:
-    f = open("testfile.txt","w")
+    f = open(testfile,"w")
     f.write("Testing writing\n")
     f.close()
-    os.remove("testfile.txt")
+    os.remove(testfile)
   except IOError as ioe:
     gLogger.error('Problem trying to write in area %s: %s' % (area, str(ioe)))
     return False
   except OSError as ose:
     gLogger.error('Problem removing from area %s: %s' % (area, str(ose)))
     return False
-  finally:
-    os.chdir(curdir)
   return True
     
 
@@ -0,0 +1,51 @@
+'''
+Call a function on a list of arguments using a bounded number of threads.
+
+Used to issue independent service calls (FileCatalog, downloads) concurrently.
+
+@since: Oct 18, 2026
+
+@author: agent
+'''
+
+from DIRAC import S_ERROR
+import threading, Queue
+
+def threadedMap(function, arguments, maxthreads = 10):
+  """ Call function(argument) for each argument, in at most maxthreads threads.
+
+  @param function: callable taking one argument, should return a S_OK/S_ERROR structure
+  @param arguments: list of arguments
+  @param maxthreads: maximum number of threads
+  @return: list of the results, in the order of the arguments. An exception raised by the function
+  is returned as S_ERROR.
+  """
+  results = [None] * len(arguments)
+  if not arguments:
+    return results
+  todo = Queue.Queue()
+  for index, argument in enumerate(arguments):
+    todo.put((index, argument))
+
+  def worker():
+    """ Process the arguments until there is none left
+    """
+    while True:
+      try:
+        index, argument = todo.get_nowait()
+      except Queue.Empty:
+        return
+      try:
+        results[index] = function(argument)
+      except Exception, x:
+        results[index] = S_ERROR("%s failed for %s: %s" % (getattr(function, '__name__', 'Call'), argument, str(x)))
+
+  threads = []
+  for i in range(max(1, min(maxthreads, len(arguments)))):
+    thread = threading.Thread(target = worker)
+    thread.setDaemon(True)
+    thread.start()
+    threads.append(thread)
+  for thread in threads:
+    thread.join()
+  return results
@@ -0,0 +1,134 @@
+'''
+Upload several files concurrently to their destination storage elements.
+
+Each file is put on the first of its storage elements accepting it, with retries and an increasing
+delay between the attempts, and with at most a given number of concurrent transfers per storage element.
+The files are registered at the end, in one bulk catalogue operation. The files that could not be put
+anywhere are given back to the caller for the failover (see L{UploadOutputData}).
+
+@since: Oct 18, 2026
+
+@author: agent
+'''
+
+from DIRAC.DataManagementSystem.Client.ReplicaManager import ReplicaManager
+from ILCDIRAC.Core.Utilities.ThreadedMap              import threadedMap
+from DIRAC import S_OK, S_ERROR, gLogger
+import threading, time
+
+class UploadEngine(object):
+  """ Concurrent upload of files, with a per storage element limit
+  """
+  def __init__(self, maxthreads = 8, maxperse = 2, retries = 3, backoff = 10, rm = None):
+    """
+    @param maxthreads: number of files uploaded at the same time
+    @param maxperse: number of files uploaded at the same time to one storage element
+    @param retries: number of attempts over the list of storage elements of a file
+    @param backoff: delay in seconds after the first failed attempt, doubled after each one
+    """
+    if not rm:
+      rm = ReplicaManager()
+    self.rm = rm
+    self.maxthreads = maxthreads
+    self.maxperse = maxperse
+    self.retries = retries
+    self.backoff = backoff
+    self.log = gLogger.getSubLogger("UploadEngine")
+    self.lock = threading.Lock()
+    self.slots = {}
+
+  def _slot(self, se):
+    """ The semaphore limiting the transfers to a storage element
+    """
+    self.lock.acquire()
+    try:
+      if not se in self.slots:
+        self.slots[se] = threading.BoundedSemaphore(self.maxperse)
+      return self.slots[se]
+    finally:
+      self.lock.release()
+
+  def putFile(self, lfn, localpath, selist):
+    """ Put the file on the first storage element of selist accepting it, retrying the whole list with
+    an increasing delay
+
+    @return: S_OK(storage element name)
+    """
+    message = 'No storage element given'
+    for attempt in range(self.retries):
+      if attempt:
+        delay = self.backoff * 2 ** (attempt - 1)
+        self.log.info("Will try again to upload %s in %s seconds" % (lfn, delay))
+        time.sleep(delay)
+      for se in selist:
+        slot = self._slot(se)
+        slot.acquire()
+        try:
+          start = time.time()
+          res = self.rm.put(lfn, localpath, se)
+        finally:
+          slot.release()
+        if res['OK'] and res['Value']['Successful'].has_key(lfn):
+          self.log.info("Uploaded %s to %s in %.1f s" % (lfn, se, time.time() - start))
+          return S_OK(se)
+        if res['OK']:
+          message = res['Value']['Failed'].get(lfn, 'Unknown error')
+        else:
+          message = res['Message']
+        self.log.warn("Failed to upload %s to %s:" % (lfn, se), message)
+    return S_ERROR("Failed to upload %s: %s" % (lfn, message))
+
+  def upload(self, files, catalogs):
+    """ Upload and register the files
+
+    @param files: dict file name -> metadata, as made by L{ModuleBase.getFileMetadata}, with the resolvedSE
+    list of storage elements
+    @param catalogs: list of the catalogs in which the files are registered
+    @return: S_OK(dict) with the Uploaded files (file name -> storage element), the Failed files (file name
+    -> error, to be sent to the failover) and the files whose RegistrationFailed (file name -> file tuple
+    of the registration)
+    """
+    names = files.keys()
+    results = threadedMap(lambda name: self.putFile(files[name]['lfn'], files[name]['localpath'],
+                                                    files[name]['resolvedSE']),
+                          names, self.maxthreads)
+    uploaded = {}
+    failed = {}
+    for name, res in zip(names, results):
+      if res['OK']:
+        uploaded[name] = res['Value']
+      else:
+        failed[name] = res['Message']
+
+    ##The PFNs of the uploaded files, one call per storage element
+    bySE = {}
+    for name, se in uploaded.items():
+      bySE.setdefault(se, []).append(name)
+    tuples = {}
+    registrationFailed = {}
+    for se, names in bySE.items():
+      res = self.rm.getPfnForLfn([files[name]['lfn'] for name in names], se)
+      for name in names:
+        lfn = files[name]['lfn']
+        pfn = ''
+        if res['OK'] and res['Value']['Successful'].has_key(lfn):
+          pfn = res['Value']['Successful'][lfn]
+        filedict = files[name]['filedict']
+        filetuple = (lfn, pfn, filedict['Size'], se, filedict['GUID'], filedict['Addler'])
+        if pfn:
+          tuples[name] = filetuple
+        else:
+          self.log.error("Failed to get the PFN of %s at %s" % (lfn, se))
+          registrationFailed[name] = filetuple
+
+    if tuples:
+      res = self.rm.registerFile(tuples.values(), catalogs)
+      if not res['OK']:
+        self.log.error("Failed to register the uploaded files:", res['Message'])
+        registrationFailed.update(tuples)
+      else:
+        for name, filetuple in tuples.items():
+          if not res['Value']['Successful'].has_key(filetuple[0]):
+            self.log.error("Failed to register %s:" % filetuple[0], res['Value']['Failed'].get(filetuple[0], ''))
+            registrationFailed[name] = filetuple
+    return S_OK({'Uploaded' : uploaded, 'Failed' : failed, 'RegistrationFailed' : registrationFailed})
@@ -5,6 +5,9 @@ For SUSY special treatment of the pythia parameters have to be thought of: if th
 IMSS(1)=11; IMSS(21)=71; IMSS(22)=71;
 
 This is currently done on the job definition side
+
+The default options of each model are built once per process (L{getTemplate}) and shared: a WhizardOptions
+only keeps the options that were changed, and builds the XML object only when asked for it.
 @since:  Nov 3, 2011
 @author: Stephane Poss
 '''
@@ -12,7 +15,7 @@ This is currently done on the job definition side
 from xml.etree.ElementTree                                import ElementTree, fromstring
 from ILCDIRAC.Core.Utilities.GeneratorModels              import GeneratorModels
 
-import types
+import threading, types
 
 from DIRAC import S_OK, S_ERROR
 
@@ -29,14 +32,7 @@ def getDict():
 
   return S_OK(pdict)
 
-class WhizardOptions(object):
-  """ Class that provides an interface to the xml representation of the whizard options.
-  """
-  def __init__(self, model = "sm"):
-    self.genmodel = GeneratorModels()
-    self.paramdict = {}
-    modelparams = self.modelParams(model)
-    self.whizardxml = fromstring("""<whizard>
+WHIZARD_XML = """<whizard>
 <process_input>
 <process_id type="string" value="">
 <!-- Process tag(s) as defined in whizard.prc. It should contain the list of processes to activate, separated by commas or blanks, enclosed in quotes. -->
@@ -597,22 +593,88 @@ class WhizardOptions(object):
 </EPA_x1>
 </beam_input_2>
 </whizard>
-"""%modelparams)
+"""
+
+#Templates already built, by model
+_templates = {}
+_templatesLock = threading.Lock()
+
+class WhizardTemplate(object):
+  """ The default options of a model, shared by all the L{WhizardOptions} of the model: must not be modified
+  """
+  def __init__(self, model):
+    self.genmodel = GeneratorModels()
+    modelparams = ""
+    res = self.genmodel.getParamsForWhizard(model)
+    if res['OK']:
+      modelparams = "\n".join(["<parameter_input>", res['Value'], "</parameter_input>"])
+    self.xml = WHIZARD_XML % modelparams
+    ##field -> tuple of the option names, in the order of the whizard.in
+    self.fields = []
+    self.options = {}
+    ##field/option -> (type, default value)
+    self.values = {}
+    for element in fromstring(self.xml).getchildren():
+      self.fields.append(element.tag)
+      self.options[element.tag] = tuple([subelement.tag for subelement in element.getchildren()])
+      for subelement in element.getchildren():
+        self.values[element.tag + "/" + subelement.tag] = (subelement.get('type'), subelement.get('value'))
+    self.fields = tuple(self.fields)
+    res = self.genmodel.getFile(model)
+    if not res['OK']:
+      self.inputfile = ('', 'F')
+    else:
+      self.inputfile = (res['Value'], 'T')
+
+def getTemplate(model):
+  """ Get the L{WhizardTemplate} of the model, built at the first call
+  """
+  _templatesLock.acquire()
+  try:
+    if not _templates.has_key(model):
+      _templates[model] = WhizardTemplate(model)
+    return _templates[model]
+  finally:
+    _templatesLock.release()
+
+class WhizardOptions(object):
+  """ Class that provides an interface to the xml representation of the whizard options.
+  """
+  def __init__(self, model = "sm"):
+    self.template = getTemplate(model)
+    self.genmodel = self.template.genmodel
+    self.paramdict = {}
+    ##field/option -> value, for the options changed
+    self.changed = {}
+    self._whizardxml = None
     self.getInputFiles(model)
   
+  def _getWhizardXML(self):
+    """ The XML object of the options, built when first needed
+    """
+    if self._whizardxml is None:
+      self._whizardxml = fromstring(self.template.xml)
+      for path, value in self.changed.items():
+        self._whizardxml.find(path).attrib['value'] = value
+    return self._whizardxml
+  whizardxml = property(_getWhizardXML)
+
+  def _value(self, path):
+    """ The current value of the option field/option
+    """
+    if self.changed.has_key(path):
+      return self.changed[path]
+    return self.template.values[path][1]
+
   def getInputFiles(self, model):
     """ Get the proper input parameter file, usually LesHouches
     """
     if not self.paramdict.has_key('process_input'):
       self.paramdict['process_input'] = {}
     if not self.paramdict['process_input'].has_key('input_file'):
-      res = self.genmodel.getFile(model) 
-      if not res['OK']:
-        self.paramdict['process_input']['input_file'] = ''
-        self.paramdict['process_input']['input_slha_format'] = 'F'
-      else:
-        self.paramdict['process_input']['input_file'] = res['Value']
-        self.paramdict['process_input']['input_slha_format'] = 'T'
+      inputfile, slhaformat = self.template.inputfile
+      self.paramdict['process_input']['input_file'] = inputfile
+      self.paramdict['process_input']['input_slha_format'] = slhaformat
     
     
   def modelParams(self, model):
@@ -640,30 +702,26 @@ class WhizardOptions(object):
   def getMainFields(self):
     """ Get the main fields
     """
-    listoffields = []
-    for elem in self.whizardxml.getchildren():
-      listoffields.append(elem.tag)
-    return S_OK(listoffields)
+    return S_OK(list(self.template.fields))
   
   def getOptionsForField(self, field):
     """ Get the options of a given field
     """
-    options = []
-    element = self.whizardxml.find(field)
-    if element == None:
+    if not self.template.options.has_key(field):
       return S_ERROR("Field %s does not exist" % field)
-    for subelements in element.getchildren():
-      options.append(subelements.tag)
-    return S_OK(options)
+    return S_OK(list(self.template.options[field]))
   
   def getValue(self, field):
     """ Get the value for a given field/option
     """
-    element = self.whizardxml.find(field)
-    return S_OK(element.attrib['value'])  
+    if not self.template.values.has_key(field):
+      return S_ERROR("Field %s does not exist" % field)
+    return S_OK(self._value(field))
 
   def changeAndReturn(self, paramdict):
-    """ Update the options, and returns the modified XML object
+    """ Update the options. The template is not modified, only the changed values are kept.
+
+    @return: S_OK(self), the XML object being available as whizardxml
     """
     self.paramdict.update(paramdict)
     res = self.checkFields(self.paramdict)
@@ -671,35 +729,34 @@ class WhizardOptions(object):
       return res
     for key, val in self.paramdict.items():
       for subkey in val.keys():
-        subelement = self.whizardxml.find(key + "/" + subkey)
-        subelement.attrib['value'] = val[subkey]
-    return S_OK(self.whizardxml)
+        self.changed[key + "/" + subkey] = val[subkey]
+        if self._whizardxml is not None:
+          self._whizardxml.find(key + "/" + subkey).attrib['value'] = val[subkey]
+    return S_OK(self)
   
   def getAsDict(self):
     """ Get the content as dict, like the one used for setting the options
     """
     whiz_opt = {}
-    for element in self.whizardxml.getchildren():
-      whiz_opt[element.tag] = {}
-      for item in element.getchildren():
-        val = item.attrib['value']
+    for field in self.template.fields:
+      whiz_opt[field] = {}
+      for option in self.template.options[field]:
+        val = self._value(field + "/" + option)
         if type(val) == type(""):
           val = val.rstrip()
-        whiz_opt[element.tag][item.tag] = val
+        whiz_opt[field][option] = val
     return S_OK(whiz_opt)
   
   def checkFields(self, paramdict):
     """ Make sure all supplied fields are exisiting somewhere
     """
     for key, val in paramdict.items():
-      element = self.whizardxml.find(key)
-      if element == None:
+      if not self.template.options.has_key(key):
         return S_ERROR("Element %s is not in the allowed parameters" % key)
       for subkey, value in val.items():
-        subelement = self.whizardxml.find(key + "/" + subkey)
-        if subelement == None:
+        if not self.template.values.has_key(key + "/" + subkey):
           return S_ERROR("Key %s/%s is not in the allowed parameters" % (key, subkey))
-        etype = subelement.attrib['type']
+        etype = self.template.values[key + "/" + subkey][0]
         if etype == 'float':
           if not type(value) == types.FloatType and not type(value) == types.IntType:
             return S_ERROR("%s should be a float" % (key + "/" + subkey))
@@ -728,16 +785,17 @@ class WhizardOptions(object):
     """ Write the options to the whizard.in
     """
     lines = []
-    for elem in self.whizardxml.getchildren():
-      tag = elem.tag
+    for field in self.template.fields:
+      tag = field
       if tag.count("beam_input"):
         tag = "beam_input"
       lines.append("&%s" % tag)
-      for subelem in elem.getchildren():
-        val = subelem.get('value')
+      for option in self.template.options[field]:
+        path = field + "/" + option
+        val = self._value(path)
         if val == 'sqrts':
           continue
-        if subelem.get('type') == 'string' :
+        if self.template.values[path][0] == 'string' :
           val = '"%s"' % val
         if val == '000':
           val = '0 0 0'
@@ -745,10 +803,10 @@ class WhizardOptions(object):
           val = '0.0 0.0'
         if val == '0..0..0':
           val = '\n 1 20000\n 10 20000\n 1 20000'
-        lines.append(' %s = %s' % (subelem.tag, val))
+        lines.append(' %s = %s' % (option, val))
       lines.append('/')
     of = file(fname, "w")
     of.write("\n".join(lines))
     of.write("\n")
+    of.close()
     return S_OK(True)
-  
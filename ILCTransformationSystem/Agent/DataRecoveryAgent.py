@@ -30,15 +30,16 @@ from DIRAC                                                     import gLogger, S
 from DIRAC.Core.Base.AgentModule                               import AgentModule
 from DIRAC.DataManagementSystem.Client.ReplicaManager          import ReplicaManager
 from DIRAC.RequestManagementSystem.Client.RequestClient        import RequestClient
-from DIRAC.Core.Utilities.List                                 import uniqueElements
 from DIRAC.Core.Utilities.Time                                 import dateTime
 from DIRAC.Core.Workflow.Workflow                              import fromXMLString
 from DIRAC.ConfigurationSystem.Client.Helpers.Operations import Operations
 
 from DIRAC.TransformationSystem.Client.TransformationClient    import TransformationClient  
 from ILCDIRAC.Core.Utilities.ProductionData                    import constructProductionLFNs
+from ILCDIRAC.Core.Utilities.ThreadedMap                       import threadedMap
+from ILCDIRAC.ILCTransformationSystem.Utilities.DataRecoveryState import DataRecoveryState, sqlite3
 
-import string,datetime
+import string, datetime, threading, time, os
 
 AGENT_NAME = 'TransformationSystem/DataRecoveryAgent'
 
@@ -62,6 +63,23 @@ class DataRecoveryAgent( AgentModule ):
     self.enableFlag = self.am_getOption('EnableFlag', False)
     self.am_setModuleParam("shifterProxy", "ProductionManager")
     self.ops = Operations()
+    self.transformationTypes = ['MCReconstruction', 'MCSimulation', 'MCReconstruction_Overlay', 'Merge']
+    self.transformationStatus = ['Active', 'Completing']
+    self.fileSelectionStatus = ['Assigned', 'MaxReset']
+    self.updateStatus = 'Unused'
+    self.wmsStatusList = ['Failed']
+    self.selectDelay = 2
+    self.metricsLock = threading.Lock()
+    self.metrics = {}
+    #Verdicts of the tasks already checked, see L{DataRecoveryState}
+    self.state = None
+    if self.am_getOption('IncrementalChecks', True):
+      if sqlite3:
+        stateFile = self.am_getOption('StateFile', os.path.join(self.am_getWorkDirectory(), 'DataRecoveryState.sqlite'))
+        self.state = DataRecoveryState(stateFile)
+        self.log.info('Task verdicts are kept in %s' % stateFile)
+      else:
+        self.log.warn('sqlite3 is not available, all the tasks will be checked at each cycle')
     return S_OK()
   #############################################################################
   def execute(self):
@@ -69,30 +87,31 @@ class DataRecoveryAgent( AgentModule ):
     """  
     self.log.info('Enable flag is %s' % self.enableFlag)  
     self.removalOKFlag = True
+    cycleStart = time.time()
+    self.metrics = {}
     
-    transformationTypes = ['MCReconstruction', 'MCSimulation', 'MCReconstruction_Overlay', 'Merge']
-    transformationStatus = ['Active', 'Completing']
-    fileSelectionStatus = ['Assigned', 'MaxReset']
-    updateStatus = 'Unused'
-    wmsStatusList = ['Failed']
     #only worry about files > 12hrs since last update    
-    selectDelay = self.am_getOption("Delay", 2) #hours 
+    self.selectDelay = self.am_getOption("Delay", 2) #hours 
+    #number of transformations treated at the same time
+    maxParallel = self.am_getOption("MaxParallelTransformations", 4)
+    #verdicts older than that are checked again, in hours
+    self.stateMaxAge = self.am_getOption("StateMaxAge", 24)
 
     transformationDict = {}
-    for transStatus in transformationStatus:
-      result = self.getEligibleTransformations(transStatus, transformationTypes)
+    for transStatus in self.transformationStatus:
+      result = self.getEligibleTransformations(transStatus, self.transformationTypes)
       if not result['OK']:
         self.log.error(result)
         return S_ERROR('Could not obtain eligible transformations for status "%s"' % (transStatus))
       
       if not result['Value']:
-        self.log.info('No "%s" transformations of types %s to process.' % (transStatus, string.join(transformationTypes, ', ')))
+        self.log.info('No "%s" transformations of types %s to process.' % (transStatus, string.join(self.transformationTypes, ', ')))
         continue
 
       transformationDict.update(result['Value'])
 
-    self.log.info('Selected %s transformations of types %s' % (len(transformationDict.keys()), string.join(transformationTypes, ', ')))
-    self.log.verbose('The following transformations were selected out of %s:\n%s' % (string.join(transformationTypes, ', '), string.join(transformationDict.keys(), ', ')))
+    self.log.info('Selected %s transformations of types %s' % (len(transformationDict.keys()), string.join(self.transformationTypes, ', ')))
+    self.log.verbose('The following transformations were selected out of %s:\n%s' % (string.join(self.transformationTypes, ', '), string.join(transformationDict.keys(), ', ')))
 
     trans = []
     #initially this was useful for restricting the considered list
@@ -102,6 +121,7 @@ class DataRecoveryAgent( AgentModule ):
     if trans:
       self.log.info('Skipping all transformations except %s' % (string.join(trans, ', ')))
           
+    selected = []
     for transformation, typeName in transformationDict.items():
       if trans:
         if not transformation in trans:
@@ -110,90 +130,177 @@ class DataRecoveryAgent( AgentModule ):
         if int(ignoreLessThan) > int(transformation):
           self.log.verbose('Ignoring transformation %s ( is less than specified limit %s )' % (transformation, ignoreLessThan))
           continue
+      selected.append(transformation)
+    self.addMetric('SelectTransformations', time.time() - cycleStart)
 
-      self.log.info('='*len('Looking at transformation %s type %s:' % (transformation, typeName)))
-      self.log.info('Looking at transformation %s:' % (transformation))
-
-      result = self.selectTransformationFiles(transformation, fileSelectionStatus)
+    results = threadedMap(self.treatTransformation, selected, maxParallel)
+    for transformation, result in zip(selected, results):
       if not result['OK']:
-        self.log.error(result)
-        self.log.error('Could not select files for transformation %s' % transformation)
-        continue
+        self.log.error('Transformation %s:' % transformation, result['Message'])
+
+    if self.state:
+      self.state.purge(transformationDict.keys())
+
+    self.addMetric('Cycle', time.time() - cycleStart)
+    self.addMetric('Transformations', len(selected))
+    self.reportMetrics()
+    return S_OK()
+
+  #############################################################################
+  def treatTransformation(self, transformation):
+    """ Recover the files of one transformation. Called concurrently for several transformations.
+    """
+    self.log.info('Looking at transformation %s:' % (transformation))
+
+    start = time.time()
+    result = self.selectTransformationFiles(transformation, self.fileSelectionStatus)
+    self.addMetric('SelectFiles', time.time() - start)
+    if not result['OK']:
+      self.log.error(result)
+      return S_ERROR('Could not select files for transformation %s' % transformation)
   
-      if not result['Value']:
-        self.log.info('No files in status %s selected for transformation %s' % (string.join(fileSelectionStatus, ', '), transformation))
-        continue
+    if not result['Value']:
+      self.log.info('No files in status %s selected for transformation %s' % (string.join(self.fileSelectionStatus, ', '), transformation))
+      return S_OK()
     
-      fileDict = result['Value']      
-      result = self.obtainWMSJobIDs(transformation, fileDict, selectDelay, wmsStatusList)
-      if not result['OK']:
-        self.log.error(result)
-        self.log.error('Could not obtain WMS jobIDs for files of transformation %s' % (transformation))
-        continue
-      if not result['Value']:
-        self.log.info('No eligible WMS jobIDs found for %s files in list:\n%s ...' % (len(fileDict.keys()), fileDict.keys()[0]))
-        continue
+    fileDict = result['Value']      
+    self.addMetric('FilesSelected', len(fileDict))
+    start = time.time()
+    result = self.obtainWMSJobIDs(transformation, fileDict, self.selectDelay, self.wmsStatusList)
+    self.addMetric('GetTasks', time.time() - start)
+    if not result['OK']:
+      self.log.error(result)
+      return S_ERROR('Could not obtain WMS jobIDs for files of transformation %s' % (transformation))
+    if not result['Value']:
+      self.log.info('No eligible WMS jobIDs found for %s files in list:\n%s ...' % (len(fileDict.keys()), fileDict.keys()[0]))
+      return S_OK()
     
-      jobFileDict = result['Value']
-      fileCount = 0
-      for lfnList in jobFileDict.values():
-        fileCount += len(lfnList)
+    jobFileDict = result['Value']
+    fileCount = 0
+    for lfnList in jobFileDict.values():
+      fileCount += len(lfnList)
       
-      if not fileCount:
-        self.log.info('No files were selected for transformation %s after examining WMS jobs.' % transformation)
-        continue
+    if not fileCount:
+      self.log.info('No files were selected for transformation %s after examining WMS jobs.' % transformation)
+      return S_OK()
       
-      self.log.info('%s files are selected after examining related WMS jobs' % (fileCount))   
-      result = self.checkOutstandingRequests(jobFileDict)
-      if not result['OK']:
-        self.log.error(result)
-        continue
+    self.log.info('%s files are selected after examining related WMS jobs' % (fileCount))   
+    start = time.time()
+    allJobFileDict = dict(jobFileDict)
+    result = self.checkOutstandingRequests(jobFileDict)
+    self.addMetric('CheckRequests', time.time() - start)
+    if not result['OK']:
+      self.log.error(result)
+      return result
+    pending = []
+    for wmsID, lfnList in allJobFileDict.items():
+      if not wmsID in result['Value']:
+        pending.extend(lfnList)
+    self.recordVerdicts(transformation, fileDict, pending, 'Pending')
 
-      if not result['Value']:
-        self.log.info('No WMS jobs without pending requests to process.')
-        continue
+    if not result['Value']:
+      self.log.info('No WMS jobs without pending requests to process.')
+      return S_OK()
       
-      jobFileNoRequestsDict = result['Value']
-      fileCount = 0
-      for lfnList in jobFileNoRequestsDict.values():
-        fileCount += len(lfnList)
+    jobFileNoRequestsDict = result['Value']
+    fileCount = 0
+    for lfnList in jobFileNoRequestsDict.values():
+      fileCount += len(lfnList)
       
-      self.log.info('%s files are selected after removing any relating to jobs with pending requests' % (fileCount))
-      result = self.checkDescendents(transformation, fileDict, jobFileNoRequestsDict)
-      if not result['OK']:
-        self.log.error(result)
-        continue
+    self.log.info('%s files are selected after removing any relating to jobs with pending requests' % (fileCount))
+    start = time.time()
+    result = self.checkDescendents(transformation, fileDict, jobFileNoRequestsDict)
+    self.addMetric('CheckDescendents', time.time() - start)
+    if not result['OK']:
+      self.log.error(result)
+      return result
 
-      jobsWithFilesOKToUpdate = result['Value']['filesToMarkUnused']
-      jobsWithFilesProcessed = result['Value']['filesprocessed']
-      self.log.info('====> Transformation %s total files that can be updated now: %s' % (transformation, len(jobsWithFilesOKToUpdate)))
+    filesToUpdateUnused = result['Value']['filesToMarkUnused']
+    filesToUpdateProcessed = result['Value']['filesprocessed']
+    self.log.info('====> Transformation %s total files that can be updated now: %s' % (transformation, len(filesToUpdateUnused)))
 
-      filesToUpdateUnused = []
-      for fileList in jobsWithFilesOKToUpdate:
-        filesToUpdateUnused.append(fileList)
-      
-      if len(filesToUpdateUnused):
-        result = self.updateFileStatus(transformation, filesToUpdateUnused, updateStatus)
-        if not result['OK']:
-          self.log.error('Recoverable files were not updated with result:\n%s' % (result['Message']))
-          continue
-      else:
-        self.log.info('There are no files with failed jobs to update for production %s in this cycle' % transformation)             
+    start = time.time()
+    self.recordVerdicts(transformation, fileDict, filesToUpdateUnused, self.updateStatus)
+    self.recordVerdicts(transformation, fileDict, filesToUpdateProcessed, 'Processed')
+    if len(filesToUpdateUnused):
+      result = self.updateFileStatus(transformation, filesToUpdateUnused, self.updateStatus)
+      if not result['OK']:
+        self.log.error('Recoverable files were not updated with result:\n%s' % (result['Message']))
+        return result
+      self.addMetric('FilesUnused', len(filesToUpdateUnused))
+      self.recordVerdicts(transformation, fileDict, filesToUpdateUnused, self.updateStatus, self.enableFlag)
+    else:
+      self.log.info('There are no files with failed jobs to update for production %s in this cycle' % transformation)             
 
-      filesToUpdateProcessed = []  
-      for fileList in jobsWithFilesProcessed:
-        filesToUpdateProcessed.append(fileList)
-      
-      if len(filesToUpdateProcessed):
-        result = self.updateFileStatus(transformation, filesToUpdateProcessed, 'Processed')
-        if not result['OK']:
-          self.log.error('Recoverable files were not updated with result:\n%s' % (result['Message']))
-          continue          
-      else:
-        self.log.info('There are no files processed to update for production %s in this cycle' % transformation)              
+    if len(filesToUpdateProcessed):
+      result = self.updateFileStatus(transformation, filesToUpdateProcessed, 'Processed')
+      if not result['OK']:
+        self.log.error('Recoverable files were not updated with result:\n%s' % (result['Message']))
+        return result
+      self.addMetric('FilesProcessed', len(filesToUpdateProcessed))
+      self.recordVerdicts(transformation, fileDict, filesToUpdateProcessed, 'Processed', self.enableFlag)
+    else:
+      self.log.info('There are no files processed to update for production %s in this cycle' % transformation)              
+    self.addMetric('UpdateFiles', time.time() - start)
       
     return S_OK()
 
+  #############################################################################
+  def recordVerdicts(self, transformation, fileDict, lfns, verdict, applied = False):
+    """ Keep in the state store the verdict of the tasks of the files
+    """
+    if not self.state or not lfns:
+      return S_OK()
+    verdicts = {}
+    for lfn in lfns:
+      verdicts[int(fileDict[lfn])] = verdict
+    res = self.state.setVerdicts(transformation, verdicts, applied)
+    if not res['OK']:
+      self.log.error('Could not store the task verdicts:', res['Message'])
+    return res
+
+  #############################################################################
+  def needsCheck(self, task):
+    """ Tell if a task that did not change since its last check must be checked again: the verdicts that
+    can change without the task changing (Pending), the verdicts not applied (unless in dry run, where
+    they are only reported) and the old verdicts are not trusted
+    """
+    if not task['Verdict'] or task['Verdict'] == 'Pending':
+      return True
+    if time.time() - task['CheckTime'] > self.stateMaxAge * 3600:
+      return True
+    if task['Verdict'] == 'Ignored':
+      return False
+    return bool(self.enableFlag) and not task['Applied']
+
+  #############################################################################
+  def addMetric(self, name, value):
+    """ Add value to the metric of the cycle, the durations are summed over the transformations
+    """
+    self.metricsLock.acquire()
+    try:
+      self.metrics[name] = self.metrics.get(name, 0) + value
+    finally:
+      self.metricsLock.release()
+
+  #############################################################################
+  def reportMetrics(self):
+    """ Log the metrics of the cycle
+    """
+    counters = ['Transformations', 'FilesSelected', 'FilesUnused', 'FilesProcessed', 'TasksQueried', 'TasksChecked',
+                'TasksReused']
+    timers = ['SelectTransformations', 'SelectFiles', 'GetTasks', 'CheckRequests', 'CheckDescendents', 'UpdateFiles',
+              'Cycle']
+    self.log.info('Cycle metrics: %s' % string.join(['%s=%s' % (name, self.metrics.get(name, 0))
+                                                    for name in counters], ', '))
+    self.log.info('Cycle timing (s): %s' % string.join(['%s=%.1f' % (name, self.metrics.get(name, 0))
+                                                       for name in timers], ', '))
+    if not self.enableFlag and self.state:
+      checked = self.metrics.get('TasksChecked', 0)
+      reused = self.metrics.get('TasksReused', 0)
+      self.log.info('Dry run report: %s of %s tasks with selected files were taken from the state store, %s were \
+checked again' % (reused, reused + checked, checked))
+
   #############################################################################
   def getEligibleTransformations(self, status, typeList):
     """ Select transformations of given status and type.
@@ -239,58 +346,100 @@ class DataRecoveryAgent( AgentModule ):
         statuses only possibly include some files in Unused status (not Processed 
         for example) that will not be touched.
     """
-    prodJobIDs = uniqueElements(fileDict.values())
-    self.log.info('The following %s production jobIDs apply to the selected files:\n%s' % (len(prodJobIDs), prodJobIDs))
+    #Index of the files of each task
+    taskFiles = {}
+    for lfn, prodID in fileDict.items():
+      taskFiles.setdefault(int(prodID), []).append(lfn)
+    prodJobIDs = taskFiles.keys()
+    self.log.info('%s production jobIDs apply to the selected files of transformation %s' % (len(prodJobIDs), transformation))
+    self.log.verbose('The following production jobIDs apply to the selected files:\n%s' % (prodJobIDs))
 
     jobFileDict = {}
-    condDict = {'TransformationID' : transformation, self.taskIDName : prodJobIDs}
     delta = datetime.timedelta( hours = selectDelay )
     now = dateTime()
-    olderThan = now-delta
+    olderThan = (now-delta).replace(microsecond = 0)
 
-    res = self.prodDB.getTransformationTasks(condDict = condDict, older = olderThan,
-                                             timeStamp = 'LastUpdateTime', inputVector = True)
-    self.log.debug(res)
-    if not res['OK']:
-      self.log.error('getTransformationTasks returned an error:\n%s')
-      return res
+    #With the state store, only the tasks updated since the previous cycle are read for the known tasks
+    known = {}
+    cutoff = None
+    if self.state:
+      known = self.state.getTasks(transformation)
+      cutoff = self.state.getCutoff(transformation)
+    if cutoff:
+      queries = [([task for task in prodJobIDs if not task in known], None),
+                 ([task for task in prodJobIDs if task in known], cutoff)]
+    else:
+      queries = [(prodJobIDs, None)]
+
+    changed = {}
+    for taskIDs, newerThan in queries:
+      if not taskIDs:
+        continue
+      condDict = {'TransformationID' : transformation, self.taskIDName : taskIDs}
+      res = self.prodDB.getTransformationTasks(condDict = condDict, older = olderThan, newer = newerThan,
+                                               timeStamp = 'LastUpdateTime', inputVector = True)
+      self.log.debug(res)
+      if not res['OK']:
+        self.log.error('getTransformationTasks returned an error:\n%s' % res['Message'])
+        return res
     
-    for jobDict in res['Value']:
-      missingKey = False
-      for key in [self.taskIDName, self.externalID, 'LastUpdateTime', self.externalStatus, 'InputVector']:
-        if not jobDict.has_key(key):
-          self.log.info('Missing key %s for job dictionary, the following is available:\n%s' % (key, jobDict))
-          missingKey = True
-          continue
+      for jobDict in res['Value']:
+        missingKey = False
+        for key in [self.taskIDName, self.externalID, 'LastUpdateTime', self.externalStatus, 'InputVector']:
+          if not jobDict.has_key(key):
+            self.log.info('Missing key %s for job dictionary, the following is available:\n%s' % (key, jobDict))
+            missingKey = True
+            continue
       
-      if missingKey:
-        continue
-        
-      job = jobDict[self.taskIDName]
-      wmsID = jobDict[self.externalID]
+        if missingKey:
+          continue
+        changed[int(jobDict[self.taskIDName])] = {'LastUpdateTime' : jobDict['LastUpdateTime'],
+                                                  'ExternalID' : jobDict[self.externalID],
+                                                  'ExternalStatus' : jobDict[self.externalStatus]}
+    self.addMetric('TasksQueried', len(changed))
+
+    tasks = dict(changed)
+    if self.state:
+      res = self.state.updateTasks(transformation, changed)
+      if not res['OK']:
+        self.log.error('Could not store the tasks:', res['Message'])
+        return res
+      self.state.setCutoff(transformation, olderThan)
+      reused = 0
+      for task in prodJobIDs:
+        if task in known and not task in changed:
+          if self.needsCheck(known[task]):
+            tasks[task] = known[task]
+          else:
+            reused += 1
+      self.addMetric('TasksReused', reused)
+    self.addMetric('TasksChecked', len(tasks))
+
+    ignored = {}
+    for job, jobDict in tasks.items():
+      wmsID = jobDict['ExternalID']
       lastUpdate = jobDict['LastUpdateTime']
-      wmsStatus = jobDict[self.externalStatus]
-      jobInputData = jobDict['InputVector']
-      jobInputData = [lfn.replace('LFN:','') for lfn in jobInputData.split(';')]
+      wmsStatus = jobDict['ExternalStatus']
       
       if not int(wmsID):
         self.log.info('Prod job %s status is %s (ID = %s) so will not recheck with WMS' %(job, wmsStatus, wmsID))
+        ignored[job] = 'Ignored'
         continue
       
-      self.log.info('Job %s, prod job %s last update %s, production management system status %s' % (wmsID, job, lastUpdate, wmsStatus))
+      self.log.verbose('Job %s, prod job %s last update %s, production management system status %s' % (wmsID, job, lastUpdate, wmsStatus))
       #Exclude jobs not having appropriate WMS status - have to trust that production management status is correct        
       if not wmsStatus in wmsStatusList:
-        self.log.info('Job %s is in status %s, not %s so will be ignored' % (wmsID, wmsStatus, string.join(wmsStatusList, ', ')))
+        self.log.verbose('Job %s is in status %s, not %s so will be ignored' % (wmsID, wmsStatus, string.join(wmsStatusList, ', ')))
+        ignored[job] = 'Ignored'
         continue
         
-      finalJobData = []
       #Must map unique files -> jobs in expected state
-      for lfn,prodID in fileDict.items():
-        if int(prodID) == int(job):
-          finalJobData.append(lfn)
+      finalJobData = taskFiles.get(int(job), [])
       
-      self.log.info('Found %s files for job %s' % (len(finalJobData), job))    
+      self.log.verbose('Found %s files for job %s' % (len(finalJobData), job))    
       jobFileDict[wmsID] = finalJobData
+    if self.state:
+      self.state.setVerdicts(transformation, ignored)
  
     return S_OK(jobFileDict)
   
@@ -336,43 +485,45 @@ class DataRecoveryAgent( AgentModule ):
       if not param:
         continue
       olist.extend(param.value)
-    expectedlfns = []
-    contactfailed = []
-    fileprocessed = []
-    files = []
-    tasks_to_be_checked = {}
+    #The output LFNs expected from each task, checked with one catalog query
+    taskOutputs = {}
+    expected = {}
     for files in jobFileDict.values():
-      for f in files:
-        if f in filedict:
-          tasks_to_be_checked[f] = filedict[f] #get the tasks that need to be checked
-    for filep, task in tasks_to_be_checked.items():
-      commons = {}
-      commons['outputList'] = olist
-      commons['PRODUCTION_ID'] = transformation
-      commons['JOB_ID'] = task
-      commons['JobType'] = jtype
-      out = constructProductionLFNs(commons)
-      expectedlfns = out['Value']['ProductionOutputData']
-      res = self.replicaManager.getCatalogFileMetadata(expectedlfns)
-      if not res['OK']:
-        self.log.error('Getting metadata failed')
-        contactfailed.append(filep)
-        continue
-      if not filep in files:
-        files.append(filep)      
-      success = res['Value']['Successful'].keys()
-      failed = res['Value']['Failed'].keys()
-      if len(success) and not len(failed):
-        fileprocessed.append(filep)
-        
-    final_list_unused = files
-    for file_all in files:
-      if file_all in fileprocessed:
-        try:
-          final_list_unused.remove(filep)
-        except:
-          self.log.warn("Item not in list anymore")
+      for lfn in files:
+        if not lfn in filedict:
+          continue
+        task = filedict[lfn] #get the tasks that need to be checked
+        if not task in taskOutputs:
+          commons = {}
+          commons['outputList'] = olist
+          commons['PRODUCTION_ID'] = transformation
+          commons['JOB_ID'] = task
+          commons['JobType'] = jtype
+          out = constructProductionLFNs(commons)
+          if not out['OK']:
+            self.log.error('Could not construct the output LFNs of task %s:' % task, out['Message'])
+            continue
+          taskOutputs[task] = out['Value']['ProductionOutputData']
+        expected[lfn] = taskOutputs[task]
 
+    alllfns = set()
+    for lfns in taskOutputs.values():
+      alllfns.update(lfns)
+    fileprocessed = []
+    final_list_unused = []
+    if not alllfns:
+      final_list_unused = expected.keys()
+    else:
+      res = self.replicaManager.getCatalogFileMetadata(list(alllfns))
+      if not res['OK']:
+        self.log.error('Getting metadata failed for transformation %s:' % transformation, res['Message'])
+        return S_ERROR('Getting metadata failed')
+      existing = res['Value']['Successful']
+      for lfn, lfns in expected.items():
+        if len(lfns) and not [output for output in lfns if not output in existing]:
+          fileprocessed.append(lfn)
+        else:
+          final_list_unused.append(lfn)
         
     result = {'filesprocessed' : fileprocessed, 'filesToMarkUnused' : final_list_unused}    
     return S_OK(result)
@@ -1,13 +1,26 @@
 """
-Sub class of TransformationPlugin to allow for extending the ILD sim jobs
+Sub class of TransformationPlugin to allow for extending the ILD sim jobs, and to group the files
+by number of events
 """
 
 from DIRAC.TransformationSystem.Agent.TransformationPlugin import TransformationPlugin as DTP
-from DIRAC import S_OK, S_ERROR
+from ILCDIRAC.Core.Utilities.InputFilesUtilities           import getFileUserMetadata, getDirectoryMetadata
+from DIRAC import S_OK, S_ERROR, gLogger
+import bisect, os, time
+
+#Fraction of the target number of events a task can lack and still be created
+EVENTS_TOLERANCE = 0.1
+#Seconds after which a group of files is made a task even if more files could still join it
+MAX_GROUP_AGE = 24 * 3600
+
+#When the files were first seen by the EventBalanced plugin: transformation ID -> (time of the last call,
+#{LFN: time}). The transformations without call for MAX_GROUP_AGE have no files left and are dropped.
+_firstSeen = {}
 
 class TransformationPlugin(DTP):
   """
-  This plugin is ONLY used when willing to limit the number of tasks to a certain number of files.
+  The Limited plugin is ONLY used when willing to limit the number of tasks to a certain number of files.
+  The EventBalanced plugin makes tasks of about EventsPerTask events.
   """
   def __init__(self, plugin, transClient = None, replicaManager = None):
     DTP.__init__(self, plugin, transClient, replicaManager)
@@ -40,4 +53,92 @@ class TransformationPlugin(DTP):
       if total_used >= max_tasks and max_tasks > 0:
         break
     return S_OK( newTasks )
-    
\ No newline at end of file
+    
+
+  def _EventBalanced(self):
+    """
+    Make tasks of about EventsPerTask events (transformation parameter) from files at the same SEs.
+    The files of each SE group are packed, largest first, in the task with the least room left that can
+    take them. Only the tasks within EVENTS_TOLERANCE of the target are created, the other files wait for
+    more files, unless the transformation is flushed or the oldest file of the group has waited
+    MAX_GROUP_AGE. Files with more events than the target get a task of their own. The
+    number of events of the files comes from the catalog meta data, kept between calls.
+    """
+    target = int(self.params.get('EventsPerTask', 0))
+    if target <= 0:
+      return S_ERROR('The EventBalanced plugin needs a positive EventsPerTask parameter')
+    flush = self.params.get('Status', '') == 'Flush'
+    now = time.time()
+    transID = self.params.get('TransformationID')
+    for otherID, (lastcall, _seen) in _firstSeen.items():
+      if now - lastcall > MAX_GROUP_AGE:
+        del _firstSeen[otherID]
+    seen = _firstSeen.get(transID, (now, {}))[1]
+    seen = dict([(lfn, seen.get(lfn, now)) for lfn in self.data.keys()])
+    _firstSeen[transID] = (now, seen)
+    events = _getNumberOfEvents(self.data.keys())
+    missing = [lfn for lfn in self.data.keys() if not lfn in events]
+    if missing:
+      gLogger.error('%s files have no number of events and will not be grouped, for example' % len(missing),
+                    missing[0])
+    ##Group the files by replicas, like _groupByReplicas
+    fileGroups = {}
+    for lfn, ses in self.data.items():
+      if lfn in events:
+        replicaSE = ','.join(sorted(set(ses)))
+        fileGroups.setdefault(replicaSE, []).append(lfn)
+    newTasks = []
+    for replicaSE in sorted(fileGroups.keys()):
+      for lfns, nbevents in packByEvents(fileGroups[replicaSE], events, target):
+        age = now - min([seen[lfn] for lfn in lfns])
+        if flush or nbevents >= target * (1 - EVENTS_TOLERANCE) or age > MAX_GROUP_AGE:
+          newTasks.append((replicaSE, lfns))
+    return S_OK(newTasks)
+
+def packByEvents(lfns, events, target):
+  """ Best fit decreasing packing of the files in groups of at most target events
+
+  @param events: dict LFN -> number of events
+  @return: list of (list of LFNs, number of events)
+  """
+  groups = []
+  ##(room left, group index) of the groups that are not full, sorted
+  rooms = []
+  for lfn in sorted(lfns, key = lambda lfn: events[lfn], reverse = True):
+    nbevents = events[lfn]
+    index = bisect.bisect_left(rooms, (nbevents, -1))
+    if nbevents >= target or index == len(rooms):
+      groups.append(([lfn], nbevents))
+      group = len(groups) - 1
+      room = target - nbevents
+    else:
+      room, group = rooms.pop(index)
+      groups[group][0].append(lfn)
+      groups[group] = (groups[group][0], groups[group][1] + nbevents)
+      room -= nbevents
+    if room > 0:
+      bisect.insort(rooms, (room, group))
+  return groups
+
+def _getNumberOfEvents(lfns):
+  """ Number of events of the files, from their meta data or else from their directory's. The meta data
+  that has the number of events is kept for a while by L{InputFilesUtilities}, the rest is asked again.
+
+  @return: dict LFN -> number of events, without the files for which it is not known
+  """
+  events = {}
+  filemeta = getFileUserMetadata(lfns, requiredKey = 'NumberOfEvents')
+  needed = []
+  for lfn in lfns:
+    if filemeta.get(lfn, {}).has_key('NumberOfEvents'):
+      events[lfn] = int(filemeta[lfn]['NumberOfEvents'])
+    else:
+      needed.append(lfn)
+  if needed:
+    dirmeta = getDirectoryMetadata(list(set([os.path.dirname(lfn) for lfn in needed])),
+                                   requiredKey = 'NumberOfEvents')
+    for lfn in needed:
+      path = os.path.dirname(lfn)
+      if dirmeta.get(path, {}).has_key('NumberOfEvents'):
+        events[lfn] = int(dirmeta[path]['NumberOfEvents'])
+  return events
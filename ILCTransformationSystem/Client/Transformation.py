@@ -1,12 +1,19 @@
 """
-This class is needed to get the Limited plugin support.
+This class is needed to get the Limited and EventBalanced plugins support.
 """
 
 from DIRAC.TransformationSystem.Client.Transformation import Transformation as DT
+from DIRAC import S_OK, S_ERROR
 
 class Transformation(DT):
   def __init__(self, transID = 0, transClient = None):
     super( Transformation, self ).__init__(transID = 0, transClient = None)
-    self.supportedPlugins += ['Limited']
+    self.supportedPlugins += ['Limited', 'EventBalanced']
   def _checkLimitedPlugin( self ):
-    return self._checkStandardPlugin()
\ No newline at end of file
+    return self._checkStandardPlugin()
+  def _checkEventBalancedPlugin( self ):
+    """ The EventBalanced plugin needs the number of events per task, see setEventsPerTask
+    """
+    if int( self.paramValues.get( 'EventsPerTask', 0 ) ) <= 0:
+      return S_ERROR( 'The EventBalanced plugin needs a positive EventsPerTask, use setEventsPerTask' )
+    return S_OK()
\ No newline at end of file
@@ -0,0 +1,126 @@
+'''
+Local state of the L{DataRecoveryAgent}, kept in a SQLite file between the cycles.
+
+For each transformation it holds the time up to which the tasks were looked at, and for each task seen the
+LastUpdateTime, WMS job ID and status it had, and the verdict of its last check: Ignored (the job is not in
+a status to recover), Pending (the job has requests), Unused or Processed (what its files were or would be
+set to, Applied telling if it was done). A task whose LastUpdateTime did not move does not need to be checked
+again, unless its verdict was Pending or not applied.
+
+@since: Oct 18, 2026
+
+@author: agent
+'''
+
+from DIRAC import S_OK, S_ERROR
+import datetime, threading, time
+
+try:
+  import sqlite3
+except ImportError:
+  sqlite3 = None
+
+TIMEFORMAT = '%Y-%m-%d %H:%M:%S'
+
+class DataRecoveryState(object):
+  """ SQLite store of the tasks checked by the DataRecoveryAgent
+  """
+  def __init__(self, path):
+    self.path = path
+    self.lock = threading.Lock()
+    self.connection = sqlite3.connect(path, check_same_thread = False)
+    self.connection.execute("""CREATE TABLE IF NOT EXISTS Transformations (
+                                 TransformationID INTEGER PRIMARY KEY,
+                                 Cutoff TEXT )""")
+    self.connection.execute("""CREATE TABLE IF NOT EXISTS Tasks (
+                                 TransformationID INTEGER,
+                                 TaskID INTEGER,
+                                 LastUpdateTime TEXT,
+                                 ExternalID TEXT,
+                                 ExternalStatus TEXT,
+                                 Verdict TEXT DEFAULT '',
+                                 Applied INTEGER DEFAULT 0,
+                                 CheckTime REAL DEFAULT 0,
+                                 PRIMARY KEY (TransformationID, TaskID) )""")
+    self.connection.commit()
+
+  def _execute(self, query, args = (), many = False):
+    """ Run a query in a transaction, return the rows
+    """
+    self.lock.acquire()
+    try:
+      try:
+        if many:
+          cursor = self.connection.executemany(query, args)
+        else:
+          cursor = self.connection.execute(query, args)
+        rows = cursor.fetchall()
+        self.connection.commit()
+        return S_OK(rows)
+      except sqlite3.Error, x:
+        self.connection.rollback()
+        return S_ERROR('Failed to access %s: %s' % (self.path, str(x)))
+    finally:
+      self.lock.release()
+
+  def getCutoff(self, transformation):
+    """ Time until which the tasks of the transformation were looked at, None if never
+    """
+    res = self._execute("SELECT Cutoff FROM Transformations WHERE TransformationID = ?", (int(transformation),))
+    if not res['OK'] or not res['Value']:
+      return None
+    return datetime.datetime.strptime(res['Value'][0][0], TIMEFORMAT)
+
+  def setCutoff(self, transformation, cutoff):
+    """ Remember that the tasks of the transformation updated before cutoff were looked at
+    """
+    return self._execute("INSERT OR REPLACE INTO Transformations (TransformationID, Cutoff) VALUES (?, ?)",
+                         (int(transformation), cutoff.strftime(TIMEFORMAT)))
+
+  def getTasks(self, transformation):
+    """ Get the stored tasks of the transformation
+
+    @return: dict task ID -> dict of LastUpdateTime, ExternalID, ExternalStatus, Verdict, Applied, CheckTime
+    """
+    res = self._execute("""SELECT TaskID, LastUpdateTime, ExternalID, ExternalStatus, Verdict, Applied, CheckTime
+                           FROM Tasks WHERE TransformationID = ?""", (int(transformation),))
+    tasks = {}
+    if res['OK']:
+      for task, lastupdate, wmsid, wmsstatus, verdict, applied, checktime in res['Value']:
+        tasks[task] = {'LastUpdateTime' : lastupdate, 'ExternalID' : wmsid, 'ExternalStatus' : wmsstatus,
+                       'Verdict' : verdict, 'Applied' : bool(applied), 'CheckTime' : checktime}
+    return tasks
+
+  def updateTasks(self, transformation, tasks):
+    """ Store the new state of tasks, forgetting their verdicts
+
+    @param tasks: dict task ID -> dict of LastUpdateTime, ExternalID, ExternalStatus
+    """
+    if not tasks:
+      return S_OK()
+    return self._execute("""INSERT OR REPLACE INTO Tasks (TransformationID, TaskID, LastUpdateTime, ExternalID,
+                            ExternalStatus, Verdict, Applied, CheckTime) VALUES (?, ?, ?, ?, ?, '', 0, 0)""",
+                         [(int(transformation), int(task), str(info['LastUpdateTime']), str(info['ExternalID']),
+                           info['ExternalStatus']) for task, info in tasks.items()], many = True)
+
+  def setVerdicts(self, transformation, verdicts, applied = False):
+    """ Store the verdicts of the tasks
+
+    @param verdicts: dict task ID -> verdict
+    """
+    if not verdicts:
+      return S_OK()
+    now = time.time()
+    return self._execute("""UPDATE Tasks SET Verdict = ?, Applied = ?, CheckTime = ?
+                            WHERE TransformationID = ? AND TaskID = ?""",
+                         [(verdict, int(applied), now, int(transformation), int(task))
+                          for task, verdict in verdicts.items()], many = True)
+
+  def purge(self, transformations):
+    """ Forget the transformations not in the list
+    """
+    keep = ",".join([str(int(transformation)) for transformation in transformations]) or "-1"
+    res = self._execute("DELETE FROM Tasks WHERE TransformationID NOT IN (%s)" % keep)
+    if not res['OK']:
+      return res
+    return self._execute("DELETE FROM Transformations WHERE TransformationID NOT IN (%s)" % keep)
@@ -7,7 +7,7 @@ API to use to submit jobs in the ILC VO
 """
 from DIRAC.Interfaces.API.Dirac                     import Dirac
 from DIRAC.Core.Utilities.List                      import sortList
-from ILCDIRAC.Core.Utilities.ProcessList            import ProcessList
+from ILCDIRAC.Core.Utilities.ProcessList            import ProcessList, getCachedProcessList
 from DIRAC.DataManagementSystem.Client.ReplicaManager import ReplicaManager
 from DIRAC.ConfigurationSystem.Client.Helpers.Operations            import Operations
 
@@ -35,18 +35,28 @@ class DiracILC(Dirac):
     self.ops = Operations()
     
   def getProcessList(self): 
-    """ Get the L{ProcessList} needed by L{Whizard}.
+    """ Get the L{ProcessList} needed by L{Whizard}. Unless /LocalSite/ProcessListPath is set, the process
+    list is taken from the local cache (/LocalSite/ProcessListCache, by default ~/.dirac/processlist), and only
+    downloaded when the catalog has a new version.
     @return: process list object
     """   
+    if self.pl:
+      return self.pl
     processlistpath = gConfig.getValue("/LocalSite/ProcessListPath", "")
     if not processlistpath:
-      gLogger.info('Will download the process list locally. To gain time, please put it somewhere and add to \
-      your dirac.cfg the entry /LocalSite/ProcessListPath pointing to the file')
       pathtofile = self.ops.getValue("/ProcessList/Location", "")
       if not pathtofile:
         gLogger.error("Could not get path to process list")
         processlist = ""
       else:
+        cachedir = gConfig.getValue("/LocalSite/ProcessListCache", 
+                                    os.path.join(os.path.expanduser("~"), ".dirac", "processlist"))
+        res = getCachedProcessList(pathtofile, cachedir)
+        if res['OK']:
+          self.pl = res['Value']
+          return self.pl
+        gLogger.error("Could not use the process list cache, will download the process list locally:", 
+                      res['Message'])
         rm = ReplicaManager()
         rm.getFile(pathtofile)
         processlist = os.path.basename(pathtofile)   
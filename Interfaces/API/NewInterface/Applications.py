@@ -2360,6 +2360,7 @@ class CheckCollections(Application):
       self.version = 'HEAD'
     self._modulename = "CheckCollections"
     self.appname = 'lcio'
+    self.needsInstallation = False
     self._moduledescription = 'Helper call to define Overlay processor/driver inputs'
 
   def setCollections(self, CollectionList):
@@ -2608,6 +2609,7 @@ class StdHepSplit(Application):
       self.version = 'V2'
     self._modulename = "StdHepSplit"
     self.appname = 'stdhepsplit'
+    self.needsInstallation = False
     self._moduledescription = 'Helper call to split Stdhep files'
 
   def setNumberOfEventsPerFile(self, numberofevents):
@@ -9,6 +9,7 @@ from ILCDIRAC.Interfaces.API.NewInterface.ProductionJob import ProductionJob
 from DIRAC.Core.Workflow.Module import ModuleDefinition
 from DIRAC.Core.Workflow.Step import StepDefinition
 from DIRAC import S_OK, S_ERROR
+from ILCDIRAC.Core.Utilities.InputFilesUtilities import getDirectoryMetadata, getFileUserMetadata
 
 import types,string
 from decimal import Decimal
@@ -57,12 +58,11 @@ class ILDProductionJob(ProductionJob):
     elif len(res['Value']) < 1:
       return self._reportError('Could not find any directory corresponding to the query issued')
     dirs = res['Value'].values()
-    for mdir in dirs:
-      res = self.fc.getDirectoryMetadata(mdir)
-      if not res['OK']:
-        return self._reportError("Error looking up the catalog for directory metadata")
-      compatmeta = res['Value']
-      compatmeta.update(metadata)
+    dirmeta = getDirectoryMetadata(dirs)
+    if len(dirmeta) < len(dirs):
+      return self._reportError("Error looking up the catalog for directory metadata")
+    compatmeta = dirmeta[dirs[-1]]
+    compatmeta.update(metadata)
     
     #get all the files available, if any
     res = self.fc.findFilesByMetadata(metadata, '/ilc/prod/ilc')
@@ -72,10 +72,10 @@ class ILDProductionJob(ProductionJob):
       my_lfn= res['Value'][0]
       ##Get the meta data of the first one as it should be enough is the registration was 
       ## done right
-      res = self.fc.getFileUserMetadata(my_lfn)
-      if not res['OK']:
+      filemeta = getFileUserMetadata([my_lfn])
+      if not my_lfn in filemeta:
         return self._reportError('Failed to get file metadata, cannot build filename')
-      compatmeta.update(res['Value'])
+      compatmeta.update(filemeta[my_lfn])
     
     self.log.verbose("Using %s to build path" % str(compatmeta))
     if compatmeta.has_key('EvtClass'):
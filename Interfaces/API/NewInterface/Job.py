@@ -186,7 +186,7 @@ class Job(DiracJob):
       self._addParameter(self.workflow, 'NbOfEvts', 'int', application.nbevts, "Number of events to process")
   
     ##Finally, add the software packages if needed
-    if application.appname and application.version:
+    if application.appname and application.version and application.needsInstallation:
       self._addSoftware(application.appname, application.version)
       
     return S_OK()
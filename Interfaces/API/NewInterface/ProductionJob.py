@@ -19,6 +19,7 @@ from DIRAC.Core.DISET.RPCClient                             import RPCClient
 from DIRAC.Resources.Catalog.FileCatalogClient              import FileCatalogClient
 from DIRAC.Core.Security.ProxyInfo                          import getProxyInfo
 from DIRAC.ConfigurationSystem.Client.Helpers.Operations    import Operations
+from ILCDIRAC.Core.Utilities.InputFilesUtilities            import getDirectoryMetadata
 
 from math                                                   import modf
 
@@ -216,15 +217,11 @@ class ProductionJob(Job):
     elif len(res['Value']) < 1:
       return self._reportError('Could not find any directories corresponding to the query issued')
     dirs = res['Value'].values()
-    for mdir in dirs:
-      res = self.fc.getDirectoryMetadata(mdir)
-      if not res['OK']:
-        return self._reportError("Error looking up the catalog for directory metadata")
-    #res =   client.getCompatibleMetadata(metadata)
-    #if not res['OK']:
-    #  return self._reportError("Error looking up the catalog for compatible metadata")
-      compatmeta = res['Value']
-      compatmeta.update(metadata)
+    dirmeta = getDirectoryMetadata(dirs)
+    if len(dirmeta) < len(dirs):
+      return self._reportError("Error looking up the catalog for directory metadata")
+    compatmeta = dirmeta[dirs[-1]]
+    compatmeta.update(metadata)
     if compatmeta.has_key('EvtType'):
       if type(compatmeta['EvtType']) in types.StringTypes:
         self.evttype  = compatmeta['EvtType']
@@ -10,6 +10,7 @@ from DIRAC.Resources.Catalog.FileCatalogClient import FileCatalogClient
 from DIRAC.Core.Workflow.Module import ModuleDefinition
 from DIRAC.Core.Workflow.Step import StepDefinition
 from DIRAC import S_OK, S_ERROR
+from ILCDIRAC.Core.Utilities.InputFilesUtilities import getDirectoryMetadata
 
 import types,string
 from decimal import Decimal
@@ -48,12 +49,11 @@ class SIDProductionJob(ProductionJob):
     elif len(res['Value']) < 1:
       return self._reportError('Could not find any directory corresponding to the query issued')
     dirs = res['Value'].values()
-    for mdir in dirs:
-      res = self.fc.getDirectoryMetadata(mdir)
-      if not res['OK']:
-        return self._reportError("Error looking up the catalog for directory metadata")
-      compatmeta = res['Value']
-      compatmeta.update(metadata)
+    dirmeta = getDirectoryMetadata(dirs)
+    if len(dirmeta) < len(dirs):
+      return self._reportError("Error looking up the catalog for directory metadata")
+    compatmeta = dirmeta[dirs[-1]]
+    compatmeta.update(metadata)
       
     if compatmeta.has_key('EvtType'):
       if type(compatmeta['EvtType']) in types.StringTypes:
@@ -32,48 +32,6 @@ def getFileInfo(lfn):
     nbevts += int(res['Value']['NumberOfEvents'])
   return (float(lumi),int(nbevts),addinfo)
 
-def translate(detail):
-  """ Replace whizard naming convention by human conventions
-  """
-  detail = detail.replace('v','n1:n2:n3:N1:N2:N3')
-  detail = detail.replace('qli','u:d:s:U:D:S')
-  detail = detail.replace('ql','u:d:s:c:b:U:D:S:C:B')
-  detail = detail.replace('q','u:d:s:c:b:t')
-  detail = detail.replace('Q','U:D:S:C:B:T')
-  detail = detail.replace('e1','e-')
-  detail = detail.replace('E1','e+')
-  detail = detail.replace('e2','mu-')
-  detail = detail.replace('E2','mu+')
-  detail = detail.replace('e3','tau-')
-  detail = detail.replace('E3','tau+')
-  detail = detail.replace('n1','nue')
-  detail = detail.replace('N1','nueb')
-  detail = detail.replace('n2','numu')
-  detail = detail.replace('N2','numub')
-  detail = detail.replace('n3','nutau')
-  detail = detail.replace('N3','nutaub')
-  detail = detail.replace('U','ubar')
-  detail = detail.replace('C','cbar')
-  detail = detail.replace('T','tbar')
-  detail = detail.replace('tbareV','TeV')
-  detail = detail.replace('D','dbar')
-  detail = detail.replace('S','sbar')
-  detail = detail.replace('B','bbar')
-  detail = detail.replace('Z0','Z')
-  detail = detail.replace('Z','Z0')
-  detail = detail.replace('gghad','gamma gamma -> hadrons')
-  detail = detail.replace(',','')
-  detail = detail.replace('n N','nu nub')
-  detail = detail.replace('se--','seL-')
-  detail = detail.replace('se-+','seL+')
-  detail = detail.replace(' -> ','->')
-  detail = detail.replace('->',' -> ')
-  detail = detail.replace(' H ->',', H ->')
-  detail = detail.replace(' Z0 ->',', Z0 ->')
-  detail = detail.replace(' W ->',', W ->')
-  
-  return detail
-
 #def getAncestor(lfn):
 #  from DIRAC.Resources.Catalog.FileCatalogClient import FileCatalogClient
 #  fc = FileCatalogClient()
@@ -165,6 +123,7 @@ if __name__=="__main__":
   Script.parseCommandLine()
   from ILCDIRAC.Core.Utilities.HTML                             import Table
   from ILCDIRAC.Core.Utilities.ProcessList                      import ProcessList
+  from ILCDIRAC.ProcessProductionSystem.Utilities.ProductionSummary import translate
   from DIRAC.TransformationSystem.Client.TransformationClient   import TransformationClient
   from DIRAC.Resources.Catalog.FileCatalogClient import FileCatalogClient
   from DIRAC import gConfig, gLogger
@@ -9,6 +9,9 @@ __RCSID__ = " $Id: $ "
 from DIRAC                                                             import gLogger, S_OK, S_ERROR
 from DIRAC.Core.Base.DB                                                import DB
 from DIRAC.ConfigurationSystem.Client.Helpers.Operations            import Operations
+from DIRAC.Core.Utilities.ThreadScheduler                              import gThreadScheduler
+
+import threading, time
 
 class OverlayDB ( DB ):
   def __init__( self, maxQueueSize = 10 ):
@@ -23,20 +26,73 @@ class OverlayDB ( DB ):
                                                        },
                                              'PrimaryKey' : 'Site',
                                              'Indexes': {'Index':['Site']}
-                                           }
+                                           },
+                          "OverlayLeases" : { 'Fields' : { 'LeaseID' : "INTEGER UNSIGNED AUTO_INCREMENT NOT NULL",
+                                                           'Site' : "VARCHAR(256) NOT NULL",
+                                                           'Expiration' : "DATETIME NOT NULL"
+                                                         },
+                                              'PrimaryKey' : 'LeaseID',
+                                              'Indexes': {'Site' : ['Site'], 'Expiration' : ['Expiration']}
+                                            }
                         }
                       )
-    limits = self.ops.getValue("/Overlay/MaxConcurrentRunning", 200)
     self.limits = {}
-    self.limits["default"] = limits
+    self.downloadRates = {}
+    #One condition per site protects the admission queue of the site, the lock protects the dict
+    self.queueConditions = {}
+    #Incremented at each notification: site -> int, tells the waiters that were doing DB calls to try again
+    self.queueGenerations = {}
+    self.queueConditionsLock = threading.Lock()
+    self.loadLimits()
+    #Refresh the limits from time to time, so that they can be changed without restarting the service
+    gThreadScheduler.addPeriodicTask(self.ops.getValue("/Overlay/LimitsRefreshTime", 300), self.loadLimits)
+    #Token buckets used to pace the overlay downloads: site -> [tokens, last refill time]
+    self.buckets = {}
+    self.bucketLock = threading.Lock()
+    #Admission queues: site -> list of [jobID, last time the job was seen, time it entered the queue]
+    #Each queue is protected by the condition of its site
+    self.queues = {}
+    #Used to estimate the waiting time: lease -> time it was granted, site -> mean time a slot is held
+    self.leaseStart = {}
+    self.meanHoldTime = {}
+    #Statistics: site -> {'Grants': slots given, 'QueuedGrants': slots given through the queue, 
+    #                      'TotalWait': total waiting time of the latter}
+    self.statistics = {}
+    self.statisticsStart = time.time()
+
+  def loadLimits(self):
+    """ Get the limits from the Operations section. Called at startup and periodically, the values are 
+    replaced in one go so that the service does not need to lock them.
+    """
+    defaultlimit = self.ops.getValue("/Overlay/MaxConcurrentRunning", 200)
+    defaultrate = self.ops.getValue("/Overlay/DownloadRate", 0.2)
+    defaultburst = self.ops.getValue("/Overlay/DownloadBurst", 10)
+    limits = {"default" : defaultlimit}
+    downloadRates = {"default" : (float(defaultrate), float(defaultburst))}
     res = self.ops.getSections("/Overlay/Sites/")
     sites = []
     if res['OK']:
       sites = res['Value']
     for tempsite in sites:
-      res = self.ops.getValue("/Overlay/Sites/%s/MaxConcurrentRunning" % tempsite, 200)
-      self.limits[tempsite] = res
-    self.logger.info("Using the following restrictions : %s" % self.limits)
+      limits[tempsite] = self.ops.getValue("/Overlay/Sites/%s/MaxConcurrentRunning" % tempsite, 200)
+      downloadRates[tempsite] = (float(self.ops.getValue("/Overlay/Sites/%s/DownloadRate" % tempsite, defaultrate)),
+                                 float(self.ops.getValue("/Overlay/Sites/%s/DownloadBurst" % tempsite, defaultburst)))
+    changed = limits != self.limits
+    self.limits = limits
+    self.downloadRates = downloadRates
+    self.maxWait = self.ops.getValue("/Overlay/MaxSlotWait", 600)
+    #The jobs renew their lease while they download, so that the slot of a crashed job is soon freed
+    self.leaseDuration = self.ops.getValue("/Overlay/LeaseDuration", self.maxWait)
+    #Only the first jobs of the queues are kept waiting in the service, not to use all its threads
+    self.maxBlockedWaits = self.ops.getValue("/Overlay/MaxBlockedWaits", 5)
+    #A job of the queue that did not ask for its slot for that long is dropped: it died or gave up
+    self.queueIdleTime = self.ops.getValue("/Overlay/QueueIdleTime", 120)
+    if changed:
+      self.logger.info("Using the following restrictions : %s" % limits)
+      #Limits may have been raised: let the waiting jobs try again
+      for site in self.queueConditions.keys():
+        self._notifyWaiters(site)
+    return S_OK()
 
   #####################################################################
   # Private methods
@@ -65,30 +121,68 @@ class OverlayDB ( DB ):
       return S_ERROR("Could not find any site %s"%(site))
     
   def _addSite(self, site, connection = False ):
-    """ Add a new site to the DB
+    """ Add a new site to the DB, if it's not there yet
     """ 
     connection = self.__getConnection( connection )
-    req = "INSERT INTO OverlayData (Site,NumberOfJobs) VALUES ('%s',1);" % site
+    req = "INSERT IGNORE INTO OverlayData (Site,NumberOfJobs) VALUES ('%s',0);" % site
+    return self._update( req, connection )
+
+  def _limitForSite(self, site):
+    """ Get the current limit of jobs for a given site.
+    """
+    limits = self.limits
+    return limits.get(site, limits['default'])
+
+  def _takeSlot(self, site, connection = False ):
+    """ Increment the number of jobs at the site if it's below the limit, in one statement.
+    @return: S_OK(bool) True if a slot was taken
+    """
+    connection = self.__getConnection( connection )
+    req = "UPDATE OverlayData SET NumberOfJobs=NumberOfJobs+1 WHERE Site='%s' AND NumberOfJobs<%s;" % (site, 
+                                                                                                  int(self._limitForSite(site)))
     res = self._update( req, connection )
     if not res['OK']:
       return res
-    return res
+    return S_OK(res['Value'] == 1)
 
-  def _limitForSite(self, site):
-    """ Get the current limit of jobs for a given site.
+  def _releaseSlot(self, site, connection = False ):
+    """ Decrement the number of jobs at the site, in one statement.
+    """
+    connection = self.__getConnection( connection )
+    req = "UPDATE OverlayData SET NumberOfJobs=NumberOfJobs-1 WHERE Site='%s' AND NumberOfJobs>0;" % (site)
+    return self._update( req, connection )
+
+  def _deleteLease(self, req, site, connection = False ):
+    """ Delete a lease with the given request, and free the slot only if the lease was really deleted:
+    this is what makes concurrent jobDone and expirations safe.
     """
-    if site in self.limits.keys():
-      return self.limits[site]   
-    return self.limits['default']
+    res = self._update( req, connection )
+    if not res['OK']:
+      return res
+    if res['Value'] != 1:
+      return S_OK(False)
+    res = self._releaseSlot(site, connection)
+    if not res['OK']:
+      return res
+    return S_OK(True)
 
-  def _addNewJob(self, site, nbjobs, connection = False ):
-    """ Add a new running job in the DB
+  def _expireLeases(self, connection = False ):
+    """ Free the slots of the leases that expired: the jobs that crashed never called jobDone
     """
     connection = self.__getConnection( connection )
-    nbjobs += 1  
-    req = "UPDATE OverlayData SET NumberOfJobs=%s WHERE Site='%s';" % (nbjobs, site)
-    self._update( req, connection )
-    return S_OK()
+    req = "SELECT LeaseID, Site FROM OverlayLeases WHERE Expiration < UTC_TIMESTAMP();"
+    res = self._query( req, connection )
+    if not res['OK']:
+      return res
+    nbexpired = 0
+    for leaseid, site in res['Value']:
+      res = self._deleteLease("DELETE FROM OverlayLeases WHERE LeaseID=%s;" % leaseid, site, connection)
+      if res['OK'] and res['Value']:
+        nbexpired += 1
+        self.leaseStart.pop(leaseid, None)
+    if nbexpired:
+      self.logger.info("Freed %s expired slots" % nbexpired)
+    return S_OK(nbexpired)
 
 ### Methods to fix the site
   def getSites(self, connection = False):
@@ -115,6 +209,20 @@ class OverlayDB ( DB ):
         return S_ERROR("Could not set nb of jobs at site %s" % site)
       
     return S_OK()
+  def resyncCounters(self, connection = False):
+    """ Free the expired leases, and set the number of jobs at each site to the number of valid leases.
+    Called from the ResetCounters agent.
+    """
+    connection = self.__getConnection( connection )
+    res = self._expireLeases(connection)
+    if not res['OK']:
+      return res
+    req = "UPDATE OverlayData SET NumberOfJobs=(SELECT COUNT(*) FROM OverlayLeases WHERE OverlayLeases.Site=OverlayData.Site);"
+    res = self._update( req, connection )
+    if not res['OK']:
+      return S_ERROR("Could not reset the number of jobs: %s" % res['Message'])
+    return S_OK()
+
 ### Useful methods for the users
   
   def getJobsAtSite(self, site, connection = False ):
@@ -131,39 +239,241 @@ class OverlayDB ( DB ):
 ### Important methods
   
   def canRun(self, site, connection = False ):
-    """ Can the job run at that site?
+    """ Can the job run at that site? If so, a slot is taken, and held by a lease that expires
+    after LeaseDuration seconds unless it is renewed with renewLease or freed with jobDone.
+    
+    @return: S_OK(LeaseID) if the job can run, S_OK(False) otherwise
     """
     connection = self.__getConnection( connection )
-    res = self._checkSite(site, connection)
-    nbjobs = 0
+    res = self._addSite(site, connection)
     if not res['OK']:
-      self._addSite(site, connection)
-      nbjobs = 1
-    else:
-      nbjobs = res['Value'][0][0]
-    if nbjobs < self._limitForSite(site):
-      res = self._addNewJob(site, nbjobs, connection)
-      if not res['OK']:
-        return res
-      return S_OK(True)
-    else:
+      return res
+    self._expireLeases(connection)
+    res = self._takeSlot(site, connection)
+    if not res['OK']:
+      return res
+    if not res['Value']:
       return S_OK(False)
+    req = "INSERT INTO OverlayLeases (Site,Expiration) VALUES ('%s',UTC_TIMESTAMP() + INTERVAL %s SECOND);" % (site, 
+                                                                                                            int(self.leaseDuration))
+    res = self._update( req, connection )
+    if not res['OK']:
+      self._releaseSlot(site, connection)
+      return res
+    self.leaseStart[res['lastRowId']] = time.time()
+    self._siteStatistics(site)['Grants'] += 1
+    return S_OK(res['lastRowId'])
   
-  def jobDone(self, site, connection = False ):
-    """ Remove a job from the DB, should not remove a job from the DB 
-        if the Site does not exist, but this should never happen
+  def renewLease(self, site, leaseID, connection = False ):
+    """ Push the expiration of the lease LeaseDuration seconds from now, called while the job downloads
+    @return: S_OK(LeaseDuration), so that the job knows when to renew it again
     """
     connection = self.__getConnection( connection )
-    res = self._checkSite(site, connection)
+    req = "UPDATE OverlayLeases SET Expiration=UTC_TIMESTAMP() + INTERVAL %s SECOND WHERE LeaseID=%s AND Site='%s';" % \
+          (int(self.leaseDuration), int(leaseID), site)
+    res = self._update( req, connection )
     if not res['OK']:
       return res
-    nbjobs = res['Value'][0][0]
-    if nbjobs == 1:
-      return S_OK()
-    nbjobs -= 1
-    req = "UPDATE OverlayData SET NumberOfJobs=%s WHERE Site='%s';" % (nbjobs, site)
-    res = self._update( req, connection )
+    return S_OK(self.leaseDuration)
+
+  def jobDone(self, site, leaseID = 0, connection = False ):
+    """ Free the slot held by the lease. Nothing is done if the lease already expired.
+    A lease must be given: the slots of the older clients are freed when their lease expires.
+    """
+    if not leaseID:
+      return S_ERROR("No lease given, the slot at %s will be freed when its lease expires" % site)
+    connection = self.__getConnection( connection )
+    req = "DELETE FROM OverlayLeases WHERE LeaseID=%s AND Site='%s';" % (int(leaseID), site)
+    res = self._deleteLease(req, site, connection)
+    if not res['OK']:
+      return res
+    if leaseID in self.leaseStart:
+      holdtime = time.time() - self.leaseStart.pop(leaseID)
+      self.meanHoldTime[site] = 0.9 * self.meanHoldTime.get(site, holdtime) + 0.1 * holdtime
+    if res['Value']:
+      self._notifyWaiters(site)
+    return S_OK()
+
+  def _siteStatistics(self, site):
+    """ Get the statistics counters of a site
+    """
+    return self.statistics.setdefault(site, {'Grants' : 0, 'QueuedGrants' : 0, 'TotalWait' : 0.})
+
+  def getStatistics(self):
+    """ Get the throughput of each site since the service started: number of slots given per second, 
+    mean waiting time in the queue, mean time a slot is held, current limit and queue length.
+    """
+    elapsed = max(time.time() - self.statisticsStart, 1.)
+    result = {}
+    for site, stats in self.statistics.items():
+      meanwait = 0.
+      if stats['QueuedGrants']:
+        meanwait = stats['TotalWait'] / stats['QueuedGrants']
+      result[site] = {'Grants' : stats['Grants'],
+                      'GrantsPerSecond' : stats['Grants'] / elapsed,
+                      'MeanWait' : meanwait,
+                      'MeanHoldTime' : self.meanHoldTime.get(site, 0.),
+                      'Limit' : self._limitForSite(site),
+                      'Queued' : len(self.queues.get(site, []))}
+    return S_OK(result)
+
+  def _queueCondition(self, site):
+    """ Get the condition protecting the queue of the site
+    """
+    self.queueConditionsLock.acquire()
+    try:
+      if not self.queueConditions.has_key(site):
+        self.queueConditions[site] = threading.Condition()
+      return self.queueConditions[site]
+    finally:
+      self.queueConditionsLock.release()
+
+  def _notifyWaiters(self, site):
+    """ Wake up the jobs waiting for a slot at the site
+    """
+    condition = self._queueCondition(site)
+    condition.acquire()
+    try:
+      self.queueGenerations[site] = self.queueGenerations.get(site, 0) + 1
+      condition.notifyAll()
+    finally:
+      condition.release()
+
+  def _cleanQueue(self, site):
+    """ Drop from the queue of the site the jobs that did not ask for their slot for QueueIdleTime seconds: 
+    they died or gave up. Must be called with the condition of the site held.
+    """
+    limit = time.time() - self.queueIdleTime
+    queue = self.queues.setdefault(site, [])
+    queue[:] = [entry for entry in queue if entry[1] > limit]
+    return queue
+
+  def _queuePosition(self, site, jobID):
+    """ Put the job in the queue of the site if it's not there yet, and mark it as seen.
+    Must be called with the condition of the site held.
+    @return: position in the queue, starting at 1
+    """
+    queue = self._cleanQueue(site)
+    for index, entry in enumerate(queue):
+      if entry[0] == jobID:
+        entry[1] = time.time()
+        return index + 1
+    queue.append([jobID, time.time(), time.time()])
+    return len(queue)
+
+  def _leaveQueue(self, site, jobID):
+    """ Remove the job from the queue of the site. Must be called with the condition of the site held.
+    @return: the time the job entered the queue, None if it was not there
+    """
+    queue = self.queues.setdefault(site, [])
+    for index, entry in enumerate(queue):
+      if entry[0] == jobID:
+        del queue[index]
+        return entry[2]
+    return None
+
+  def _freeSlots(self, site, connection = False ):
+    """ Number of slots that can be given at the site, after freeing the expired leases
+    """
+    connection = self.__getConnection( connection )
+    self._expireLeases(connection)
+    res = self.getJobsAtSite(site, connection)
     if not res['OK']:
-      return res   
-    return S_OK()    
-  
\ No newline at end of file
+      return res
+    return S_OK(max(int(self._limitForSite(site)) - int(res['Value']), 0))
+
+  def _queueStatus(self, site, position):
+    """ Position in the queue and estimated waiting time in seconds
+    """
+    estimate = position * self.meanHoldTime.get(site, 60.) / max(self._limitForSite(site), 1)
+    return {'LeaseID' : 0, 'Position' : position, 'EstimatedWait' : int(estimate)}
+
+  def requestSlot(self, site, jobID):
+    """ Put the job in the FIFO of the site.
+    @return: S_OK(dict) with the Position in the queue and the EstimatedWait in seconds
+    """
+    condition = self._queueCondition(site)
+    condition.acquire()
+    try:
+      position = self._queuePosition(site, jobID)
+    finally:
+      condition.release()
+    return S_OK(self._queueStatus(site, position))
+
+  def waitForSlot(self, site, jobID, timeout):
+    """ Wait at most timeout seconds for the job to get a slot at the site. When N slots are free, the 
+    first N jobs of the queue take them, so the slots are given in the order they were requested. The jobs
+    too far in the queue get their position back immediately. The condition of the site is not held 
+    during the DB calls.
+    @return: S_OK(dict) with the LeaseID (0 if no slot was given before the timeout), the Position in 
+    the queue and the EstimatedWait in seconds
+    """
+    deadline = time.time() + min(timeout, self.maxWait)
+    condition = self._queueCondition(site)
+    while True:
+      res = self._freeSlots(site)
+      if not res['OK']:
+        return res
+      freeslots = res['Value']
+      condition.acquire()
+      try:
+        position = self._queuePosition(site, jobID)
+        generation = self.queueGenerations.get(site, 0)
+      finally:
+        condition.release()
+      if position <= freeslots:
+        res = self.canRun(site)
+        if not res['OK']:
+          return res
+        if res['Value']:
+          condition.acquire()
+          try:
+            entered = self._leaveQueue(site, jobID)
+          finally:
+            condition.release()
+          self._notifyWaiters(site)
+          if entered:
+            stats = self._siteStatistics(site)
+            stats['QueuedGrants'] += 1
+            stats['TotalWait'] += time.time() - entered
+          return S_OK({'LeaseID' : res['Value'], 'Position' : 0, 'EstimatedWait' : 0})
+      remaining = deadline - time.time()
+      if remaining <= 0 or position > self.maxBlockedWaits:
+        return S_OK(self._queueStatus(site, position))
+      ##Wake up from time to time anyway, as leases can expire, and to stay in the queue
+      condition.acquire()
+      try:
+        if generation == self.queueGenerations.get(site, 0):
+          condition.wait(min(remaining, 30, self.queueIdleTime / 2.))
+      finally:
+        condition.release()
+
+  def _downloadRateForSite(self, site):
+    """ Get the download rate (files per second) and the burst size allowed for a given site.
+    """
+    downloadRates = self.downloadRates
+    return downloadRates.get(site, downloadRates['default'])
+
+  def getDownloadTokens(self, site, nbtokens):
+    """ Hand out up to nbtokens download tokens for the given site, taken from a token bucket 
+    that refills at DownloadRate files per second, up to DownloadBurst tokens.
+    
+    @return: S_OK({'Granted' : number of tokens given, 'RetryAfter' : seconds to wait before the next token})
+    """
+    rate, burst = self._downloadRateForSite(site)
+    if rate <= 0:
+      return S_OK({'Granted' : nbtokens, 'RetryAfter' : 0})
+    self.bucketLock.acquire()
+    try:
+      now = time.time()
+      tokens, lastrefill = self.buckets.get(site, [burst, now])
+      tokens = min(burst, tokens + (now - lastrefill) * rate)
+      granted = min(int(nbtokens), int(tokens))
+      tokens -= granted
+      self.buckets[site] = [tokens, now]
+    finally:
+      self.bucketLock.release()
+    retryafter = 0
+    if granted < nbtokens:
+      retryafter = (1. - (tokens - int(tokens))) / rate
+    return S_OK({'Granted' : granted, 'RetryAfter' : retryafter})
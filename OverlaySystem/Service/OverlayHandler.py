@@ -10,7 +10,7 @@ from DIRAC                                              import S_OK
 from DIRAC.Core.DISET.RequestHandler                    import RequestHandler
 
 from ILCDIRAC.OverlaySystem.DB.OverlayDB                import OverlayDB
-from types import StringTypes, DictType
+from types import StringTypes, DictType, IntType, LongType
 
 
 # This is a global instance of the OverlayDB class
@@ -28,16 +28,38 @@ class OverlayHandler(RequestHandler):
   """
   types_canRun = [StringTypes]
   def export_canRun(self, site):
-    """ Check if current job can access the data
+    """ Check if current job can access the data. Returns the ID of the lease 
+    held by the job, to be given to jobDone, or False
     """
     return overlayDB.canRun(site)
 
   types_jobDone = [StringTypes]
-  def export_jobDone(self, site):
+  def export_jobDone(self, site, leaseID = 0):
     """ report that a given job is done downloading the 
     files at a given site
     """
-    return overlayDB.jobDone(site)
+    return overlayDB.jobDone(site, leaseID)
+
+  types_renewLease = [StringTypes, [IntType, LongType]]
+  def export_renewLease(self, site, leaseID):
+    """ Keep the slot given by canRun or waitForSlot while the files are downloaded.
+    Returns the number of seconds before the lease expires again
+    """
+    return overlayDB.renewLease(site, leaseID)
+  
+  types_requestSlot = [StringTypes, StringTypes]
+  def export_requestSlot(self, site, jobID):
+    """ Put the job in the queue of jobs waiting to get the files at the site. 
+    Returns the position in the queue and the estimated waiting time
+    """
+    return overlayDB.requestSlot(site, jobID)
+
+  types_waitForSlot = [StringTypes, StringTypes, IntType]
+  def export_waitForSlot(self, site, jobID, timeout):
+    """ Wait at most timeout seconds for a slot at the site. Returns the lease
+    ID, to be given to jobDone, or 0 with the position in the queue
+    """
+    return overlayDB.waitForSlot(site, jobID, timeout)
   
   types_getJobsAtSite =  [StringTypes]
   def export_getJobsAtSite(self, site):
@@ -45,6 +67,13 @@ class OverlayHandler(RequestHandler):
     """
     return overlayDB.getJobsAtSite(site)
   
+  types_getStatistics = []
+  def export_getStatistics(self):
+    """ Get the number of slots given per second, the mean waiting time 
+    and the limit of each site, to tune the limits
+    """
+    return overlayDB.getStatistics()
+
   types_getSites = []
   def export_getSites(self):
     """ Get all sites registered
@@ -57,4 +86,16 @@ class OverlayHandler(RequestHandler):
     called from the ResetCounter agent
     """
     return overlayDB.setJobsAtSites(sitedict)
-  
\ No newline at end of file
+
+  types_resyncCounters = []
+  def export_resyncCounters(self):
+    """ Free the expired leases and set the number of jobs at each site
+    from the valid leases: called from the ResetCounter agent
+    """
+    return overlayDB.resyncCounters()
+
+  types_getDownloadTokens = [StringTypes, IntType]
+  def export_getDownloadTokens(self, site, nbtokens):
+    """ Get up to nbtokens tokens allowing to download overlay files at the given site
+    """
+    return overlayDB.getDownloadTokens(site, nbtokens)
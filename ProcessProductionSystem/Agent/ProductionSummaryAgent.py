@@ -2,7 +2,11 @@
 # $HeadURL: $
 #####################################################################
 '''
-Production Summary agent: writes out every day the production status 
+Production Summary agent: writes out every day the production status
+
+The summary of each production is kept in a L{ProductionSummary} between the cycles: only the productions
+whose number of files changed are looked at again, their files meta data being obtained concurrently. The
+tables (tables.html, tables.csv, tables.json) are then written from the summary.
 
 Created on Apr 8, 2011
 
@@ -10,10 +14,17 @@ Created on Apr 8, 2011
 '''
 __RCSID__ = "$ Id: $"
 
-from DIRAC                                                                import S_OK, gMonitor
+from DIRAC                                                                import S_OK, S_ERROR, gMonitor
 from DIRAC.Core.Base.AgentModule                                          import AgentModule
+from DIRAC.ConfigurationSystem.Client.Helpers.Operations                  import Operations
+from DIRAC.DataManagementSystem.Client.ReplicaManager                     import ReplicaManager
 from DIRAC.TransformationSystem.Client.TransformationClient               import TransformationClient
 from DIRAC.Resources.Catalog.FileCatalogClient                            import FileCatalogClient
+from DIRAC.Core.Utilities                                                 import DEncode
+from ILCDIRAC.Core.Utilities.ProcessList                                  import ProcessList
+from ILCDIRAC.Core.Utilities.ThreadedMap                                  import threadedMap
+from ILCDIRAC.ProcessProductionSystem.Utilities.ProductionSummary         import ProductionSummary, DATATYPES, translate
+import ast, os, time
 
 AGENT_NAME = 'Transformation/ProductionSummaryAgent'
 
@@ -25,8 +36,143 @@ class ProductionSummaryAgent( AgentModule ):
     gMonitor.registerActivity("Iteration", "Agent Loops", AGENT_NAME, "Loops/min", gMonitor.OP_SUM)
     self.transClient = TransformationClient('TransformationDB')
     self.fc = FileCatalogClient()
+    self.ops = Operations()
+    self.prodTypes = self.am_getOption('ProductionTypes', DATATYPES.keys())
+    self.prodStatuses = self.am_getOption('ProductionStatuses', ['Active', 'Stopped', 'Completed', 'Archived'])
+    self.maxParallelProductions = self.am_getOption('MaxParallelProductions', 4)
+    self.maxParallelQueries = self.am_getOption('MaxParallelQueries', 10)
+    self.outputDirectory = self.am_getOption('OutputDirectory', self.am_getWorkDirectory())
+    self.summary = ProductionSummary(self.am_getOption('SummaryFile', os.path.join(self.am_getWorkDirectory(),
+                                                                                   'ProductionSummary.json')))
     return S_OK()
 
   ##############################################################################
   def execute(self):
-    return S_OK()
\ No newline at end of file
+    """ Update the summary of the productions whose number of files changed, and write the tables
+    """
+    gMonitor.addMark('Iteration', 1)
+    res = self.transClient.getTransformations({'Status' : self.prodStatuses, 'Type' : self.prodTypes})
+    if not res['OK']:
+      self.log.error("Failed to get the productions:", res['Message'])
+      return res
+    productions = res['Value']
+    processes = self.getProcessesDict()
+
+    start = time.time()
+    results = threadedMap(lambda prod: self.updateProduction(prod, processes), productions,
+                          self.maxParallelProductions)
+    updated = 0
+    for prod, res in zip(productions, results):
+      if not res['OK']:
+        self.log.error("Failed to update the summary of production %s:" % prod['TransformationID'], res['Message'])
+      elif res['Value']:
+        updated += 1
+    self.log.info("Updated %s of %s productions in %.1f s" % (updated, len(productions), time.time() - start))
+
+    self.summary.purge([prod['TransformationID'] for prod in productions])
+    res = self.summary.save()
+    if not res['OK']:
+      self.log.error("Failed to save the summary:", res['Message'])
+
+    start = time.time()
+    res = self.summary.writeTables(self.outputDirectory)
+    if not res['OK']:
+      self.log.error("Failed to write the tables:", res['Message'])
+      return res
+    self.log.info("Wrote the tables in %s in %.3f s" % (self.outputDirectory, time.time() - start))
+    return S_OK()
+
+  def getProcessesDict(self):
+    """ The processes known to whizard, to describe the event types
+    """
+    path = self.ops.getValue("/ProcessList/Location", "")
+    if not path:
+      self.log.warn("No process list location defined, the event types will not be detailed")
+      return {}
+    res = ReplicaManager().getFile(path, destinationDir = self.am_getWorkDirectory())
+    if not res['OK'] or not res['Value']['Successful'].has_key(path):
+      self.log.warn("Failed to get the process list, the event types will not be detailed")
+      return {}
+    processlist = ProcessList(os.path.join(self.am_getWorkDirectory(), os.path.basename(path)))
+    if not processlist.isOK():
+      return {}
+    return processlist.getProcessesDict()
+
+  def updateProduction(self, prod, processes):
+    """ Update the summary of the production if its number of files changed
+
+    @param prod: the production, as given by getTransformations
+    @return: S_OK(True) if it was updated
+    """
+    prodID = int(prod['TransformationID'])
+    datatype = DATATYPES.get(prod['Type'])
+    if not datatype:
+      return S_OK(False)
+    res = self.fc.findFilesByMetadata({'ProdID' : prodID, 'Datatype' : datatype})
+    if not res['OK']:
+      return res
+    lfns = res['Value']
+    entry = self.summary.get(prodID)
+    if not lfns or (entry and entry['Files'] == len(lfns)):
+      return S_OK(False)
+
+    path = os.path.dirname(lfns[0])
+    res = self.fc.getDirectoryMetadata(path)
+    if not res['OK']:
+      return S_ERROR('No meta data found for %s: %s' % (path, res['Message']))
+    dirmeta = res['Value']
+    evttype = dirmeta.get('EvtType', '')
+    detail = evttype
+    if processes.has_key(evttype) and processes[evttype].has_key('Detail'):
+      detail = processes[evttype]['Detail']
+    entry = {'Type' : prod['Type'], 'Description' : str(prod.get('Description', '')), 'Files' : len(lfns),
+             'EvtType' : evttype, 'Energy' : dirmeta.get('Energy', ''), 'Detail' : translate(detail),
+             'DetectorType' : dirmeta.get('DetectorType', ''), 'MomProdID' : 0}
+    if prod['Type'] != 'MCGeneration':
+      res = self.transClient.getTransformationInputDataQuery(str(prodID))
+      if res['OK'] and res['Value'].has_key('ProdID'):
+        entry['MomProdID'] = int(res['Value']['ProdID'])
+
+    nbevts = 0
+    lumi = 0.
+    xsec = 0.
+    xsecfiles = 0
+    results = threadedMap(self.fc.getFileUserMetadata, lfns, self.maxParallelQueries)
+    for lfn, res in zip(lfns, results):
+      if not res['OK']:
+        self.log.verbose("Failed to get meta data of %s:" % lfn, res['Message'])
+        continue
+      filemeta = res['Value']
+      if filemeta.has_key('NumberOfEvents'):
+        nbevts += int(filemeta['NumberOfEvents'])
+      elif dirmeta.has_key('NumberOfEvents'):
+        nbevts += int(dirmeta['NumberOfEvents'])
+      if filemeta.has_key('Luminosity'):
+        lumi += float(filemeta['Luminosity'])
+      filexsec = getCrossSection(filemeta.get('AdditionalInfo'))
+      if filexsec:
+        xsec += filexsec
+        xsecfiles += 1
+    if xsecfiles:
+      xsec /= xsecfiles
+    entry.update({'NumberOfEvents' : nbevts, 'Luminosity' : lumi, 'CrossSection' : xsec})
+    self.summary.update(prodID, entry)
+    return S_OK(True)
+
+def getCrossSection(addinfo):
+  """ The cross section in the AdditionalInfo meta data of a file, 0 if not there
+  """
+  if not addinfo:
+    return 0.
+  if type(addinfo) in (type(''), type(u'')):
+    try:
+      if addinfo.count("{"):
+        addinfo = ast.literal_eval(addinfo)
+      else:
+        addinfo = DEncode.decode(addinfo)[0]
+    except Exception:
+      return 0.
+  try:
+    return float(addinfo['xsection']['sum']['xsection'])
+  except (KeyError, TypeError, ValueError):
+    return 0.
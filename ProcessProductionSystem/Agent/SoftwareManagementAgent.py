@@ -45,23 +45,21 @@ class SoftwareManagementAgent( AgentModule ):
     ownerGroup = proxyInfo['group']
     self.log.info("submitTasks: Jobs will be submitted with the credentials %s:%s" % (owner, ownerGroup))    
     
-    sites = self.diracadmin.getSiteMask()['Value']
-    for site in sites:
-      res = self.ppc.changeSiteStatus( {'SiteName' : site, 'Status' : 'OK'} )
-      if not res['OK']:
-        self.log.error('Cannot add or update site %s' % site)
-        
-    banned_sites = self.diracadmin.getBannedSites()['Value']
-    for banned_site in banned_sites:
-      self.ppc.changeSiteStatus( {'SiteName' : banned_site, 'Status' : 'Banned'} )
-      if not res['OK']:
-        self.log.error('Cannot mark as banned site %s' % banned_site)
+    sitedicts = [{'SiteName' : site, 'Status' : 'OK'} for site in self.diracadmin.getSiteMask()['Value']]
+    sitedicts.extend([{'SiteName' : site, 'Status' : 'Banned'} for site in self.diracadmin.getBannedSites()['Value']])
+    res = self.ppc.changeSiteStatuses(sitedicts)
+    if not res['OK']:
+      self.log.error('Cannot add or update the sites: %s' % res['Message'])
+    else:
+      for site, reason in res['Value']['Failed'].items():
+        self.log.error('Cannot add or update site %s: %s' % (site, reason))
         
     ##Then we need to get new installation tasks
     res = self.ppc.getInstallSoftwareTask()
     if not res['OK']:
       self.log.error('Failed to obtain task')
     task_dict = res['Value']
+    newjobs = []
     for softdict in task_dict.values():
       self.log.info('Will install %s %s at %s' % (softdict['AppName'], softdict['AppVersion'], softdict['Sites']))
       for site in softdict['Sites']:
@@ -89,29 +87,42 @@ class SoftwareManagementAgent( AgentModule ):
         jobdict['JobID'] = res['Value']
         jobdict['Status'] = 'Waiting'
         jobdict['Site'] = site
-        res = self.ppc.addOrUpdateJob(jobdict)
-        if not res['OK']:
-          self.log.error('Could not add job %s: %s' % (jobdict['JobID'], res['Message']))
+        newjobs.append(jobdict)
+    self.updateJobs(newjobs, 'add')
     
     ##Monitor jobs
-    jobs = {}
     res = self.ppc.getJobs()
     if not res['OK']:
       self.log.error('Could not retrieve jobs')
-    else:
+    elif res['Value']:
       jobs = res['Value']
-      for job in jobs:
-        res = self.dirac.status(job['JobID'])
-        if res['OK']:
-          jobstatuses = res['Value'] 
-          job['Status'] = jobstatuses['JobID']['Status']
-          res = self.ppc.addOrUpdateJob(job)
-          if not res['OK']:
-            self.log.error("Failed to updated job %s: %s" % (job['JobID'], res['Message']))
-        else:
-          self.log.error("Failed to update job %s status" % job['JobID'])
+      res = self.dirac.status([job['JobID'] for job in jobs])
+      if not res['OK']:
+        self.log.error("Failed to get the jobs status: %s" % res['Message'])
+      else:
+        jobstatuses = res['Value']
+        updated = []
+        for job in jobs:
+          if not jobstatuses.has_key(job['JobID']):
+            self.log.error("Failed to update job %s status" % job['JobID'])
+            continue
+          job['Status'] = jobstatuses[job['JobID']]['Status']
+          updated.append(job)
+        self.updateJobs(updated, 'update')
           
     return S_OK()
+
+  def updateJobs(self, jobs, action):
+    """ Report the jobs to the ProcessDB in one call
+    """
+    if not jobs:
+      return
+    res = self.ppc.addOrUpdateJobs(jobs)
+    if not res['OK']:
+      self.log.error('Could not %s the jobs: %s' % (action, res['Message']))
+      return
+    for jobID, reason in res['Value']['Failed'].items():
+      self.log.error('Could not %s job %s: %s' % (action, jobID, reason))
   
   
   
\ No newline at end of file
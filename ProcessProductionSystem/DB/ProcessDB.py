@@ -25,6 +25,12 @@ class ProcessDB ( DB ):
     self.SiteStatuses = ['OK', 'Banned']
     self.Operations = ['Installation', 'Removal']
     self.OperationsStatus = ['Done', 'Running', 'Waiting', 'Failed']      
+    self.JobKeys = ['Status', 'JobID', 'Site', 'AppName', 'AppVersion', 'Platform']
+    self.ProdDataKeys = ['ProdID', 'Type', 'Process', 'Path', 'AppName', 'AppVersion', 'Platform']
+    ##Indexes on the columns looked up by the bulk methods, added to the tables created without them
+    self.LookupIndexes = { 'Software' : { 'Valid' : ['Valid'] },
+                           'ApplicationStatusAtSite' : { 'SoftwareSite' : ['idSoftware', 'idSite'] }
+                         }
     
     result = self.__initializeDB()
     if not result[ 'OK' ]:
@@ -189,7 +195,26 @@ class ProcessDB ( DB ):
                                                      }
                                       }       
     if tablesToCreate:
-      return self._createTables( tablesToCreate ) 
+      res = self._createTables( tablesToCreate ) 
+      if not res['OK']:
+        return res
+    return self.__addLookupIndexes()
+
+  def __addLookupIndexes(self):
+    """ Add the indexes of LookupIndexes that the tables do not have yet
+    """
+    for table, indexes in self.LookupIndexes.items():
+      res = self._query( "SHOW INDEX FROM %s;" % table )
+      if not res['OK']:
+        return res
+      existing = [row[2] for row in res['Value']]
+      for name, columns in indexes.items():
+        if name in existing:
+          continue
+        res = self._update( "ALTER TABLE %s ADD INDEX %s (%s);" % (table, name, ",".join(columns)) )
+        if not res['OK']:
+          return res
+        self.log.info("Added index %s to %s" % (name, table))
     return S_OK()
   ##################################################################
   ### Getter methods
@@ -416,24 +441,16 @@ class ProcessDB ( DB ):
     """ Return list of JobIDs for update
     """
     connection = self.__getConnection( connection )
-  
-    res = self._getFields('SoftwareOperations', ['JobID', 'idSoftware', 'Site'], [], [], conn = connection)
-    rows = res['Value']
-
+    req = "SELECT SoftwareOperations.JobID,Software.AppName,Software.AppVersion,Software.Platform,Sites.SiteName \
+           FROM SoftwareOperations JOIN Software ON SoftwareOperations.idSoftware = Software.idSoftware \
+           JOIN Sites ON SoftwareOperations.idSite = Sites.idSite;"
+    res = self._query( req, connection )
+    if not res['OK']:
+      return res
     resjobs = []
-    
-    for row in rows:
-      jobdict = {}
-      jobdict['JobID'] = row[0]
-      res = self._getFields('Software', ['AppName', 'AppVersion', 'Platform'], ['idSoftware'], [row[1]], conn = connection)
-      jobdict['Site'] = row[2]
-      row = res['Value'][0]
-      if len(row):
-        jobdict['AppName'] = row[0]
-        jobdict['AppVersion'] = row[1]
-        jobdict['Platform'] = row[2]
-        resjobs.append(jobdict)
-        
+    for jobID, appName, appVersion, platform, site in res['Value']:
+      resjobs.append({'JobID' : jobID, 'AppName' : appName, 'AppVersion' : appVersion,
+                      'Platform' : platform, 'Site' : site})
     return S_OK(resjobs)
   ##################################################################
   # Setter methods
@@ -564,48 +581,97 @@ class ProcessDB ( DB ):
   def addOrUpdateJob(self, jobdict, connection = False ):
     """ Add a new job: operation 
     """
+    res = self.addOrUpdateJobs([jobdict], connection)
+    if not res['OK']:
+      return res
+    if res['Value']['Failed']:
+      return S_ERROR(res['Value']['Failed'].values()[0])
+    return S_OK()
+
+  def addOrUpdateJobs(self, jobdicts, connection = False ):
+    """ Add the new jobs and update the status of the known ones, in one transaction. A job Done or Failed
+    is removed, a job Waiting marks its software as Installing at its site.
+
+    @param jobdicts: list of dictionaries with Status, JobID, Site, AppName, AppVersion, Platform
+    and optionally Operation
+    @return: S_OK(dict with Successful: list of JobIDs, Failed: dict JobID -> reason)
+    """
     connection = self.__getConnection( connection )
-    
-    jobkeys = ['Status', 'JobID', 'Site', 'AppName', 'AppVersion', 'Platform']
-    for key in jobkeys:
-      if not jobdict.has_key(key):
-        return S_ERROR("Missing mandatory parameter %s" % key)
-      
-    softid = 0  
-    res = self._checkSoftware(jobdict['AppName'], jobdict['AppVersion'], jobdict['Platform'], connection)  
-    if res['OK']:
-      if len(res['Value']):
-        softid = res['Value'][0][0]
-    siteid = 0    
-    res = self._getFields('idSite', 'Sites', ['SiteName'], [jobdict['Site']], conn = connection)
-    if len(res['Value']):
-      siteid = res['Value'][0][0]    
-    if not siteid or not softid:
-      return S_ERROR("Could not find either site or software")  
-    #Check that job is new or not
-    res = self._getFields('SoftwareOperations', ['OpID'], ['JobID'], [jobdict['JobID']], conn = connection)
+    failed = {}
+    jobs = []
+    for jobdict in jobdicts:
+      missing = [key for key in self.JobKeys if not jobdict.has_key(key)]
+      if missing:
+        failed[jobdict.get('JobID', 'Unknown')] = "Missing mandatory parameter %s" % missing[0]
+      else:
+        jobs.append(jobdict)
+    if not jobs:
+      return S_OK({'Successful' : [], 'Failed' : failed})
+
+    res = self.__getSoftwareIDs([(job['AppName'], job['AppVersion'], job['Platform']) for job in jobs], connection)
     if not res['OK']:
       return res
-    if len(res['Value']):
-      opID = res['Value'][0][0] 
-      status = jobdict['Status']
-      if not status in self.OperationsStatus:
-        status = 'Waiting'
-      if not status == 'Failed' and not status == 'Done':   
-        req = "UPDATE SoftwareOperations SET Status='%s' WHERE OpID=%s;" % (status, opID)
-        res = self._update( req, connection )
-        if not status == 'Running':
-          req = 'UPDATE ApplicationStatusAtSite SET Status="Installing" WHERE idSoftware=%s AND idSite=%s;' % (softid, siteid)
-          res = self._update( req, connection )
-      elif status == 'Done' or status == 'Failed':
-        res = self._removeJob(opID, connection)
-    else:
-      #when new
-      if jobdict.has_key('Operation'):
-        if not jobdict['Operation'] in self.Operations:
-          return S_ERROR("Operation %s is not supported" % jobdict['Operation'])
-      res = self._insert('SoftwareOperations', ['JobID', 'idSoftware', 'idSite'], [jobdict['JobID'], softid, siteid], connection)
-    return res
+    softids = res['Value']
+    res = self.__getSites([job['Site'] for job in jobs], connection)
+    if not res['OK']:
+      return res
+    sites = res['Value']
+    jobIDs = [int(job['JobID']) for job in jobs]
+    res = self.__select("SELECT JobID,OpID FROM SoftwareOperations WHERE JobID IN (%s);" % ",".join(["%s"] * len(jobIDs)),
+                        jobIDs, connection)
+    if not res['OK']:
+      return res
+    opids = {}
+    for jobID, opID in res['Value']:
+      opids[int(jobID)] = opID
+
+    newjobs = []
+    statuses = {}
+    removed = []
+    installing = {}
+    successful = []
+    for job in jobs:
+      softid = softids.get((job['AppName'], job['AppVersion'], job['Platform']))
+      siteid = sites.get(job['Site'], (0, None))[0]
+      if not siteid or not softid:
+        failed[job['JobID']] = "Could not find either site or software"
+        continue
+      jobID = int(job['JobID'])
+      if opids.has_key(jobID):
+        status = job['Status']
+        if not status in self.OperationsStatus:
+          status = 'Waiting'
+        if status == 'Done' or status == 'Failed':
+          removed.append(opids[jobID])
+        else:
+          statuses.setdefault(status, []).append(opids[jobID])
+          if not status == 'Running':
+            installing.setdefault(softid, []).append(siteid)
+      else:
+        if job.has_key('Operation') and not job['Operation'] in self.Operations:
+          failed[job['JobID']] = "Operation %s is not supported" % job['Operation']
+          continue
+        newjobs.append((jobID, softid, siteid))
+      successful.append(job['JobID'])
+
+    def update(cursor):
+      """ All the changes, in one transaction
+      """
+      if newjobs:
+        cursor.executemany("INSERT INTO SoftwareOperations (JobID,idSoftware,idSite) VALUES (%s,%s,%s);", newjobs)
+      for status, opIDs in statuses.items():
+        cursor.execute("UPDATE SoftwareOperations SET Status=%%s WHERE OpID IN (%s);" % ",".join(["%s"] * len(opIDs)),
+                       [status] + opIDs)
+      for softid, siteids in installing.items():
+        cursor.execute('UPDATE ApplicationStatusAtSite SET Status="Installing" WHERE idSoftware=%%s AND idSite IN (%s);' %
+                       ",".join(["%s"] * len(siteids)), [softid] + siteids)
+      if removed:
+        cursor.execute("DELETE FROM SoftwareOperations WHERE OpID IN (%s);" % ",".join(["%s"] * len(removed)), removed)
+      return S_OK()
+    res = self.__transaction(update, connection)
+    if not res['OK']:
+      return res
+    return S_OK({'Successful' : successful, 'Failed' : failed})
   
   def _removeJob(self, opID, connection):
     connection = self.__getConnection( connection )    
@@ -616,77 +682,113 @@ class ProcessDB ( DB ):
   def addProductionData(self, ProdDataDict, connection = False):
     """ Declare a new Production
     """
-    ProdID = ProdDataDict['ProdID']
-    ProdType = ProdDataDict['Type']
-    ProcessName = ProdDataDict['Process']
-    Path = ProdDataDict['Path']
-    AppName = ProdDataDict['AppName']
-    AppVersion = ProdDataDict['AppVersion']
-    Platform   = ProdDataDict['Platform']
-    SteeringFile = None
-    if ProdDataDict.has_key('SteeringFile'):
-      SteeringFile = ProdDataDict['SteeringFile']
-    InheritsFrom = None
-    if ProdDataDict.has_key('InheritsFrom'):
-      InheritsFrom = ProdDataDict['InheritsFrom']
-
-    if not ProdType in self.ProdTypes:
-      return S_ERROR("Production type %s not available" % (ProdType))
-    connection = self.__getConnection( connection )
-    
-    #Get the ProcessID
-    Params = ['idProcesses']
-    res = self.getProcessInfo(ProcessName, Params, connection)
+    res = self.addProductionDataBatch([ProdDataDict], connection)
     if not res['OK']:
       return res
-    ProcessID = res['Value']['idProcesses']
-    
-    ##Get Software ID
-    Params = ['idSoftware']
-    res = self.getSoftwareParams(AppName, AppVersion, Platform, Params, connection)
+    if res['Value']['Failed']:
+      return S_ERROR(res['Value']['Failed'].values()[0])
+    return S_OK()
+
+  def addProductionDataBatch(self, ProdDataDicts, connection = False):
+    """ Declare many productions in one transaction: their ProcessData, the steering files and their
+    relation to their mother production, which can be declared in the same batch
+
+    @param ProdDataDicts: list of dictionaries with ProdID, Type, Process, Path, AppName, AppVersion,
+    Platform and optionally SteeringFile and InheritsFrom (the ProdID of the mother production)
+    @return: S_OK(dict with Successful: list of ProdIDs, Failed: dict ProdID -> reason)
+    """
+    connection = self.__getConnection( connection )
+    failed = {}
+    prods = []
+    for ProdDataDict in ProdDataDicts:
+      missing = [key for key in self.ProdDataKeys if not ProdDataDict.has_key(key)]
+      if missing:
+        failed[ProdDataDict.get('ProdID', 'Unknown')] = "Missing mandatory parameter %s" % missing[0]
+      elif not ProdDataDict['Type'] in self.ProdTypes:
+        failed[ProdDataDict['ProdID']] = "Production type %s not available" % (ProdDataDict['Type'])
+      else:
+        prods.append(ProdDataDict)
+    if not prods:
+      return S_OK({'Successful' : [], 'Failed' : failed})
+
+    processNames = list(set([prod['Process'] for prod in prods]))
+    res = self.__select("SELECT ProcessName,idProcesses FROM Processes WHERE ProcessName IN (%s);" %
+                        ",".join(["%s"] * len(processNames)), processNames, connection)
     if not res['OK']:
       return res
-    SoftwareID = res['Value']['idSoftware']
-    
-    ##Create the ProcessData
-    #req = "INSERT INTO ProcessData (idProcesses,Path) VALUES (%s,'%s');" % (ProcessID,Path)
-    #res = self._update( req, connection )
-    res = self._insert('ProcessData', ['idProcesses', 'Path'], [ProcessID, Path], connection)
+    processIDs = dict(res['Value'])
+    res = self.__getSoftwareIDs([(prod['AppName'], prod['AppVersion'], prod['Platform']) for prod in prods], connection)
     if not res['OK']:
-      return S_ERROR("Could not insert ProcessData into DB")
-    #Get that line's ID
-    #req = "SELECT LAST_INSERT_ID();"
-    #res = self._query( req, connection )
-    #if not res['OK']:
-    #  return S_ERROR('Failed to get last insert ID')
-    ProcessDataID = res['lastRowId']
-    
-    #Declare new production
-    #req = "INSERT INTO Productions (idSoftware,idProcessData,ProdID,Type) VALUES \
-    #       ( %d, %d, %d, '%s');" % (SoftwareID, ProcessDataID, ProdID, ProdType)
-    #res = self._update( req, connection ) 
-    res = self._insert('Productions', ['idSoftware', 'idProcessData', 'ProdID', 'Type'],
-                       [SoftwareID, ProcessDataID, ProdID, ProdType], connection)
-    if not res['OK']:
-      return res
-    prod_insert_ID = res['lastRowId']
-    ##In Case there is a steering file
-    if SteeringFile:
-      #req = "SELECT idfiles FROM SteeringFiles WHERE FileName='%s';" % SteeringFile
-      #res = self._query( req, connection )
-      res = self._getFields('SteeringFiles', ['idfiles'], ['FileName'], [SteeringFile], conn = connection )
-      if not len(res['Value']):
-        res = self.addSteeringFile( SteeringFile, connection = connection)
-      idSteering = res['Value'][0]
-      #req = "INSERT INTO SteeringFiles_has_ProcessData (idfiles,idProcessData) VALUES ( %s, %s);"% (idSteering,ProcessDataID)
-      #res = self._update( req, connection )
-      res = self._insert('SteeringFiles_has_ProcessData', ['idfiles', 'idProcessData'], [idSteering, ProcessDataID], connection)
-    if InheritsFrom:
-      req = 'INSERT INTO ProductionRelation (idMotherProd,idDaughterProd) VALUES ((SELECT idProduction FROM Productions WHERE ProdID=%s),%s);' % (InheritsFrom, prod_insert_ID)
-      res = self._update( req, connection )
+      return res
+    softids = res['Value']
+    mothers = list(set([int(prod['InheritsFrom']) for prod in prods if prod.get('InheritsFrom')]))
+    existingProds = []
+    if mothers:
+      res = self.__select("SELECT DISTINCT ProdID FROM Productions WHERE ProdID IN (%s);" % ",".join(["%s"] * len(mothers)),
+                          mothers, connection)
+      if not res['OK']:
+        return res
+      existingProds = [int(row[0]) for row in res['Value']]
+
+    toAdd = []
+    for prod in prods:
+      if not processIDs.has_key(prod['Process']):
+        failed[prod['ProdID']] = "Process %s does not exist" % prod['Process']
+      elif not softids.has_key((prod['AppName'], prod['AppVersion'], prod['Platform'])):
+        failed[prod['ProdID']] = "Could not find any software %s %s" % (prod['AppName'], prod['AppVersion'])
+      else:
+        toAdd.append(prod)
+    ##The mother production must be in the DB or added in this batch
+    orphans = True
+    while orphans:
+      added = [int(prod['ProdID']) for prod in toAdd]
+      orphans = [prod for prod in toAdd if prod.get('InheritsFrom') and not int(prod['InheritsFrom']) in existingProds
+                 and not int(prod['InheritsFrom']) in added]
+      for prod in orphans:
+        failed[prod['ProdID']] = "Mother production %s not found" % prod['InheritsFrom']
+        toAdd.remove(prod)
+
+    def insert(cursor):
+      """ All the inserts, in one transaction
+      """
+      steeringIDs = {}
+      steeringFiles = list(set([prod['SteeringFile'] for prod in toAdd if prod.get('SteeringFile')]))
+      if steeringFiles:
+        cursor.executemany("INSERT IGNORE INTO SteeringFiles (FileName) VALUES (%s);",
+                           [(fileName,) for fileName in steeringFiles])
+        cursor.execute("SELECT FileName,idFile FROM SteeringFiles WHERE FileName IN (%s);" %
+                       ",".join(["%s"] * len(steeringFiles)), steeringFiles)
+        steeringIDs = dict(cursor.fetchall())
+      steeringRelations = []
+      daughters = []
+      for prod in toAdd:
+        ##The IDs of the rows are needed for the relations: one insert per production
+        cursor.execute("INSERT INTO ProcessData (idProcesses,Path) VALUES (%s,%s);",
+                       (processIDs[prod['Process']], prod['Path']))
+        ProcessDataID = cursor.lastrowid
+        cursor.execute("INSERT INTO Productions (idSoftware,idProcessData,ProdID,Type) VALUES (%s,%s,%s,%s);",
+                       (softids[(prod['AppName'], prod['AppVersion'], prod['Platform'])], ProcessDataID,
+                        int(prod['ProdID']), prod['Type']))
+        if prod.get('SteeringFile'):
+          steeringRelations.append((steeringIDs[prod['SteeringFile']], ProcessDataID))
+        if prod.get('InheritsFrom'):
+          daughters.append((int(prod['InheritsFrom']), cursor.lastrowid))
+      if steeringRelations:
+        cursor.executemany("INSERT INTO SteeringFiles_has_ProcessData (idFile,idProcessData) VALUES (%s,%s);",
+                           steeringRelations)
+      if daughters:
+        mothers = list(set([mother for mother, daughter in daughters]))
+        cursor.execute("SELECT ProdID,MIN(idProduction) FROM Productions WHERE ProdID IN (%s) GROUP BY ProdID;" %
+                       ",".join(["%s"] * len(mothers)), mothers)
+        motherIDs = dict([(int(prodID), idProduction) for prodID, idProduction in cursor.fetchall()])
+        cursor.executemany("INSERT INTO ProductionRelation (idMotherProd,idDaughterProd) VALUES (%s,%s);",
+                           [(motherIDs[mother], daughter) for mother, daughter in daughters])
+      return S_OK()
+    if toAdd:
+      res = self.__transaction(insert, connection)
       if not res['OK']:
         return res
-    return S_OK()  
+    return S_OK({'Successful' : [prod['ProdID'] for prod in toAdd], 'Failed' : failed})
            
   ########################################################################
   # Update methods
@@ -765,24 +867,59 @@ class ProcessDB ( DB ):
   def changeSiteStatus(self, sitedict, connection = False ):
     """ Mark site as banned or active
     """
-    connection = self.__getConnection( connection )
-    if not sitedict.has_key('Status') or not sitedict.has_key('SiteName'):
-      return S_ERROR("Missing mandatory key Status or SiteDict")
-    if not sitedict['Status'] in self.SiteStatuses:
-      return S_ERROR("Status %s is not a valid site status" % sitedict['Status'])
-    
-    res = self._getFields('Sites', ['SiteName'], ['SiteName'], [sitedict['SiteName']], conn = connection)
-    rows = res['Value']
-    if not len(rows):
-      res = self.addSite(sitedict['SiteName'], connection)
-      if not res['OK']:
-        return res
-    
-    query = 'UPDATE Sites SET Status="%s" WHERE SiteName="%s";' % (sitedict['Status'], sitedict['SiteName'])
-    res = self._update(query, connection)
+    res = self.changeSiteStatuses([sitedict], connection)
     if not res['OK']:
       return res
+    if res['Value']['Failed']:
+      return S_ERROR(res['Value']['Failed'].values()[0])
     return S_OK()
+
+  def changeSiteStatuses(self, sitedicts, connection = False ):
+    """ Set the status of many sites in one transaction, adding the unknown ones
+
+    @param sitedicts: list of dictionaries with SiteName and Status (OK or Banned)
+    @return: S_OK(dict with Successful: list of SiteNames, Failed: dict SiteName -> reason)
+    """
+    connection = self.__getConnection( connection )
+    failed = {}
+    statuses = {}
+    for sitedict in sitedicts:
+      if not sitedict.has_key('Status') or not sitedict.has_key('SiteName'):
+        failed[sitedict.get('SiteName', 'Unknown')] = "Missing mandatory key Status or SiteName"
+      elif not sitedict['Status'] in self.SiteStatuses:
+        failed[sitedict['SiteName']] = "Status %s is not a valid site status" % sitedict['Status']
+      else:
+        statuses[sitedict['SiteName']] = sitedict['Status']
+    if not statuses:
+      return S_OK({'Successful' : [], 'Failed' : failed})
+
+    res = self.__getSites(statuses.keys(), connection)
+    if not res['OK']:
+      return res
+    sites = res['Value']
+    newsites = [siteName for siteName in statuses.keys() if not sites.has_key(siteName)]
+    changes = {}
+    for siteName, (idSite, status) in sites.items():
+      if not status == statuses[siteName]:
+        changes.setdefault(statuses[siteName], []).append(idSite)
+
+    def update(cursor):
+      """ All the changes, in one transaction
+      """
+      if newsites:
+        cursor.executemany("INSERT INTO Sites (SiteName,Status) VALUES (%s,%s);",
+                           [(siteName, statuses[siteName]) for siteName in newsites])
+        cursor.execute("INSERT INTO ApplicationStatusAtSite (idSite,idSoftware) SELECT Sites.idSite,Software.idSoftware \
+                        FROM Sites,Software WHERE Sites.SiteName IN (%s);" % ",".join(["%s"] * len(newsites)), newsites)
+      for status, siteIDs in changes.items():
+        cursor.execute("UPDATE Sites SET Status=%%s WHERE idSite IN (%s);" % ",".join(["%s"] * len(siteIDs)),
+                       [status] + siteIDs)
+      return S_OK()
+    if newsites or changes:
+      res = self.__transaction(update, connection)
+      if not res['OK']:
+        return res
+    return S_OK({'Successful' : statuses.keys(), 'Failed' : failed})
   
   def reportOK(self, jobdict, connection = False ):
     """ Report if application is OK to use or not at a given site
@@ -842,6 +979,86 @@ class ProcessDB ( DB ):
   #####################################################################
   # Private methods
 
+  def __select( self, req, args, connection ):
+    """ Run a parameterised SELECT
+
+    @return: S_OK(rows)
+    """
+    try:
+      cursor = connection.cursor()
+      try:
+        cursor.execute( req, args )
+        return S_OK( cursor.fetchall() )
+      finally:
+        cursor.close()
+    except Exception, x:
+      return S_ERROR( "Query failed: %s" % str(x) )
+
+  def __transaction( self, body, connection ):
+    """ Call body with a cursor in a transaction, committed if body returns S_OK, rolled back otherwise
+    """
+    try:
+      cursor = connection.cursor()
+    except Exception, x:
+      return S_ERROR( "Could not get a cursor: %s" % str(x) )
+    try:
+      try:
+        cursor.execute( "START TRANSACTION;" )
+        res = body( cursor )
+        if res['OK']:
+          connection.commit()
+        else:
+          connection.rollback()
+        return res
+      except Exception, x:
+        try:
+          connection.rollback()
+        except Exception:
+          pass
+        return S_ERROR( "Transaction rolled back: %s" % str(x) )
+    finally:
+      cursor.close()
+
+  def __getSoftwareIDs( self, softwares, connection ):
+    """ Get the IDs of many softwares in one query
+
+    @param softwares: list of (AppName, AppVersion, Platform), the Platform any matching all platforms
+    @return: S_OK(dict (AppName, AppVersion, Platform) -> idSoftware)
+    """
+    apps = list(set([(appName, appVersion) for appName, appVersion, platform in softwares]))
+    if not apps:
+      return S_OK({})
+    args = []
+    for app in apps:
+      args.extend(app)
+    req = "SELECT idSoftware,AppName,AppVersion,Platform FROM Software WHERE %s ORDER BY idSoftware;" % \
+          " OR ".join(["(AppName=%s AND AppVersion=%s)"] * len(apps))
+    res = self.__select( req, args, connection )
+    if not res['OK']:
+      return res
+    softids = {}
+    for idSoftware, appName, appVersion, platform in res['Value']:
+      softids.setdefault((appName, appVersion, platform), idSoftware)
+      softids.setdefault((appName, appVersion, 'any'), idSoftware)
+    return S_OK(softids)
+
+  def __getSites( self, siteNames, connection ):
+    """ Get the ID and status of many sites in one query
+
+    @return: S_OK(dict SiteName -> (idSite, Status))
+    """
+    siteNames = list(set(siteNames))
+    if not siteNames:
+      return S_OK({})
+    req = "SELECT SiteName,idSite,Status FROM Sites WHERE SiteName IN (%s);" % ",".join(["%s"] * len(siteNames))
+    res = self.__select( req, siteNames, connection )
+    if not res['OK']:
+      return res
+    sites = {}
+    for siteName, idSite, status in res['Value']:
+      sites[siteName] = (idSite, status)
+    return S_OK(sites)
+
   def __getConnection( self, connection ):
     if connection:
       return connection
@@ -50,6 +50,7 @@ CREATE  TABLE IF NOT EXISTS Software (
   Path VARCHAR(512) NOT NULL,
   PRIMARY KEY (idSoftware) ,
   INDEX Application (AppName ASC, AppVersion ASC) ,
+  INDEX Valid (Valid ASC) ,
   UNIQUE INDEX idSoftware_UNIQUE (idSoftware ASC) )
 ENGINE = MyISAM;
 
@@ -60,6 +60,12 @@ class ProcessManagerHandler(RequestHandler):
     """ Obtain a new task: when new software is installed. it's needed to install it everywhere.
     """
     return processDB.getInstallSoftwareTask()
+
+  types_getJobs = []
+  def export_getJobs(self):
+    """ Get the software installation jobs being followed
+    """
+    return processDB.getJobs()
 #######################################################################
 #              Add methods
 #######################################################################
@@ -100,6 +106,12 @@ class ProcessManagerHandler(RequestHandler):
         ):
       return S_ERROR('Incorrect dictionary structure')
     return processDB.addProductionData(ProdDataDict)
+
+  types_addProductionDataBatch = [[ListType, TupleType]]
+  def export_addProductionDataBatch(self, ProdDataDicts):
+    """ Add many Production data objects at once
+    """
+    return processDB.addProductionDataBatch(ProdDataDicts)
   
   types_addsite = [StringTypes]
   def export_addSite(self, sitename):
@@ -112,6 +124,12 @@ class ProcessManagerHandler(RequestHandler):
     """ Add a job
     """
     return processDB.addOrUpdateJob(jobdict)
+
+  types_addOrUpdateJobs = [[ListType, TupleType]]
+  def export_addOrUpdateJobs(self, jobdicts):
+    """ Add or update many jobs at once
+    """
+    return processDB.addOrUpdateJobs(jobdicts)
 #######################################################################
 #              Change methods
 #######################################################################
@@ -133,6 +151,12 @@ class ProcessManagerHandler(RequestHandler):
   def export_changeSiteStatus(self, sitedict):
     return processDB.changeSiteStatus(sitedict)
 
+  types_changeSiteStatuses = [[ListType, TupleType]]
+  def export_changeSiteStatuses(self, sitedicts):
+    """ Change the status of many sites at once
+    """
+    return processDB.changeSiteStatuses(sitedicts)
+
   types_reportOK = [DictType]
   def export_reportOK(self, jobdict):
     return processDB.reportOK(jobdict)
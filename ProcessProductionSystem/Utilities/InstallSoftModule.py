@@ -4,6 +4,7 @@ Created by S Poss
 May 2011
 """
 from ILCDIRAC.Core.Utilities.CombinedSoftwareInstallation  import LocalArea, SharedArea, listAreaDirectory
+from ILCDIRAC.Core.Utilities.SoftwareCatalog               import getSoftwareCatalog
 
 from ILCDIRAC.ProcessProductionSystem.Client.ProcessProdClient import ProcessProdClient
 from DIRAC.ConfigurationSystem.Client.Helpers.Operations            import Operations
@@ -54,8 +55,7 @@ class InstallSoftModule():
       jobdict['AppName'] = appname
       jobdict['AppVersion'] = appversion
       jobdict['Platform'] = self.systemConfig
-      appDir = self.ops.getValue('/AvailableTarBalls/%s/%s/%s/TarBall' % (self.systemConfig, appname, 
-                                                                          appversion), '')
+      appDir = getSoftwareCatalog().getTarBall(self.systemConfig, appname, appversion)
       appDir = appDir.replace(".tgz","").replace(".tar.gz","")
       mySoftwareRoot = ''
       sharedArea = SharedArea()
@@ -77,8 +77,7 @@ class InstallSoftModule():
       jobdict['AppName'] = appname
       jobdict['AppVersion'] = appversion
       jobdict['Platform'] = self.systemConfig      
-      appDir = self.ops.getValue('/AvailableTarBalls/%s/%s/%s/TarBall' % (self.systemConfig, 
-                                                                          appname, appversion), '')
+      appDir = getSoftwareCatalog().getTarBall(self.systemConfig, appname, appversion)
       appDir = appDir.replace(".tgz", "").replace(".tar.gz", "")
       mySoftwareRoot = ''
       sharedArea = SharedArea()
@@ -0,0 +1,236 @@
+'''
+Summary of the productions, kept in a file between the cycles of the L{ProductionSummaryAgent}.
+
+For each production it holds the number of files and events, the luminosity and cross section obtained from
+the file meta data, and the directory meta data (event type, energy, detector) and origin production. The
+productions without luminosity (simulation, reconstruction) take it from their origin production, scaled
+by their number of events. The HTML, CSV and JSON tables are made from this aggregate only.
+
+@since: Oct 18, 2026
+
+@author: agent
+'''
+
+from ILCDIRAC.Core.Utilities.HTML import Table
+from DIRAC import S_OK, S_ERROR
+import csv, json, os, tempfile, StringIO
+
+DATATYPES = {'MCGeneration' : 'gen', 'MCSimulation' : 'SIM', 'MCReconstruction' : 'DST',
+             'MCReconstruction_Overlay' : 'DST'}
+TABLETYPES = {'MCGeneration' : 'gen', 'MCSimulation' : 'SIM', 'MCReconstruction' : 'REC',
+              'MCReconstruction_Overlay' : 'REC'}
+
+GEN_HEADER = ('Channel', 'Energy', 'ProdID', 'Tasks', 'Average Evts/task', 'Statistics', 'Cross Section (fb)',
+              'Comment')
+DETECTOR_HEADER = ('Channel', 'Energy', 'Detector', 'ProdID', 'Number of Files', 'Events/File', 'Statistics',
+                   'Cross Section (fb)', 'Origin ProdID', 'Comment')
+CSV_HEADER = ('Table', 'Channel', 'Energy', 'Detector', 'ProdID', 'Files', 'Events/File', 'Statistics',
+              'Luminosity', 'Cross Section (fb)', 'Origin ProdID', 'Comment')
+
+def translate(detail):
+  """ Replace whizard naming convention by human conventions
+  """
+  detail = detail.replace('v','n1:n2:n3:N1:N2:N3')
+  detail = detail.replace('qli','u:d:s:U:D:S')
+  detail = detail.replace('ql','u:d:s:c:b:U:D:S:C:B')
+  detail = detail.replace('q','u:d:s:c:b:t')
+  detail = detail.replace('Q','U:D:S:C:B:T')
+  detail = detail.replace('e1','e-')
+  detail = detail.replace('E1','e+')
+  detail = detail.replace('e2','mu-')
+  detail = detail.replace('E2','mu+')
+  detail = detail.replace('e3','tau-')
+  detail = detail.replace('E3','tau+')
+  detail = detail.replace('n1','nue')
+  detail = detail.replace('N1','nueb')
+  detail = detail.replace('n2','numu')
+  detail = detail.replace('N2','numub')
+  detail = detail.replace('n3','nutau')
+  detail = detail.replace('N3','nutaub')
+  detail = detail.replace('U','ubar')
+  detail = detail.replace('C','cbar')
+  detail = detail.replace('T','tbar')
+  detail = detail.replace('tbareV','TeV')
+  detail = detail.replace('D','dbar')
+  detail = detail.replace('S','sbar')
+  detail = detail.replace('B','bbar')
+  detail = detail.replace('Z0','Z')
+  detail = detail.replace('Z','Z0')
+  detail = detail.replace('gghad','gamma gamma -> hadrons')
+  detail = detail.replace(',','')
+  detail = detail.replace('n N','nu nub')
+  detail = detail.replace('se--','seL-')
+  detail = detail.replace('se-+','seL+')
+  detail = detail.replace(' -> ','->')
+  detail = detail.replace('->',' -> ')
+  detail = detail.replace(' H ->',', H ->')
+  detail = detail.replace(' Z0 ->',', Z0 ->')
+  detail = detail.replace(' W ->',', W ->')
+  return detail
+
+class ProductionSummary(object):
+  """ Per production aggregate, stored as JSON
+  """
+  def __init__(self, path):
+    self.path = path
+    self.productions = {}
+    if path and os.path.exists(path):
+      try:
+        fileobj = open(path)
+        try:
+          for prodID, entry in json.load(fileobj).items():
+            self.productions[int(prodID)] = entry
+        finally:
+          fileobj.close()
+      except (IOError, ValueError):
+        self.productions = {}
+
+  def get(self, prodID):
+    """ The entry of the production, None if not known
+    """
+    return self.productions.get(int(prodID))
+
+  def update(self, prodID, entry):
+    """ Set the entry of the production: dict with the Type, Description, Files, NumberOfEvents, Luminosity,
+    CrossSection, MomProdID, EvtType, Energy, DetectorType (not for generation) and Detail
+    """
+    entry['ProdID'] = int(prodID)
+    self.productions[int(prodID)] = entry
+
+  def purge(self, prodIDs):
+    """ Forget the productions not in the list
+    """
+    keep = set([int(prodID) for prodID in prodIDs])
+    for prodID in self.productions.keys():
+      if not prodID in keep:
+        del self.productions[prodID]
+
+  def save(self):
+    """ Write the aggregate to its file, replacing it at once
+    """
+    return _writeFile(self.path, json.dumps(self.productions))
+
+  def getEffective(self, prodID):
+    """ The luminosity and cross section of the production, from its origin production if it has none
+
+    @return: tuple (luminosity, cross section)
+    """
+    entry = self.productions[prodID]
+    lumi = entry['Luminosity']
+    xsec = entry['CrossSection']
+    origin = entry
+    seen = set([prodID])
+    while not lumi and origin.get('MomProdID') and not origin['MomProdID'] in seen:
+      seen.add(origin['MomProdID'])
+      origin = self.productions.get(origin['MomProdID'])
+      if not origin:
+        break
+      if origin['Luminosity']:
+        lumi = origin['Luminosity']
+        if origin['NumberOfEvents'] and entry['NumberOfEvents']:
+          lumi *= float(entry['NumberOfEvents']) / origin['NumberOfEvents']
+        if not xsec:
+          xsec = origin['CrossSection']
+    return lumi, xsec
+
+  def getTables(self):
+    """ The tables of the summary, as made by dirac-ilc-production-summary
+
+    @return: list of (title, header, list of rows)
+    """
+    gen = []
+    detectors = {}
+    for prodID in sorted(self.productions.keys()):
+      entry = self.productions[prodID]
+      lumi, xsec = self.getEffective(prodID)
+      evtsperfile = 0
+      if entry['Files']:
+        evtsperfile = entry['NumberOfEvents'] / entry['Files']
+      if not entry.get('DetectorType'):
+        gen.append((entry['Detail'], entry['Energy'], prodID, entry['Files'], evtsperfile,
+                    entry['NumberOfEvents'], xsec, entry['Description']))
+      else:
+        tables = detectors.setdefault(entry['DetectorType'], {})
+        tables.setdefault(TABLETYPES.get(entry['Type'], entry['Type']), []).append(
+          (entry['Detail'], entry['Energy'], entry['DetectorType'], prodID, entry['Files'], evtsperfile,
+           entry['NumberOfEvents'], xsec, entry['MomProdID'], entry['Description']))
+    tables = []
+    if gen:
+      tables.append(('gen prods', GEN_HEADER, gen))
+    for detector in sorted(detectors.keys()):
+      for ptype in sorted(detectors[detector].keys()):
+        tables.append(('%s prods %s' % (detector, ptype), DETECTOR_HEADER, detectors[detector][ptype]))
+    return tables
+
+  def toHTML(self):
+    """ The tables as an HTML page
+    """
+    page = ["""<!DOCTYPE html>
+<html>
+ <head>
+<title> Production summary </title>
+</head>
+<body>
+"""]
+    for title, header, rows in self.getTables():
+      page.append("<h1>%s</h1>\n" % title)
+      table = Table(header_row = header)
+      table.rows.extend(rows)
+      page.append(str(table))
+    page.append("""
+</body>
+</html>
+""")
+    return "".join(page)
+
+  def toCSV(self):
+    """ The productions as one CSV table
+    """
+    out = StringIO.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(CSV_HEADER)
+    for title, header, rows in self.getTables():
+      for row in rows:
+        if header == GEN_HEADER:
+          detail, energy, prodID, files, evtsperfile, nbevts, xsec, comment = row
+          detector, momprodID = '', 0
+        else:
+          detail, energy, detector, prodID, files, evtsperfile, nbevts, xsec, momprodID, comment = row
+        writer.writerow((title, detail, energy, detector, prodID, files, evtsperfile, nbevts,
+                         self.getEffective(prodID)[0], xsec, momprodID, comment))
+    return out.getvalue()
+
+  def toJSON(self):
+    """ The productions as a JSON list, with their effective luminosity and cross section
+    """
+    productions = []
+    for prodID in sorted(self.productions.keys()):
+      entry = dict(self.productions[prodID])
+      entry['Luminosity'], entry['CrossSection'] = self.getEffective(prodID)
+      productions.append(entry)
+    return json.dumps(productions, sort_keys = True, indent = 1)
+
+  def writeTables(self, directory):
+    """ Write tables.html, tables.csv and tables.json in the directory
+    """
+    for name, content in (('tables.html', self.toHTML()), ('tables.csv', self.toCSV()),
+                          ('tables.json', self.toJSON())):
+      res = _writeFile(os.path.join(directory, name), content)
+      if not res['OK']:
+        return res
+    return S_OK()
+
+def _writeFile(path, content):
+  """ Write the content to a temporary file renamed to path, so that readers never see a partial file
+  """
+  try:
+    handle, tmpName = tempfile.mkstemp(dir = os.path.dirname(os.path.abspath(path)))
+    try:
+      os.write(handle, content)
+    finally:
+      os.close(handle)
+    os.chmod(tmpName, 0644)
+    os.rename(tmpName, path)
+  except OSError, x:
+    return S_ERROR("Failed to write %s: %s" % (path, str(x)))
+  return S_OK(path)
@@ -78,6 +78,7 @@ class ApplicationScript(ModuleBase):
     
     self.stdError = ''    
     result = shellCall(0, finalCommand, callbackFunction = self.redirectLogOutput , bufferLimit = 20971520)
+    self.closeLogOutput()
     if not result['OK']:
       self.log.error(result)
       return S_ERROR('Problem Executing Application')
@@ -2,21 +2,19 @@
 # $HeadURL$
 #####################################################
 """
-Module to check the file contents
+Module to check the file contents: all the events must contain the requested collections. The files are
+read by L{LCIOFileScanner}, the detailed report is put in the workflow_commons as CheckCollectionsReport.
 @author: Ching Bon Lam
 """
 
 __RCSID__ = "$Id$"
 
-from DIRAC.Core.Utilities.Subprocess                      import shellCall
 from ILCDIRAC.Workflow.Modules.ModuleBase                 import ModuleBase
 from DIRAC                                                import S_OK, S_ERROR, gLogger
-from ILCDIRAC.Core.Utilities.PrepareLibs                  import removeLibc
+from ILCDIRAC.Core.Utilities.LCIOFileScanner              import checkCollections
 
 import os
 
-from string import Template
-
 class CheckCollections(ModuleBase):
   """ Check the collections in a given slcio file.
   """
@@ -49,117 +47,44 @@ class CheckCollections(ModuleBase):
     if not self.systemConfig:
       result = S_ERROR( 'No ILC platform selected' )
 
-    if not os.environ.has_key("LCIO"):
-      self.log.error("Environment variable LCIO was not defined, cannot do anything")
-      result = S_ERROR("Environment variable LCIO was not defined, cannot do anything")
-
     if not result['OK']:
       return result
 
-        # removeLibc
-
-    removeLibc( os.path.join( os.environ["LCIO"], "lib" ) )
-
-    # Setting up script
-
-    LD_LIBRARY_PATH = os.path.join( "$LCIO", "lib" )
-    if os.environ.has_key('LD_LIBRARY_PATH'):
-      LD_LIBRARY_PATH += ":" + os.environ['LD_LIBRARY_PATH']
-
-    PATH = "$LCIO/bin"
-    if os.environ.has_key('PATH'):
-      PATH += ":" + os.environ['PATH']
-
-    scriptContent = Template('''
-#!/bin/sh
-
-#------------------------------------------------------------------------------#
-# Dynamically generated script by CheckCollections module                      #
-#------------------------------------------------------------------------------#
-
-declare -x LD_LIBRARY_PATH=$LD_LIBRARY_PATH_
-declare -x PATH=$PATH_
-
-python <<PYTHONSCRIPT
-
-import sys, subprocess
-
-exitStatus = 0
-
-for file in $files:
-
-    cmdResult      = subprocess.Popen( ["lcio", "count", file], stdout=subprocess.PIPE ).communicate()[ 0 ]
-    numberOfEvents = int( cmdResult.strip().split()[1] )
-
-    cmdAnajobResult = subprocess.Popen( ["anajob", file], stdout=subprocess.PIPE ).communicate()[ 0 ]
-
-    for collection in $collections:
-
-        cmdResult           = subprocess.Popen( ["grep", "-c", collection], stdin=subprocess.PIPE, stdout=subprocess.PIPE ).communicate( cmdAnajobResult )[ 0 ]
-        numberOfCollections = int( cmdResult.strip() )
-
-        if numberOfEvents != numberOfCollections:
-
-            print 'Inconsistency in %s: %i events vs %i collections (%s)' % ( file, numberOfEvents, numberOfCollections, collection )
-
-            exitStatus = 1
-            #sys.exit( exitStatus )
-
-sys.exit( exitStatus )
-
-PYTHONSCRIPT
-
-declare -x appstatus=$$?
-exit $$appstatus
-
-''')
-
-    scriptContent = scriptContent.substitute(
-            LD_LIBRARY_PATH_ = LD_LIBRARY_PATH,
-            PATH_            = PATH,
-            files            = self.InputFile,
-            collections      = self.collections
-    )
-
-    # Write script to file
-
-    scriptPath = 'CheckCollections_%s_Run_%s' % ( self.applicationVersion, self.STEP_NUMBER )
-
-    if os.path.exists(scriptPath):
-      os.remove(scriptPath)
-
-    script = open( scriptPath, 'w' )
-    script.write( scriptContent )
-    script.close()
-
-
-    # Setup log file for application stdout
-
     if os.path.exists( self.applicationLog ):
       os.remove( self.applicationLog )
 
-    # Run code
-
-    os.chmod( scriptPath, 0755 )
-
-    command = '"./%s"' % ( scriptPath )
-
     self.setApplicationStatus( 'CheckCollections %s step %s' % ( self.applicationVersion, self.STEP_NUMBER ) )
     self.stdError = ''
 
-    self.result = shellCall(
-                            0,
-                            command,
-                            callbackFunction = self.redirectLogOutput,
-                            bufferLimit = 20971520
-    )
+    res = checkCollections( self.InputFile, self.collections )
+    if not res['OK']:
+      return res
+    report = res['Value']
+    self.workflow_commons['CheckCollectionsReport'] = report
 
     # Check results
 
-    resultTuple = self.result['Value']
-    status      = resultTuple[0]
-
-    self.log.info( "Status after the application execution is %s" % str( status ) )
+    status = 0
+    logf = open( self.applicationLog, 'w' )
+    for myfile in self.InputFile:
+      filereport = report[myfile]
+      if filereport.has_key('Error'):
+        message = 'Could not check %s: %s' % ( myfile, filereport['Error'] )
+      else:
+        message = '%s: %i events' % ( myfile, filereport['Events'] )
+        for collection in self.collections:
+          if filereport['Collections'][collection] != filereport['Events']:
+            message += '\nInconsistency in %s: %i events vs %i collections (%s), missing in (run, event) %s' % \
+                       ( myfile, filereport['Events'], filereport['Collections'][collection], collection,
+                         filereport['MissingIn'][collection] )
+      if not filereport['OK']:
+        status = 1
+        self.stdError += message + '\n'
+      logf.write( message + '\n' )
+      self.log.info( message )
+    logf.close()
+
+    self.log.info( "Status after the check is %s" % str( status ) )
 
     return self.finalStatusReport(status)
 
@@ -138,6 +138,7 @@ exit $?
                             callbackFunction = self.redirectLogOutput,
                             bufferLimit = 20971520
                             )
+    self.closeLogOutput()
 
         # Check results
 
@@ -158,6 +158,7 @@ exit $?
                             callbackFunction = self.redirectLogOutput,
                             bufferLimit = 20971520
                             )
+    self.closeLogOutput()
 
         # Check results
 
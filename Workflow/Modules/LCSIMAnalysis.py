@@ -17,6 +17,7 @@ import os, shutil, types
 from DIRAC.Core.Utilities.Subprocess                         import shellCall
 from ILCDIRAC.Workflow.Modules.ModuleBase                    import ModuleBase
 from ILCDIRAC.Core.Utilities.CombinedSoftwareInstallation    import getSoftwareFolder
+from ILCDIRAC.Core.Utilities.SoftwareCatalog                 import getSoftwareCatalog
 from ILCDIRAC.Core.Utilities.PrepareOptionFiles              import PrepareLCSIMFile, GetNewLDLibs 
 from ILCDIRAC.Core.Utilities.resolvePathsAndNames            import resolveIFpaths, getProdFilename
 from ILCDIRAC.Core.Utilities.PrepareLibs                     import removeLibc
@@ -136,9 +137,7 @@ class LCSIMAnalysis(ModuleBase):
       return S_OK('LCSIM should not proceed as previous step did not end properly')
     
     #look for lcsim filename
-    lcsim_name = self.ops.getValue('/AvailableTarBalls/%s/%s/%s/TarBall'%(self.systemConfig, 
-                                                                          "lcsim", 
-                                                                          self.applicationVersion), '')
+    lcsim_name = getSoftwareCatalog().getTarBall(self.systemConfig, "lcsim", self.applicationVersion)
     if not lcsim_name:
       self.log.error("Could not find lcsim file name from CS")
       return S_ERROR("Could not find lcsim file name from CS")
@@ -258,6 +257,7 @@ class LCSIMAnalysis(ModuleBase):
     self.setApplicationStatus('LCSIM %s step %s' % (self.applicationVersion, self.STEP_NUMBER))
     self.stdError = ''
     self.result = shellCall(0, comm, callbackFunction = self.redirectLogOutput, bufferLimit = 20971520)
+    self.closeLogOutput()
     #self.result = {'OK':True,'Value':(0,'Disabled Execution','')}
     resultTuple = self.result['Value']
     if not os.path.exists(self.applicationLog):
@@ -21,6 +21,7 @@ from DIRAC.Core.Utilities.Subprocess                      import shellCall
 #from DIRAC.Core.DISET.RPCClient                           import RPCClient
 from ILCDIRAC.Workflow.Modules.ModuleBase                 import ModuleBase
 from ILCDIRAC.Core.Utilities.CombinedSoftwareInstallation import getSoftwareFolder
+from ILCDIRAC.Core.Utilities.SoftwareCatalog              import getSoftwareCatalog
 from ILCDIRAC.Core.Utilities.PrepareOptionFiles           import PrepareXMLFile, GetNewLDLibs
 from ILCDIRAC.Core.Utilities.resolvePathsAndNames         import resolveIFpaths, getProdFilename
 from ILCDIRAC.Core.Utilities.PrepareLibs                  import removeLibc
@@ -152,9 +153,7 @@ class MarlinAnalysis(ModuleBase):
       return S_OK('%s should not proceed as previous step did not end properly' % self.applicationName)
 
     
-    marlinDir = self.ops.getValue('/AvailableTarBalls/%s/%s/%s/TarBall' % (self.systemConfig, 
-                                                                           "marlin", 
-                                                                           self.applicationVersion), '')
+    marlinDir = getSoftwareCatalog().getTarBall(self.systemConfig, "marlin", self.applicationVersion)
     marlinDir = marlinDir.replace(".tgz", "").replace(".tar.gz", "")
     res = getSoftwareFolder(marlinDir)
     if not res['OK']:
@@ -383,6 +382,7 @@ class MarlinAnalysis(ModuleBase):
     self.setApplicationStatus('%s %s step %s' % (self.applicationName, self.applicationVersion, self.STEP_NUMBER))
     self.stdError = ''
     res = shellCall(0, comm, callbackFunction = self.redirectLogOutput, bufferLimit = 20971520)    
+    self.closeLogOutput()
     return res
   
   def GetInputFiles(self):
@@ -16,14 +16,15 @@ __RCSID__ = "$Id$"
 
 from DIRAC                                                import S_OK, S_ERROR, gLogger
 from DIRAC.Core.Security.ProxyInfo                        import getProxyInfoAsString
-from DIRAC.Core.Utilities.Adler                           import fileAdler
 from DIRAC.TransformationSystem.Client.FileReport         import FileReport
 from DIRAC.Core.Utilities.File                            import makeGuid
 from DIRAC.ConfigurationSystem.Client.Helpers.Operations  import Operations
 from ILCDIRAC.Core.Utilities.CombinedSoftwareInstallation import getSoftwareFolder
 from ILCDIRAC.Core.Utilities.InputFilesUtilities          import getNumberOfevents
+from ILCDIRAC.Core.Utilities.LogSink                      import LogSink
+from ILCDIRAC.Core.Utilities.ChecksumCache                import getChecksumCache
 
-import os, string, sys, re, types
+import os, string, sys, re, types, threading
 from random import choice
 
 def GenRandString(length=8, chars = string.letters + string.digits):
@@ -64,7 +65,9 @@ class ModuleBase(object):
     self.ignoremissingInput = False
     self.OutputFile = ''
     self.jobType = ''
-    self.stdError = ''
+    self.logSink = None
+    ##The sink can be used by several threads, like the overlay downloads
+    self.logSinkLock = threading.Lock()
     self.debug = False
     self.jobID = None
     if os.environ.has_key('JOBID'):
@@ -316,12 +319,13 @@ class ModuleBase(object):
       candidateFiles[pfn]['guid'] = guid
 
     #Get all additional metadata about the file necessary for requests
+    #The checksums are read only for the files not written through the checksum cache
+    checksums = getChecksumCache(self.workflow_commons)
     final = {}
     for fileName, metadata in candidateFiles.items():
       fileDict = {}
       fileDict['LFN'] = metadata['lfn']
-      fileDict['Size'] = os.path.getsize(fileName)
-      fileDict['Addler'] = fileAdler(fileName)
+      fileDict['Size'], fileDict['Addler'] = checksums.getChecksum(fileName)
       fileDict['GUID'] = metadata['guid']
       fileDict['Status'] = "Waiting"   
       
@@ -456,33 +460,46 @@ class ModuleBase(object):
       self.setApplicationStatus('%s %s Successful' % (self.applicationName, self.applicationVersion))
     return S_OK(message)    
 
+  def getLogSink(self):
+    """ Get the L{LogSink} receiving the output of the application, a new one is made if the log file
+    or the event strings changed
+    """
+    eventstring = self.eventstring
+    if type(eventstring) == type(' '):
+      eventstring = [eventstring]
+    self.logSinkLock.acquire()
+    try:
+      sink = self.logSink
+      if not sink or sink.path != self.applicationLog or sink.eventstring != list(eventstring) or \
+         sink.excludeAllButEventString != self.excludeAllButEventString:
+        self.logSink = LogSink(self.applicationLog, eventstring, self.excludeAllButEventString)
+        if sink:
+          sink.close()
+          self.logSink.setErrors(sink.getErrors())
+      return self.logSink
+    finally:
+      self.logSinkLock.release()
+
+  def _getStdError(self):
+    """ Last lines of the application stderr
+    """
+    return self.getLogSink().getErrors()
+
+  def _setStdError(self, value):
+    """ Reset the application stderr
+    """
+    self.getLogSink().setErrors(value)
+
+  stdError = property(_getStdError, _setStdError)
+
   def redirectLogOutput(self, fd, message):
-    """Catch the output from the application
+    """Catch the output from the application. L{closeLogOutput} must be called once the application
+    is done.
     """
-    sys.stdout.flush()
-    if message:
-      if type(self.eventstring) == type(' '):
-        self.eventstring = [self.eventstring]
-      if len(self.eventstring): 
-        if len(self.eventstring[0]):
-          for mystring in self.eventstring:
-            if re.search(mystring, message):
-              print message 
-      else:
-        print message
-      if self.applicationLog:
-        log = open(self.applicationLog, 'a')
-        if self.excludeAllButEventString:
-          if len(self.eventstring): 
-            if len(self.eventstring[0]):  
-              for mystring in self.eventstring:
-                if re.search(mystring, message):
-                  log.write(message+'\n')
-        else:
-          log.write(message+'\n')
-        log.close()
-      else:
-        self.log.error("Application Log file not defined")
-    if fd == 1:
-      self.stdError += message
-        
\ No newline at end of file
+    self.getLogSink().write(fd, message)
+
+  def closeLogOutput(self):
+    """ Complete the application log: to be called after the shellCall using L{redirectLogOutput}
+    """
+    if self.logSink:
+      self.logSink.close()
@@ -17,6 +17,7 @@ __RCSID__ = "$Id$"
 from DIRAC.Core.Utilities.Subprocess                      import shellCall
 from ILCDIRAC.Workflow.Modules.ModuleBase                 import ModuleBase, GenRandString
 from ILCDIRAC.Core.Utilities.CombinedSoftwareInstallation  import LocalArea, SharedArea, getSoftwareFolder
+from ILCDIRAC.Core.Utilities.SoftwareCatalog               import getSoftwareCatalog
 from ILCDIRAC.Core.Utilities.PrepareOptionFiles           import PrepareSteeringFile, GetNewLDLibs
 from ILCDIRAC.Core.Utilities.SQLWrapper                   import SQLWrapper
 from ILCDIRAC.Core.Utilities.PrepareLibs                  import removeLibc
@@ -170,8 +171,7 @@ class MokkaAnalysis(ModuleBase):
     self.log.info("Platform for job is %s" % ( self.systemConfig ) )
     self.log.info("Root directory for job is %s" % ( root ) )
 
-    mokkaDir = self.ops.getValue('/AvailableTarBalls/%s/%s/%s/TarBall' % (self.systemConfig, "mokka", 
-                                                                          self.applicationVersion), '')
+    mokkaDir = getSoftwareCatalog().getTarBall(self.systemConfig, "mokka", self.applicationVersion)
     if not mokkaDir:
       self.log.error('Could not get Tar ball name')
       return S_ERROR('Failed finding software directory')
@@ -204,7 +204,8 @@ class MokkaAnalysis(ModuleBase):
     MokkaDBrandomName =  '/tmp/MokkaDBRoot-' + GenRandString(8)
       
     #sqlwrapper = SQLWrapper(self.dbslice,mySoftwareRoot,"/tmp/MokkaDBRoot")#mySoftwareRoot)
-    sqlwrapper = SQLWrapper(mySoftwareRoot, MokkaDBrandomName)#mySoftwareRoot)
+    sqlwrapper = SQLWrapper(mySoftwareRoot, MokkaDBrandomName, self.ops.getValue("/Mokka/UseDBCache", True),
+                            self.ops.getValue("/Mokka/KeepDBServer", False))
     res = sqlwrapper.setDBpath(myMokkaDir, self.dbSlice)
     if not res['OK']:
       self.log.error("Failed to find the DB slice")
@@ -217,6 +218,7 @@ class MokkaAnalysis(ModuleBase):
     if not result['OK']:
       self.setApplicationStatus('MySQL setup failed.')
       return result
+    self.log.info("MySQL setup metrics: %s" % sqlwrapper.getMetrics()['Value'])
 
     ##Need to fetch the new LD_LIBRARY_PATH
     new_ld_lib_path = GetNewLDLibs(self.systemConfig, "mokka", self.applicationVersion)
@@ -378,6 +380,7 @@ class MokkaAnalysis(ModuleBase):
     self.setApplicationStatus('Mokka %s step %s' % (self.applicationVersion, self.STEP_NUMBER))
     self.stdError = ''
     self.result = shellCall(0, comm, callbackFunction = self.redirectLogOutput, bufferLimit = 20971520)
+    self.closeLogOutput()
     #self.result = {'OK':True,'Value':(0,'Disabled Execution','')}
     resultTuple = self.result['Value']
 
@@ -17,6 +17,7 @@ from DIRAC.Resources.Catalog.FileCatalogClient               import FileCatalogC
 from DIRAC.Core.DISET.RPCClient                              import RPCClient
 from DIRAC.Core.Utilities.Subprocess                         import shellCall
 from ILCDIRAC.Core.Utilities.WasteCPU                        import WasteCPUCycles
+from ILCDIRAC.Core.Utilities.OverlayFileCache                import OverlayFileCache, getOverlayCacheDir
 from DIRAC.ConfigurationSystem.Client.Helpers.Operations     import Operations
 
 from DIRAC                                                   import S_OK, S_ERROR, gLogger
@@ -25,7 +26,7 @@ from math import ceil, modf
 
 from decimal import Decimal
 
-import os, time, random, string, subprocess, glob
+import os, time, random, string, subprocess, glob, threading, Queue, types, socket
 
 def allowedBkg( bkg, energy = None, detector = None, detectormodel = None, machine = 'clic_cdr' ):
   """ Check is supplied bkg is allowed
@@ -76,6 +77,7 @@ class OverlayInput (ModuleBase):
     self.rm = ReplicaManager()
     self.fc = FileCatalogClient()
     self.site = DIRAC.siteName()
+    self.cache = None
 
     self.machine = 'clic_cdr'
 
@@ -308,38 +310,14 @@ class OverlayInput (ModuleBase):
       f.close()
     overlaymon = RPCClient('Overlay/Overlay', timeout=60)
     ##Now need to check that there are not that many concurrent jobs getting the overlay at the same time
-    error_count = 0
-    count = 0
-    while 1:
-      if error_count > 10 :
-        self.log.error('OverlayDB returned too any errors')
-        return S_ERROR('Failed to get number of concurrent overlay jobs')
-      #jobMonitor = RPCClient('WorkloadManagement/JobMonitoring',timeout=60)
-      #res = jobMonitor.getCurrentJobCounters(jobpropdict)
-      #if not res['OK']:
-      #  error_count += 1
-      #  time.sleep(60)
-      #  continue
-      #running = 0
-      #if res['Value'].has_key('Running'):
-      #  running = res['Value']['Running']
-
-      res = overlaymon.canRun(self.site)
-      if not res['OK']:
-        error_count += 1
-        time.sleep(60)
-        continue
-      error_count = 0
-      #if running < max_concurrent_running:
-      if res['Value']:
-        break
-      else:
-        count += 1
-        if count > 300:
-          return S_ERROR("Waited too long: 5h, so marking job as failed")
-        if count % 10 == 0 :
-          self.setApplicationStatus("Overlay standby number %s" % count)
-        time.sleep(60)
+    res = self.__getSlot(overlaymon)
+    if not res['OK']:
+      return res
+    lease = res['Value']
+    renewer = None
+    if lease:
+      renewer = LeaseRenewer(self.site, lease)
+      renewer.start()
         
     if os.path.exists('DISABLE_WATCHDOG_CPU_WALLCLOCK_CHECK'):
       os.remove('DISABLE_WATCHDOG_CPU_WALLCLOCK_CHECK')
@@ -348,6 +326,15 @@ class OverlayInput (ModuleBase):
 
     self.log.info('Will obtain %s files for overlay' % totnboffilestoget)
 
+    if self.ops.getValue("/Overlay/UseNodeCache", False):
+      res = getOverlayCacheDir()
+      if res['OK']:
+        self.cache = OverlayFileCache(res['Value'], 
+                                      self.ops.getValue("/Overlay/NodeCacheSize", 50 * 1024 * 1024 * 1024))
+        self.log.info("Using the node cache in %s" % res['Value'])
+      else:
+        self.log.warn("Not using the node cache:", res['Message'])
+
     os.mkdir("./overlayinput_" + self.BkgEvtType)
     os.chdir("./overlayinput_" + self.BkgEvtType)
     filesobtained = []
@@ -356,63 +343,45 @@ class OverlayInput (ModuleBase):
     fail_count = 0
 
     max_fail_allowed = self.ops.getValue("/Overlay/MaxFailedAllowed", 20)
-    while not len(filesobtained) == totnboffilestoget:
-      if fail_count > max_fail_allowed:
-        fail = True
-        break
-
-      ##Now wait for a random time around 3 minutes
-      ###Actually, waste CPU time !!!
-      self.log.verbose("Waste happily some CPU time (on average 3 minutes)")
-      res = WasteCPUCycles(60 * random.gauss(3, 0.1))
+    if self.ops.getValue("/Overlay/ParallelDownload", False):
+      res = self.__getFilesInParallel(overlaymon, nbfiles, totnboffilestoget, max_fail_allowed)
       if not res['OK']:
-        self.log.error("Could not waste as much CPU time as wanted, but whatever!")
+        fail = True
+    else:
+      while not len(filesobtained) == totnboffilestoget:
+        if fail_count > max_fail_allowed:
+          fail = True
+          break
+
+        ##Now wait for a random time around 3 minutes
+        ###Actually, waste CPU time !!!
+        self.log.verbose("Waste happily some CPU time (on average 3 minutes)")
+        res = WasteCPUCycles(60 * random.gauss(3, 0.1))
+        if not res['OK']:
+          self.log.error("Could not waste as much CPU time as wanted, but whatever!")
 
-      fileindex = random.randrange(nbfiles)
-      if fileindex not in usednumbers:
+        fileindex = random.randrange(nbfiles)
+        if fileindex not in usednumbers:
           
-        usednumbers.append(fileindex)
-
-        isDefault = False
-
-        if self.site == 'LCG.CERN.ch':
-          res = self.getCASTORFile(self.lfns[fileindex])
-        elif self.site == 'LCG.IN2P3-CC.fr':
-          res = self.getLyonFile(self.lfns[fileindex])
-        elif self.site == 'LCG.UKI-LT2-IC-HEP.uk':
-          res = self.getImperialFile(self.lfns[fileindex])
-        elif  self.site == 'LCG.RAL-LCG2.uk':
-          res = self.getRALFile(self.lfns[fileindex])
-        else:
-          if not os.path.exists('DISABLE_WATCHDOG_CPU_WALLCLOCK_CHECK'):
-            f = file('DISABLE_WATCHDOG_CPU_WALLCLOCK_CHECK', 'w')
-            f.write('Dont look at cpu')
-            f.close()
-          res = self.rm.getFile(self.lfns[fileindex])
-          isDefault = True
-
-        # Tue Jun 28 14:21:03 CEST 2011
-        # Temporarily for Imperial College site until dCache is fixed
+          usednumbers.append(fileindex)
 
-        if (not res['OK']) and (not isDefault) and \
-          (self.site in ['LCG.UKI-LT2-IC-HEP.uk', 'LCG.IN2P3-CC.fr', 'LCG.CERN.ch']):
-          res = self.rm.getFile(self.lfns[fileindex])
+          res = self.__getFile(self.lfns[fileindex])
 
-        if not res['OK']:
-          self.log.warn('Could not obtain %s' % self.lfns[fileindex])
-          fail_count += 1
-          continue
-        
-        if res['Value'].has_key('Failed'):
-          if len(res['Value']['Failed']):
+          if not res['OK']:
             self.log.warn('Could not obtain %s' % self.lfns[fileindex])
             fail_count += 1
             continue
-        filesobtained.append(self.lfns[fileindex])
-      ##If no file could be obtained, need to make sure the job fails  
-      if len(usednumbers) == nbfiles and not len(filesobtained):
-        fail = True
-        break
+        
+          if res['Value'].has_key('Failed'):
+            if len(res['Value']['Failed']):
+              self.log.warn('Could not obtain %s' % self.lfns[fileindex])
+              fail_count += 1
+              continue
+          filesobtained.append(self.lfns[fileindex])
+        ##If no file could be obtained, need to make sure the job fails  
+        if len(usednumbers) == nbfiles and not len(filesobtained):
+          fail = True
+          break
       
     #res = self.rm.getFile(filesobtained)
     #failed = len(res['Value']['Failed'])
@@ -438,7 +407,9 @@ class OverlayInput (ModuleBase):
     self.log.info("List of Overlay files:")
     self.log.info(string.join(mylist, "\n"))
     os.chdir(self.curdir)
-    res = overlaymon.jobDone(self.site)
+    if renewer:
+      renewer.stop()
+    res = overlaymon.jobDone(self.site, lease)
     if not res['OK']:
       self.log.error("Could not declare the job as finished getting the files")
     if fail:
@@ -447,7 +418,206 @@ class OverlayInput (ModuleBase):
     self.log.info('Got all files needed.')
     return S_OK()
 
-  def getCASTORFile(self, lfn):
+  def __getSlot(self, overlaymon):
+    """ Wait in the queue of the Overlay service until a slot is given to the job. Falls back to polling 
+    if the service does not provide the queue.
+    
+    @param overlaymon: RPCClient to the Overlay service
+    @return: S_OK(lease ID)
+    """
+    jobid = str(self.jobID)
+    if not self.jobID:
+      jobid = "%s_%s" % (socket.gethostname(), os.getpid())
+    res = overlaymon.requestSlot(self.site, jobid)
+    if not res['OK']:
+      self.log.warn("Could not get in the queue, polling the service instead:", res['Message'])
+      return self.__pollForSlot(overlaymon)
+    self.log.info("Position %s in the queue, estimated waiting time %s seconds" % (res['Value']['Position'], 
+                                                                                   res['Value']['EstimatedWait']))
+    waittime = 600
+    waitmon = RPCClient('Overlay/Overlay', timeout = waittime + 60)
+    start = time.time()
+    error_count = 0
+    while 1:
+      if error_count > 10 :
+        self.log.error('OverlayDB returned too any errors')
+        return S_ERROR('Failed to get a slot to get the overlay files')
+      if time.time() - start > 5 * 3600:
+        return S_ERROR("Waited too long: 5h, so marking job as failed")
+      callstart = time.time()
+      res = waitmon.waitForSlot(self.site, jobid, waittime)
+      if not res['OK']:
+        error_count += 1
+        time.sleep(60)
+        continue
+      error_count = 0
+      if res['Value']['LeaseID']:
+        return S_OK(res['Value']['LeaseID'])
+      self.setApplicationStatus("Overlay queue position %s" % res['Value']['Position'])
+      ##Too far in the queue to be kept waiting in the service: come back before the service
+      ##drops the job from the queue (after /Overlay/QueueIdleTime, 120 s by default)
+      if time.time() - callstart < 10:
+        time.sleep(min(max(res['Value']['EstimatedWait'], 10), 60))
+
+  def __pollForSlot(self, overlaymon):
+    """ Ask the Overlay service every minute if the job can get the files. 
+    
+    @param overlaymon: RPCClient to the Overlay service
+    @return: S_OK(lease ID)
+    """
+    error_count = 0
+    count = 0
+    lease = 0
+    while 1:
+      if error_count > 10 :
+        self.log.error('OverlayDB returned too any errors')
+        return S_ERROR('Failed to get number of concurrent overlay jobs')
+      #jobMonitor = RPCClient('WorkloadManagement/JobMonitoring',timeout=60)
+      #res = jobMonitor.getCurrentJobCounters(jobpropdict)
+      #if not res['OK']:
+      #  error_count += 1
+      #  time.sleep(60)
+      #  continue
+      #running = 0
+      #if res['Value'].has_key('Running'):
+      #  running = res['Value']['Running']
+
+      res = overlaymon.canRun(self.site)
+      if not res['OK']:
+        error_count += 1
+        time.sleep(60)
+        continue
+      error_count = 0
+      #if running < max_concurrent_running:
+      if res['Value']:
+        ##Older services return True instead of the lease ID
+        if not type(res['Value']) == types.BooleanType:
+          lease = res['Value']
+        return S_OK(lease)
+      else:
+        count += 1
+        if count > 300:
+          return S_ERROR("Waited too long: 5h, so marking job as failed")
+        if count % 10 == 0 :
+          self.setApplicationStatus("Overlay standby number %s" % count)
+        time.sleep(60)
+
+  def __getFilesInParallel(self, overlaymon, nbfiles, totnboffilestoget, max_fail_allowed):
+    """ Pick the whole random set of files at once and download them concurrently with a bounded 
+    number of threads. The pace is given by the download tokens handed out by the Overlay service, 
+    and the files that could not be obtained are replaced by unused ones.
+    
+    @param overlaymon: RPCClient to the Overlay service
+    @param nbfiles: number of available files
+    @param totnboffilestoget: number of files needed
+    @param max_fail_allowed: maximum number of failed downloads
+    @return: S_OK(list of files obtained)
+    """
+    indices = range(nbfiles)
+    random.shuffle(indices)
+    pending = indices[:totnboffilestoget]
+    spare = indices[totnboffilestoget:]
+    
+    maxthreads = min(self.ops.getValue("/Overlay/MaxParallelDownloads", 4), totnboffilestoget)
+    self.log.info("Will download the files using %s threads" % maxthreads)
+    todo = Queue.Queue()
+    done = Queue.Queue()
+    threads = []
+    for i in range(maxthreads):
+      thread = DownloadThread(self.__getFile, todo, done, "overlayinput_%s.sh" % i)
+      thread.setDaemon(True)
+      thread.start()
+      threads.append(thread)
+
+    filesobtained = []
+    fail_count = 0
+    running = 0
+    retryafter = 0
+    while len(filesobtained) < totnboffilestoget:
+      if fail_count > max_fail_allowed:
+        break
+      if pending:
+        res = overlaymon.getDownloadTokens(self.site, len(pending))
+        if res['OK']:
+          granted = res['Value']['Granted']
+          retryafter = res['Value']['RetryAfter']
+        else:
+          self.log.warn("Could not get download tokens, getting files one by one:", res['Message'])
+          granted = int(not running)
+          retryafter = 60
+        for i in range(granted):
+          todo.put(self.lfns[pending.pop(0)])
+          running += 1
+      if not running:
+        if not pending:
+          break
+        time.sleep(retryafter)
+        continue
+      try:
+        lfn, res = done.get(True, max(retryafter, 1))
+      except Queue.Empty:
+        continue
+      running -= 1
+      if not res['OK'] or len(res['Value'].get('Failed', [])):
+        self.log.warn('Could not obtain %s' % lfn)
+        fail_count += 1
+        if spare:
+          pending.append(spare.pop(0))
+        continue
+      filesobtained.append(lfn)
+
+    for thread in threads:
+      todo.put(None)
+    while running:
+      lfn, res = done.get()
+      running -= 1
+    if len(filesobtained) < totnboffilestoget:
+      return S_ERROR("Got only %s files out of %s" % (len(filesobtained), totnboffilestoget))
+    return S_OK(filesobtained)
+
+  def __getFile(self, lfn, script = "overlayinput.sh"):
+    """ Get one file, from the node cache if it's used, otherwise download it.
+    
+    @param lfn: LFN of the file to get
+    @param script: name of the script used by the site specific methods
+    """
+    if self.cache:
+      return self.cache.getFile(lfn, os.getcwd(), lambda lfn: self.__downloadFile(lfn, script))
+    return self.__downloadFile(lfn, script)
+
+  def __downloadFile(self, lfn, script = "overlayinput.sh"):
+    """ Download one file, using the site specific method if any, falling back to the ReplicaManager.
+    
+    @param lfn: LFN of the file to get
+    @param script: name of the script used by the site specific methods
+    """
+    isDefault = False
+
+    if self.site == 'LCG.CERN.ch':
+      res = self.getCASTORFile(lfn, script)
+    elif self.site == 'LCG.IN2P3-CC.fr':
+      res = self.getLyonFile(lfn, script)
+    elif self.site == 'LCG.UKI-LT2-IC-HEP.uk':
+      res = self.getImperialFile(lfn, script)
+    elif  self.site == 'LCG.RAL-LCG2.uk':
+      res = self.getRALFile(lfn, script)
+    else:
+      if not os.path.exists('DISABLE_WATCHDOG_CPU_WALLCLOCK_CHECK'):
+        f = file('DISABLE_WATCHDOG_CPU_WALLCLOCK_CHECK', 'w')
+        f.write('Dont look at cpu')
+        f.close()
+      res = self.rm.getFile(lfn)
+      isDefault = True
+
+    # Tue Jun 28 14:21:03 CEST 2011
+    # Temporarily for Imperial College site until dCache is fixed
+
+    if (not res['OK']) and (not isDefault) and \
+      (self.site in ['LCG.UKI-LT2-IC-HEP.uk', 'LCG.IN2P3-CC.fr', 'LCG.CERN.ch']):
+      res = self.rm.getFile(lfn)
+    return res
+
+  def getCASTORFile(self, lfn, script = "overlayinput.sh"):
     """ USe xrdcp or rfcp to get the files from castor
     """
     prependpath = "/castor/cern.ch/grid"
@@ -460,29 +630,30 @@ class OverlayInput (ModuleBase):
 
     basename = os.path.basename(lfile)
 
-    if os.path.exists("overlayinput.sh"):
-      os.unlink("overlayinput.sh")
-    script = file("overlayinput.sh","w")
-    script.write('#!/bin/sh \n')
-    script.write('###############################\n')
-    script.write('# Dynamically generated scrip #\n')
-    script.write('###############################\n')
-    script.write("cp %s /tmp/x509up_u%s \n" % (os.environ['X509_USER_PROXY'], os.getuid()))
-    script.write('declare -x STAGE_SVCCLASS=ilcdata\n')
-    script.write('declare -x STAGE_HOST=castorpublic\n')
-    script.write("xrdcp -s root://castorpublic.cern.ch/%s ./ -OSstagerHost=castorpublic\&svcClass=ilcdata\n" % lfile.rstrip())
+    if os.path.exists(script):
+      os.unlink(script)
+    scriptfile = file(script, "w")
+    scriptfile.write('#!/bin/sh \n')
+    scriptfile.write('###############################\n')
+    scriptfile.write('# Dynamically generated scrip #\n')
+    scriptfile.write('###############################\n')
+    scriptfile.write("cp %s /tmp/x509up_u%s \n" % (os.environ['X509_USER_PROXY'], os.getuid()))
+    scriptfile.write('declare -x STAGE_SVCCLASS=ilcdata\n')
+    scriptfile.write('declare -x STAGE_HOST=castorpublic\n')
+    scriptfile.write("xrdcp -s root://castorpublic.cern.ch/%s ./ -OSstagerHost=castorpublic\&svcClass=ilcdata\n" % lfile.rstrip())
     #script.write("/usr/bin/rfcp 'rfio://cgenstager.ads.rl.ac.uk:9002?svcClass=ilcTape&path=%s' %s\n"%(lfile,basename))
-    script.write("""
+    scriptfile.write("""
 if [ ! -s %s ]; then
   echo "Using rfcp instead"
   rfcp %s ./
 fi\n""" % (basename, lfile))
-    script.write('declare -x appstatus=$?\n')
-    script.write('exit $appstatus\n')
-    script.close()
-    os.chmod("overlayinput.sh", 0755)
-    comm = 'sh -c "./overlayinput.sh"'
+    scriptfile.write('declare -x appstatus=$?\n')
+    scriptfile.write('exit $appstatus\n')
+    scriptfile.close()
+    os.chmod(script, 0755)
+    comm = 'sh -c "./%s"' % script
     self.result = shellCall(600, comm, callbackFunction = self.redirectLogOutput, bufferLimit = 20971520)
+    self.closeLogOutput()
     #comm7=["/usr/bin/rfcp","'rfio://cgenstager.ads.rl.ac.uk:9002?svcClass=ilcTape&path=%s'"%lfile,"file:%s"%basename]
     #try:
     #  res = subprocess.Popen(comm7,stdout=logfile,stderr=subprocess.STDOUT)
@@ -504,7 +675,7 @@ fi\n""" % (basename, lfile))
       #return S_ERROR("Problem getting %s"%os.path.basename(lfn))
     return S_OK(mydict)
 
-  def getLyonFile(self, lfn):
+  def getLyonFile(self, lfn, script = "overlayinput.sh"):
     """ Use xrdcp to get the files from Lyon
     """
     prependpath = '/pnfs/in2p3.fr/data'
@@ -517,27 +688,28 @@ fi\n""" % (basename, lfile))
     #comm = []
     #comm.append("cp $X509_USER_PROXY /tmp/x509up_u%s"%os.getuid())
 
-    if os.path.exists("overlayinput.sh"):
-      os.unlink("overlayinput.sh")
-    script = file("overlayinput.sh", "w")
-    script.write('#!/bin/sh \n')
-    script.write('###############################\n')
-    script.write('# Dynamically generated scrip #\n')
-    script.write('###############################\n')
-    script.write("cp %s /tmp/x509up_u%s \n" % (os.environ['X509_USER_PROXY'], os.getuid()))
-    script.write(". /afs/in2p3.fr/grid/profiles/lcg_env.sh\n")
-    script.write("xrdcp root://ccdcacsn179.in2p3.fr:1094%s ./ -s\n" % lfile.rstrip())
+    if os.path.exists(script):
+      os.unlink(script)
+    scriptfile = file(script, "w")
+    scriptfile.write('#!/bin/sh \n')
+    scriptfile.write('###############################\n')
+    scriptfile.write('# Dynamically generated scrip #\n')
+    scriptfile.write('###############################\n')
+    scriptfile.write("cp %s /tmp/x509up_u%s \n" % (os.environ['X509_USER_PROXY'], os.getuid()))
+    scriptfile.write(". /afs/in2p3.fr/grid/profiles/lcg_env.sh\n")
+    scriptfile.write("xrdcp root://ccdcacsn179.in2p3.fr:1094%s ./ -s\n" % lfile.rstrip())
     #script.write("/usr/bin/rfcp 'rfio://cgenstager.ads.rl.ac.uk:9002?svcClass=ilcTape&path=%s' %s\n"%(lfile,basename))
     #script.write("""
 #if [ ! -s %s ]; then
 #  rfcp %s ./
 #fi\n"""%(basename,lfile))
-    script.write('declare -x appstatus=$?\n')
-    script.write('exit $appstatus\n')
-    script.close()
-    os.chmod("overlayinput.sh", 0755)
-    comm = 'sh -c "./overlayinput.sh"'
+    scriptfile.write('declare -x appstatus=$?\n')
+    scriptfile.write('exit $appstatus\n')
+    scriptfile.close()
+    os.chmod(script, 0755)
+    comm = 'sh -c "./%s"' % script
     self.result = shellCall(600, comm, callbackFunction = self.redirectLogOutput, bufferLimit = 20971520)
+    self.closeLogOutput()
 #    
 #    if os.environ.has_key('X509_USER_PROXY'):
 #      comm2 = ["cp", os.environ['X509_USER_PROXY'],"/tmp/x509up_u%s"%os.getuid()]
@@ -568,7 +740,7 @@ fi\n""" % (basename, lfile))
       #return S_ERROR("Problem getting %s"%os.path.basename(lfn))
     return S_OK(mydict)
 
-  def getImperialFile(self, lfn):
+  def getImperialFile(self, lfn, script = "overlayinput.sh"):
     """ USe dccp to get the files from the Imperial SE
     """
     prependpath = '/pnfs/hep.ph.ic.ac.uk/data'
@@ -583,25 +755,26 @@ fi\n""" % (basename, lfile))
       f.write('Dont look at cpu')
       f.close()
 
-    if os.path.exists("overlayinput.sh"):
-      os.unlink("overlayinput.sh")
-    script = file("overlayinput.sh","w")
-    script.write('#!/bin/sh \n')
-    script.write('###############################\n')
-    script.write('# Dynamically generated scrip #\n')
-    script.write('###############################\n')
-    script.write("dccp dcap://%s%s ./\n" % (os.environ['VO_ILC_DEFAULT_SE'], lfile.rstrip()))
+    if os.path.exists(script):
+      os.unlink(script)
+    scriptfile = file(script, "w")
+    scriptfile.write('#!/bin/sh \n')
+    scriptfile.write('###############################\n')
+    scriptfile.write('# Dynamically generated scrip #\n')
+    scriptfile.write('###############################\n')
+    scriptfile.write("dccp dcap://%s%s ./\n" % (os.environ['VO_ILC_DEFAULT_SE'], lfile.rstrip()))
     #script.write("/usr/bin/rfcp 'rfio://cgenstager.ads.rl.ac.uk:9002?svcClass=ilcTape&path=%s' %s\n"%(lfile,basename))
     #script.write("""
 #if [ ! -s %s ]; then
 #  rfcp %s ./
 #fi\n"""%(basename,lfile))
-    script.write('declare -x appstatus=$?\n')
-    script.write('exit $appstatus\n')
-    script.close()
-    os.chmod("overlayinput.sh", 0755)
-    comm = 'sh -c "./overlayinput.sh"'
+    scriptfile.write('declare -x appstatus=$?\n')
+    scriptfile.write('exit $appstatus\n')
+    scriptfile.close()
+    os.chmod(script, 0755)
+    comm = 'sh -c "./%s"' % script
     self.result = shellCall(600, comm, callbackFunction = self.redirectLogOutput, bufferLimit = 20971520)
+    self.closeLogOutput()
 #    
     #command = "rfcp %s ./"%file
     #comm = []
@@ -634,7 +807,7 @@ fi\n""" % (basename, lfile))
       #return S_ERROR("Problem getting %s"%os.path.basename(lfn))
     return S_OK(mydict)
 
-  def getRALFile(self, lfn):
+  def getRALFile(self, lfn, script = "overlayinput.sh"):
     """ Use rfcp to get the files from RAL castor
     """
     prependpath = '/castor/ads.rl.ac.uk/prod'
@@ -673,20 +846,21 @@ fi\n""" % (basename, lfile))
 #      print res
     basename = os.path.basename(lfile)
 
-    if os.path.exists("overlayinput.sh"):
-      os.unlink("overlayinput.sh")
-    script = file("overlayinput.sh","w")
-    script.write('#!/bin/sh \n')
-    script.write('###############################\n')
-    script.write('# Dynamically generated scrip #\n')
-    script.write('###############################\n')
-    script.write("/usr/bin/rfcp 'rfio://cgenstager.ads.rl.ac.uk:9002?svcClass=ilcTape&path=%s' %s\n" % (lfile, basename))
-    script.write('declare -x appstatus=$?\n')
-    script.write('exit $appstatus\n')
-    script.close()
-    os.chmod("overlayinput.sh", 0755)
-    comm = 'sh -c "./overlayinput.sh"'
+    if os.path.exists(script):
+      os.unlink(script)
+    scriptfile = file(script, "w")
+    scriptfile.write('#!/bin/sh \n')
+    scriptfile.write('###############################\n')
+    scriptfile.write('# Dynamically generated scrip #\n')
+    scriptfile.write('###############################\n')
+    scriptfile.write("/usr/bin/rfcp 'rfio://cgenstager.ads.rl.ac.uk:9002?svcClass=ilcTape&path=%s' %s\n" % (lfile, basename))
+    scriptfile.write('declare -x appstatus=$?\n')
+    scriptfile.write('exit $appstatus\n')
+    scriptfile.close()
+    os.chmod(script, 0755)
+    comm = 'sh -c "./%s"' % script
     self.result = shellCall(600, comm, callbackFunction = self.redirectLogOutput, bufferLimit = 20971520)
+    self.closeLogOutput()
     #comm7=["/usr/bin/rfcp","'rfio://cgenstager.ads.rl.ac.uk:9002?svcClass=ilcTape&path=%s'"%lfile,"file:%s"%basename]
     #try:
     #  res = subprocess.Popen(comm7,stdout=logfile,stderr=subprocess.STDOUT)
@@ -750,3 +924,54 @@ fi\n""" % (basename, lfile))
     self.setApplicationStatus('Overlay processor finished getting all files successfully')
     return S_OK('Overlay input finished successfully')
 
+class DownloadThread( threading.Thread ):
+  """ Thread getting the overlay files put in the input queue, the results are put in the output queue
+  """
+  def __init__( self, getFile, inqueue, outqueue, script ):
+    threading.Thread.__init__( self )
+    self.getFile = getFile
+    self.inqueue = inqueue
+    self.outqueue = outqueue
+    self.script = script
+
+  def run( self ):
+    while True:
+      lfn = self.inqueue.get()
+      if lfn is None:
+        break
+      try:
+        res = self.getFile( lfn, self.script )
+      except Exception, x:
+        res = S_ERROR( "Failed to get %s: %s" % ( lfn, str( x ) ) )
+      self.outqueue.put( ( lfn, res ) )
+
+class LeaseRenewer( threading.Thread ):
+  """ Thread renewing the lease of the overlay slot while the files are downloaded
+  """
+  def __init__( self, site, lease ):
+    threading.Thread.__init__( self )
+    self.setDaemon( True )
+    self.site = site
+    self.lease = lease
+    self.stopped = threading.Event()
+    self.log = gLogger.getSubLogger( "LeaseRenewer" )
+
+  def stop( self ):
+    """ Stop renewing the lease, before jobDone is called
+    """
+    self.stopped.set()
+    self.join()
+
+  def run( self ):
+    overlaymon = RPCClient( 'Overlay/Overlay', timeout = 60 )
+    ##Renewed well before the default expiration, until the service says how long a lease lasts
+    period = 60
+    while not self.stopped.isSet():
+      self.stopped.wait( period )
+      if self.stopped.isSet():
+        break
+      res = overlaymon.renewLease( self.site, self.lease )
+      if not res['OK']:
+        self.log.warn( "Could not renew the overlay slot lease:", res['Message'] )
+        continue
+      period = max( res['Value'] / 3., 10 )
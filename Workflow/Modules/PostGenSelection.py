@@ -15,6 +15,7 @@ from DIRAC.Core.Utilities.Subprocess                      import shellCall
 from ILCDIRAC.Workflow.Modules.ModuleBase                 import ModuleBase
 from DIRAC                                                import S_OK, S_ERROR, gLogger
 from ILCDIRAC.Core.Utilities.CombinedSoftwareInstallation import getSoftwareFolder
+from ILCDIRAC.Core.Utilities.SoftwareCatalog              import getSoftwareCatalog
 from ILCDIRAC.Core.Utilities.resolvePathsAndNames         import getProdFilename
 
 import os
@@ -82,9 +83,7 @@ class PostGenSelection(ModuleBase):
 
     if not os.environ.has_key('ROOTSYS'):
       return S_OK('Root environment is not set')
-    postgenDir = self.ops.getValue('/AvailableTarBalls/%s/%s/%s/TarBall'% (self.systemConfig, 
-                                                                           "postgensel", 
-                                                                           self.applicationVersion), '')
+    postgenDir = getSoftwareCatalog().getTarBall(self.systemConfig, "postgensel", self.applicationVersion)
     postgenDir = postgenDir.replace(".tgz", "").replace(".tar.gz", "")    
     res = getSoftwareFolder(postgenDir)
     if not res['OK']:
@@ -120,6 +119,7 @@ class PostGenSelection(ModuleBase):
     self.setApplicationStatus('PostGenSelection_Read %s step %s' % (self.applicationVersion, self.STEP_NUMBER))
     self.stdError = ''
     self.result = shellCall(0, comm, callbackFunction = self.redirectLogOutput, bufferLimit=20971520)
+    self.closeLogOutput()
     resultTuple = self.result['Value']
     status = resultTuple[0]
     if not status == 0:
@@ -157,6 +157,7 @@ class PostGenSelection(ModuleBase):
     self.setApplicationStatus('PostGenSelection_Write %s step %s' % (self.applicationVersion, self.STEP_NUMBER))
     self.stdError = ''
     self.result = shellCall(0, comm, callbackFunction = self.redirectLogOutput, bufferLimit = 20971520)
+    self.closeLogOutput()
     resultTuple = self.result['Value']
     status = resultTuple[0]
     
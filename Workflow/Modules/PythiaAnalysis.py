@@ -8,6 +8,7 @@ Run Pythia, but only specific versions (the CDR ttbar ones)
 from DIRAC.Core.Utilities.Subprocess                       import shellCall
 from ILCDIRAC.Workflow.Modules.ModuleBase                  import ModuleBase, GenRandString
 from ILCDIRAC.Core.Utilities.CombinedSoftwareInstallation  import getSoftwareFolder
+from ILCDIRAC.Core.Utilities.SoftwareCatalog               import getSoftwareCatalog
 from ILCDIRAC.Core.Utilities.PrepareOptionFiles            import GetNewLDLibs
 from ILCDIRAC.Core.Utilities.ResolveDependencies           import resolveDepsTar
 from ILCDIRAC.Core.Utilities.resolvePathsAndNames          import getProdFilename
@@ -66,9 +67,7 @@ class PythiaAnalysis(ModuleBase):
       self.log.verbose('Workflow status = %s, step status = %s' % (self.workflowStatus['OK'], self.stepStatus['OK']))
       return S_OK('%s should not proceed as previous step did not end properly' % self.applicationName)
 
-    appDir = self.ops.getValue('/AvailableTarBalls/%s/%s/%s/TarBall'% (self.systemConfig, 
-                                                                       self.applicationName, 
-                                                                       self.applicationVersion), '')
+    appDir = getSoftwareCatalog().getTarBall(self.systemConfig, self.applicationName, self.applicationVersion)
     appDir = appDir.replace(".tgz","").replace(".tar.gz","")
 
     res = getSoftwareFolder(appDir)
@@ -136,6 +135,7 @@ class PythiaAnalysis(ModuleBase):
     self.setApplicationStatus('%s %s step %s' % (self.applicationName, self.applicationVersion, self.STEP_NUMBER))
     self.stdError = ''
     self.result = shellCall(0, comm, callbackFunction = self.redirectLogOutput, bufferLimit = 20971520)
+    self.closeLogOutput()
     if not self.result['OK']:
       self.log.error('Something wrong during running: %s'% self.result['Message'])
       self.setApplicationStatus('Error during running %s'% self.applicationName)
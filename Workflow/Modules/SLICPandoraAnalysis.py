@@ -17,6 +17,7 @@ from DIRAC.Core.Utilities.Subprocess                      import shellCall
 
 from ILCDIRAC.Workflow.Modules.ModuleBase                 import ModuleBase
 from ILCDIRAC.Core.Utilities.CombinedSoftwareInstallation import getSoftwareFolder
+from ILCDIRAC.Core.Utilities.SoftwareCatalog              import getSoftwareCatalog
 from ILCDIRAC.Core.Utilities.resolvePathsAndNames         import resolveIFpaths
 from ILCDIRAC.Core.Utilities.PrepareOptionFiles           import GetNewLDLibs, GetNewPATH
 from ILCDIRAC.Core.Utilities.PrepareLibs                  import removeLibc
@@ -100,9 +101,7 @@ class SLICPandoraAnalysis (ModuleBase):
       self.log.verbose('Workflow status = %s, step status = %s' %(self.workflowStatus['OK'], self.stepStatus['OK']))
       return S_OK('SLIC Pandora should not proceed as previous step did not end properly')
     
-    slicPandoraDir = self.ops.getValue('/AvailableTarBalls/%s/%s/%s/TarBall' % (self.systemConfig, 
-                                                                                "slicpandora", 
-                                                                                self.applicationVersion), '')
+    slicPandoraDir = getSoftwareCatalog().getTarBall(self.systemConfig, "slicpandora", self.applicationVersion)
     slicPandoraDir = slicPandoraDir.replace(".tgz", "").replace(".tar.gz", "")
     res = getSoftwareFolder(slicPandoraDir)
     if not res['OK']:
@@ -244,6 +243,7 @@ class SLICPandoraAnalysis (ModuleBase):
     self.stdError = ''
     self.result = shellCall(0, comm, callbackFunction = self.redirectLogOutput,
                             bufferLimit = 20971520)
+    self.closeLogOutput()
     #self.result = {'OK':True,'Value':(0,'Disabled Execution','')}
     resultTuple = self.result['Value']
     if not os.path.exists(self.applicationLog):
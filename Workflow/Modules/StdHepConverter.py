@@ -115,6 +115,7 @@ exit $?
             callbackFunction = self.redirectLogOutput,
             bufferLimit = 20971520
     )
+    self.closeLogOutput()
 
     # Check results
 
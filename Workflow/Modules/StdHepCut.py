@@ -10,6 +10,7 @@ Apply a set of cuts on input stdhep files
 from DIRAC                                                import S_OK, S_ERROR, gLogger
 from ILCDIRAC.Workflow.Modules.ModuleBase                 import ModuleBase
 from ILCDIRAC.Core.Utilities.CombinedSoftwareInstallation import getSoftwareFolder
+from ILCDIRAC.Core.Utilities.SoftwareCatalog              import getSoftwareCatalog
 from DIRAC.Core.Utilities.Subprocess                      import shellCall
 from ILCDIRAC.Core.Utilities.PrepareOptionFiles           import GetNewLDLibs
 from ILCDIRAC.Core.Utilities.FindSteeringFileDir          import getSteeringFileDirName
@@ -71,8 +72,7 @@ class StdHepCut(ModuleBase):
       self.log.verbose('Workflow status = %s, step status = %s' % (self.workflowStatus['OK'], self.stepStatus['OK']))
       return S_OK('StdHepCut should not proceed as previous step did not end properly')
 
-    appDir = self.ops.getValue('/AvailableTarBalls/%s/%s/%s/TarBall'% (self.systemConfig, "stdhepcut", 
-                                                                       self.applicationVersion), '')
+    appDir = getSoftwareCatalog().getTarBall(self.systemConfig, "stdhepcut", self.applicationVersion)
     if not appDir:
       self.log.error('Could not get info from CS')
       self.setApplicationStatus('Failed finding info from CS')
@@ -130,6 +130,7 @@ class StdHepCut(ModuleBase):
     self.setApplicationStatus('%s %s step %s' % (self.applicationName, self.applicationVersion, self.STEP_NUMBER))
     self.stdError = ''
     self.result = shellCall(0, comm, callbackFunction = self.redirectLogOutput, bufferLimit = 20971520)
+    self.closeLogOutput()
     #self.result = {'OK':True,'Value':(0,'Disabled Execution','')}
     resultTuple = self.result['Value']
     if not os.path.exists(self.applicationLog):
@@ -10,17 +10,16 @@ Module to concatenate LCIO files
 
 __RCSID__ = "$Id: LCIOConcatenate.py 48402 2012-03-09 09:33:09Z sposs $"
 
-from DIRAC.Core.Utilities.Subprocess                      import shellCall
 from ILCDIRAC.Workflow.Modules.ModuleBase                 import ModuleBase
 from DIRAC                                                import S_OK, S_ERROR, gLogger
 from ILCDIRAC.Core.Utilities.resolvePathsAndNames         import getProdFilename, resolveIFpaths
-from ILCDIRAC.Core.Utilities.PrepareOptionFiles           import GetNewLDLibs
-from ILCDIRAC.Core.Utilities.CombinedSoftwareInstallation import getSoftwareFolder
+from ILCDIRAC.Core.Utilities.StdHepSplitter               import splitStdHep
+from ILCDIRAC.Core.Utilities.ChecksumCache                import getChecksumCache
 
 import os
 
 class StdHepSplit(ModuleBase):
-  """ StdHep split module, split StdHep files using A. Miyamoto's HepSplit utility
+  """ StdHep split module, split StdHep files with L{splitStdHep}, that replaces A. Miyamoto's HepSplit utility
   """
   def __init__(self):
 
@@ -101,96 +100,23 @@ class StdHepSplit(ModuleBase):
       prefix = "this_split"
     self.log.info("Will rename all files using '%s' as base." % prefix)
 
-    # Setting up script
-    splitDir = self.ops.getValue('/AvailableTarBalls/%s/%s/%s/TarBall' % (self.systemConfig, "stdhepsplit", 
-                                                                                    self.applicationVersion), '')
-    splitDir = splitDir.replace(".tgz", "").replace(".tar.gz", "")
-    res = getSoftwareFolder(splitDir)
-    if not res['OK']:
-      self.setApplicationStatus('StdHepSplit: Could not find neither local area not shared area install')
-      return res
-    
-    mysplitDir = res['Value']
-    new_ld_lib = GetNewLDLibs(self.systemConfig, "stdhepsplit", self.applicationVersion)
-    LD_LIBRARY_PATH = os.path.join(mysplitDir, "lib") + ":" + new_ld_lib
-
-    
-
-    scriptContent = """
-#!/bin/sh
-
-################################################################################
-# Dynamically generated script by LCIOConcatenate module                       #
-################################################################################
-
-declare -x LD_LIBRARY_PATH=%s
-
-%s/hepsplit --infile %s --nw_per_file %s --outpref %s
-
-exit $?
-
-""" % (
-    LD_LIBRARY_PATH,
-    mysplitDir,
-    runonstdhep,
-    self.nbEventsPerSlice,
-    prefix
-)
-
-    # Write script to file
-
-    scriptPath = 'StdHepSplit_%s_Run_%s.tcl' % ( self.applicationVersion, self.STEP_NUMBER )
-
-    if os.path.exists(scriptPath):
-      os.remove(scriptPath)
-
-    script = open( scriptPath, 'w' )
-    script.write( scriptContent )
-    script.close()
-
-    # Setup log file for application stdout
-
+    self.setApplicationStatus( 'StdHepSplit %s step %s' % ( self.applicationVersion, self.STEP_NUMBER ) )
     if os.path.exists(self.applicationLog):
       os.remove(self.applicationLog)
 
-    # Run code
-
-    os.chmod( scriptPath, 0755 )
-
-    command = '"./%s"' % ( scriptPath )
-
-    self.setApplicationStatus( 'StdHepSplit %s step %s' % ( self.applicationVersion, self.STEP_NUMBER ) )
-    self.stdError = ''
-
-    self.result = shellCall(
-                            0,
-                            command,
-                            callbackFunction = self.redirectLogOutput,
-                            bufferLimit = 20971520
-                            )
-
-        # Check results
-
-    resultTuple = self.result['Value']
-    status      = resultTuple[0]
-
-    if not os.path.exists(self.applicationLog):
-      self.log.error("Cannot access log file, cannot proceed")
-      return S_ERROR("Failed reading the log file")
-
-    logf = file(self.applicationLog,"r")
-    numberofeventsdict = {}
-    fname = ''
-    for line in logf:
-      line = line.rstrip()
-      if line.count('Open output file'):
-        fname = line.split()[-1].rstrip().rstrip("\0")
-        numberofeventsdict[fname] = 0
-      elif line.count("Record") and not line.count('Output Begin Run') :
-        #print line
-        val = line.split("=")[1].rstrip().lstrip()
-        if val != '0':
-          numberofeventsdict[fname] = int(val)
+    res = splitStdHep(runonstdhep, int(self.nbEventsPerSlice), prefix,
+                      checksums = getChecksumCache(self.workflow_commons))
+    if not res['OK']:
+      self.log.error("Failed to split %s:" % runonstdhep, res['Message'])
+      self.stdError = res['Message']
+      return self.finalStatusReport(1)
+    numberofeventsdict = res['Value']
+
+    ##Keep a log of the split, like the other applications
+    logf = file(self.applicationLog, "w")
+    for fname in sorted(numberofeventsdict.keys()):
+      logf.write("Open output file %s\nRecord = %s\n" % (fname, numberofeventsdict[fname]))
+    logf.close()
     
     self.log.verbose("numberofeventsdict dict: %s" % numberofeventsdict)   
 
@@ -222,9 +148,5 @@ exit $?
         finalproddata.append(os.path.join(path, f))
       self.workflow_commons['ProductionOutputData'] = ";".join(finalproddata)  
     
-    self.log.info( "Status after the application execution is %s" % str( status ) )
-    if status == 2:
-      self.log.info("Reached end of input file")
-      status = 0
-    return self.finalStatusReport(status)
+    return self.finalStatusReport(0)
 
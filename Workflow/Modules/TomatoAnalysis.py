@@ -13,6 +13,7 @@ Run TOMATO
 __RCSID__ = "$Id: $"
 
 from ILCDIRAC.Core.Utilities.CombinedSoftwareInstallation  import getSoftwareFolder
+from ILCDIRAC.Core.Utilities.SoftwareCatalog               import getSoftwareCatalog
 from ILCDIRAC.Workflow.Modules.MarlinAnalysis              import MarlinAnalysis
 from ILCDIRAC.Core.Utilities.PrepareOptionFiles            import PrepareTomatoSalad
 from ILCDIRAC.Core.Utilities.ResolveDependencies           import resolveDepsTar
@@ -61,8 +62,7 @@ class TomatoAnalysis(MarlinAnalysis):
       self.log.verbose('Workflow status = %s, step status = %s' % (self.workflowStatus['OK'], self.stepStatus['OK']))
       return S_OK('%s should not proceed as previous step did not end properly' % self.applicationName)
 
-    tomatoDir = self.ops.getValue('/AvailableTarBalls/%s/%s/%s/TarBall' % (self.systemConfig, "tomato", 
-                                                                           self.applicationVersion), '')
+    tomatoDir = getSoftwareCatalog().getTarBall(self.systemConfig, "tomato", self.applicationVersion)
     if not tomatoDir:
       self.log.error('Could not get Tomato tar ball name, cannot proceed')
       return S_ERROR('Problem accessing CS')
@@ -18,11 +18,12 @@ from DIRAC.Core.Utilities.Subprocess                       import shellCall
 
 from ILCDIRAC.Workflow.Modules.ModuleBase                 import ModuleBase
 from ILCDIRAC.Core.Utilities.ProductionData               import getLogPath
+from ILCDIRAC.Core.Utilities.LogArchive                   import writeLogArchive, copyLogFile, isTextFile
 
 from DIRAC import S_OK, S_ERROR, gLogger, gConfig
 import DIRAC
 
-import os, shutil, glob, string, random, tarfile
+import os, glob, string, random, shutil
 
 class UploadLogFile(ModuleBase):
   """ Handle log file uploads in the production jobs
@@ -44,6 +45,8 @@ class UploadLogFile(ModuleBase):
     self.logSE = self.ops.getValue('/LogStorage/LogSE', 'LogSE')
     self.root = gConfig.getValue('/LocalSite/Root', os.getcwd())
     self.logSizeLimit = self.ops.getValue('/LogFiles/SizeLimit', 20 * 1024 * 1024)
+    self.logCompression = self.ops.getValue('/LogFiles/Compression', 'gz')
+    self.logCompressionLevel = self.ops.getValue('/LogFiles/CompressionLevel', 6)
     self.logExtensions = []
     self.failoverSEs = gConfig.getValue('/Resources/StorageElementGroups/Tier1-Failover', [])    
     self.diracLogo = self.ops.getValue('/SAM/LogoURL', 
@@ -157,7 +160,7 @@ class UploadLogFile(ModuleBase):
                                                                              string.join(selectedFiles, '\n')))
 
     #########################################
-    # Create a temporary directory containing these files
+    # Create a temporary directory containing these files (hard links, or cut copies of the large files)
     self.log.info('Populating a temporary directory for selected files.')
     res = self.populateLogDirectory(selectedFiles)
     if not res['OK']:
@@ -209,21 +212,16 @@ class UploadLogFile(ModuleBase):
     self.log.error('Completely failed to upload log files to %s, will attempt upload to failover SE' % self.logSE, 
                    res['Message'])
 
+    #########################################
+    # Write the tar ball for the failover straight from the selected files
     tarFileDir = os.path.dirname(self.logdir)
-    self.logLFNPath = '%s.gz' % self.logLFNPath
+    extension = 'gz'
+    if self.logCompression.lower() in ('bz2', 'bzip2'):
+      extension = 'bz2'
+    self.logLFNPath = '%s.%s' % (self.logLFNPath, extension)
     tarFileName = os.path.basename(self.logLFNPath)
-    start = os.getcwd()
-    os.chdir(self.logdir)
-    logTarFiles = os.listdir(self.logdir)
-    #comm = 'tar czvf %s %s' % (tarFileName,string.join(logTarFiles,' '))
-    tfile = tarfile.open(tarFileName, "w:gz")
-    for item in logTarFiles:
-      tfile.add(item)
-    tfile.close()
-    #res = shellCall(0,comm)
-    if not os.path.exists(tarFileName):
-      res = S_ERROR("File was not created")
-    os.chdir(start)
+    res = writeLogArchive(os.path.join(tarFileDir, tarFileName), selectedFiles, self.logSizeLimit,
+                          self.logCompression, self.logCompressionLevel)
     if not res['OK']:
       self.log.error('Failed to create tar file from directory','%s %s' % (self.logdir, res['Message']))
       self.setApplicationStatus('Failed To Create Log Tar Dir')
@@ -295,10 +293,13 @@ class UploadLogFile(ModuleBase):
     try:
       for candidate in candidateFiles:
         fileSize = os.stat(candidate)[6]
-        if fileSize < self.logSizeLimit:
-          selectedFiles.append(candidate)
-        else:
-          self.log.error('Log file found to be greater than maximum of %s bytes' % self.logSizeLimit, candidate)
+        if fileSize > self.logSizeLimit:
+          if not isTextFile(candidate):
+            self.log.error('Log file found to be greater than maximum of %s bytes' % self.logSizeLimit, candidate)
+            continue
+          self.log.warn('Log file found to be greater than maximum of %s bytes, only its beginning and end \
+will be kept' % self.logSizeLimit, candidate)
+        selectedFiles.append(candidate)
       return S_OK(selectedFiles)
     except Exception, x:
       self.log.exception('Exception while determining files to save.', '', str(x))
@@ -307,7 +308,7 @@ class UploadLogFile(ModuleBase):
   #############################################################################
   def populateLogDirectory(self, selectedFiles):
     """ A temporary directory is created for all the selected files.
-        These files are then copied into this directory before being uploaded
+        These files are then linked into this directory (or copied and cut, if too large) before being uploaded
     """
     # Create the temporary directory
     try:
@@ -326,7 +327,7 @@ class UploadLogFile(ModuleBase):
     try:
       for myfile in selectedFiles:
         destinationFile = '%s/%s' % (self.logdir, os.path.basename(myfile))
-        shutil.copy(myfile, destinationFile)
+        copyLogFile(myfile, destinationFile, self.logSizeLimit)
     except Exception, x:
       self.log.exception('Exception while trying to copy file.', myfile, str(x))
       self.log.info('File %s will be skipped and can be considered lost.' % myfile)
@@ -361,13 +362,21 @@ class UploadLogFile(ModuleBase):
   #############################################################################
   def __setLogFilePermissions(self, logDir):
     """ Sets the permissions of all the files in the log directory to ensure
-        they are readable.
+        they are readable. The files hard linked to the job files are replaced by a copy
+        if they need to be changed, not to change the permissions of the job files.
     """
     try:
       for toChange in os.listdir(logDir):
-        if not os.path.islink('%s/%s' % (logDir, toChange)):
-          self.log.debug('Changing permissions of %s/%s to 0755' % (logDir, toChange))
-          os.chmod('%s/%s' % (logDir, toChange), 0755)
+        path = '%s/%s' % (logDir, toChange)
+        if not os.path.islink(path):
+          stat = os.stat(path)
+          if stat.st_nlink > 1:
+            if stat.st_mode & 0444 == 0444:
+              continue
+            shutil.copy2(path, path + '.tmp')
+            os.rename(path + '.tmp', path)
+          self.log.debug('Changing permissions of %s to 0755' % path)
+          os.chmod(path, 0755)
     except Exception, x:
       self.log.error('Problem changing shared area permissions', str(x))
       return S_ERROR(x)
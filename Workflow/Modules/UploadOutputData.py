@@ -15,6 +15,7 @@ from DIRAC.DataManagementSystem.Client.FailoverTransfer    import FailoverTransf
 from DIRAC.RequestManagementSystem.Client.RequestContainer import RequestContainer
 from ILCDIRAC.Core.Utilities.ResolveSE                     import getDestinationSEList
 from ILCDIRAC.Core.Utilities.resolvePathsAndNames          import getProdFilename
+from ILCDIRAC.Core.Utilities.UploadEngine                  import UploadEngine
 from ILCDIRAC.Workflow.Modules.ModuleBase                  import ModuleBase
 from DIRAC.ConfigurationSystem.Client.Helpers.Operations     import Operations
 
@@ -259,21 +260,26 @@ class UploadOutputData(ModuleBase):
     catalogs = ['FileCatalog', 'LcgFileCatalog']
 
 
-    #One by one upload the files with failover if necessary
+    #Upload the files concurrently, those that could not be uploaded go to the failover
     failover = {}
     if not self.failoverTest:
       for fileName, metadata in final.items():
         self.log.info("Attempting to store file %s to the following SE(s):\n%s" % (fileName, 
                                                                                    string.join(metadata['resolvedSE'], 
                                                                                                ', ')))
-        result = failoverTransfer.transferAndRegisterFile(fileName, metadata['localpath'], 
-                                                          metadata['lfn'], metadata['resolvedSE'], 
-                                                          fileGUID = metadata['guid'], fileCatalog = catalogs)
-        if not result['OK']:
-          self.log.error('Could not transfer and register %s with metadata:\n %s' % (fileName, metadata))
-          failover[fileName] = metadata
-        else:
-          lfn = metadata['lfn']
+      engine = UploadEngine(maxthreads = self.ops.getValue("Production/MaxParallelUploads", 8),
+                            maxperse = self.ops.getValue("Production/MaxParallelUploadsPerSE", 2),
+                            retries = self.ops.getValue("Production/UploadRetries", 3))
+      result = engine.upload(final, catalogs)
+      for fileName, message in result['Value']['Failed'].items():
+        self.log.error('Could not transfer %s with metadata:\n %s' % (fileName, final[fileName]), message)
+        failover[fileName] = final[fileName]
+      for fileName, fileTuple in result['Value']['RegistrationFailed'].items():
+        self.log.info('Registration of %s failed, setting a registration request' % fileName)
+        res = self.__setRegistrationRequest(fileTuple, catalogs)
+        if not res['OK']:
+          self.log.error('Could not set registration request for %s' % fileName, res['Message'])
+          return res
     else:
       failover = final
 
@@ -337,6 +343,24 @@ class UploadOutputData(ModuleBase):
     self.workflow_commons['Request'] = self.request
     return S_OK('Output data uploaded')
 
+  #############################################################################
+  def __setRegistrationRequest(self, fileTuple, catalogs):
+    """ Set the requests to register an uploaded file in the catalogs
+
+    @param fileTuple: (lfn, pfn, size, se, guid, checksum) as given to the registration
+    """
+    lfn, pfn, size, se, guid, checksum = fileTuple
+    for catalog in catalogs:
+      result = self.request.addSubRequest({'Attributes': {'Operation' : 'registerFile', 'ExecutionOrder' : 0,
+                                                          'TargetSE' : se, 'Catalogue' : catalog}}, 'register')
+      if not result['OK']:
+        return result
+      fileDict = {'LFN' : lfn, 'PFN' : pfn, 'Size' : size, 'GUID' : guid, 'Addler' : checksum,
+                  'Status' : 'Waiting'}
+      index = result['Value']
+      self.request.setSubRequestFiles(index, 'register', [fileDict])
+    return S_OK()
+
   #############################################################################
   def __cleanUp(self, lfnList):
     """ Clean up uploaded data for the LFNs in the list
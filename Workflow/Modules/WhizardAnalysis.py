@@ -16,6 +16,7 @@ __RCSID__ = "$Id$"
 from DIRAC.Core.Utilities.Subprocess                       import shellCall
 from ILCDIRAC.Workflow.Modules.ModuleBase                  import ModuleBase
 from ILCDIRAC.Core.Utilities.CombinedSoftwareInstallation  import getSoftwareFolder
+from ILCDIRAC.Core.Utilities.SoftwareCatalog               import getSoftwareCatalog
 from ILCDIRAC.Core.Utilities.ResolveDependencies           import resolveDepsTar
 from ILCDIRAC.Core.Utilities.PrepareOptionFiles            import PrepareWhizardFile
 from ILCDIRAC.Core.Utilities.PrepareOptionFiles            import PrepareWhizardFileTemplate, GetNewLDLibs
@@ -222,8 +223,7 @@ class WhizardAnalysis(ModuleBase):
     #if self.debug:
     #  self.excludeAllButEventString = False
 
-    whizardDir = self.ops.getValue('/AvailableTarBalls/%s/%s/%s/TarBall'%(self.systemConfig, "whizard", 
-                                                                          self.applicationVersion), '')
+    whizardDir = getSoftwareCatalog().getTarBall(self.systemConfig, "whizard", self.applicationVersion)
     if not whizardDir:
       self.log.error('Could not get info from CS')
       self.setApplicationStatus('Failed finding info from CS')
@@ -424,6 +424,7 @@ class WhizardAnalysis(ModuleBase):
     self.setApplicationStatus('Whizard %s step %s' %(self.applicationVersion, self.STEP_NUMBER))
     self.stdError = ''
     self.result = shellCall(0, comm, callbackFunction = self.redirectLogOutput, bufferLimit=209715200)
+    self.closeLogOutput()
     #self.result = {'OK':True,'Value':(0,'Disabled Execution','')}
     if not self.result['OK']:
       self.log.error("Failed with error %s" % self.result['Message'])